@@ -7,10 +7,21 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
 
+import atexit
 import os
 
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PatchProject.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
+
+# 对话消息推送的长连接在 Django 之前处理 (要在 django.setup() 之后导入)
+from goods import querylog, suggest  # noqa: E402
+from marketplace.realtime import RealtimeRouter  # noqa: E402
+
+application = RealtimeRouter(django_application)
+
+# 服务器进程启动时在后台建立搜索框输入提示的索引, 退出时写掉还没写入的搜索词计数
+suggest.suggestions.start()
+atexit.register(querylog.flush)
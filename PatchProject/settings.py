@@ -34,6 +34,9 @@ INSTALLED_APPS = [
     'goods',
     'api',
     'marketplace',     # 新添加这一行
+    'jobs',
+    'monitoring',
+    'database',
     'rest_framework',
     'django.contrib.admin',
     'django.contrib.auth',
@@ -44,6 +47,12 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # 放在第一个: 统计的时间包括其它中间件
+    'monitoring.middleware.MetricsMiddleware',
+    # 按需剖析单个请求, PROFILING_ENABLED = False 时不加载
+    'monitoring.profiling.ProfilingMiddleware',
+    # 读写分流: 写过数据的浏览器暂时只读主库; 没有配置副本时不加载
+    'database.middleware.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -57,7 +66,8 @@ ROOT_URLCONF = 'PatchProject.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # 内置的 DjangoTemplates, 另外记录渲染时间 (monitoring/templates.py)
+        'BACKEND': 'monitoring.templates.TimedDjangoTemplates',
         'DIRS': [BASE_DIR / 'templates']
         ,
         'APP_DIRS': True,
@@ -81,9 +91,38 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        # 持久连接: gunicorn/uWSGI 的工作线程处理很多请求, 复用连接省掉每个请求打开文件和执行 PRAGMA
+        # (约 0.5 ms)。runserver 每个请求一个新线程, 连接实际上不会复用; ASGI 下关闭, 见 ASYNC_VIEWS
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # transaction.atomic() 开始时就拿写锁, 并发写排队而不是报 "database is locked"
+            # (见 database/sqlite.py)
+            'transaction_mode': 'IMMEDIATE',
+        },
     }
 }
 
+# 每个 SQLite 连接打开时执行的 PRAGMA (database 应用)
+SQLITE_PRAGMAS = {
+    'busy_timeout': 5000,          # 等待写锁的时间 (毫秒)
+    'journal_mode': 'wal',         # 读写互不阻塞; 写进数据库文件, 会多出 -wal / -shm 文件
+    'synchronous': 'normal',       # WAL 下只在 checkpoint 时 fsync; 断电可能丢最后几个事务, 不会损坏
+    'cache_size': -64000,          # 每个连接的页缓存, 负数表示 KiB (64 MiB)
+    'mmap_size': 268435456,        # 用内存映射读数据库文件 (256 MiB)
+    'temp_store': 'memory',        # 排序、临时索引放在内存里
+}
+SQLITE_WRITE_RETRIES = 3       # 写操作等锁超时后的重试次数 (database/transactions.py)
+SQLITE_RETRY_DELAY = 0.05      # 重试的退避基数 (秒), 第 n 次重试前等待 base * 2**(n-1)
+
+# 读写分流 (database/replicas.py): 商店、商品详情和商品 API 的读请求随机读一个副本, 其它都走 default。
+# 本地用第二个 SQLite 文件演示: 在 DATABASES 里加
+#     'replica': {**DATABASES['default'], 'NAME': BASE_DIR / 'db.replica.sqlite3', 'TEST': {'MIRROR': 'default'}},
+# DATABASE_REPLICAS 设为 ['replica'], 然后 python manage.py sync_replicas --interval 5 持续复制主库
+DATABASE_ROUTERS = ['database.routers.PrimaryReplicaRouter']
+DATABASE_REPLICAS = []          # 副本的别名, 空列表表示不分流
+REPLICA_STICKY_SECONDS = 30     # 写过数据的浏览器这么长时间内只读主库, 要大于副本的同步间隔
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -123,6 +162,71 @@ USE_TZ = True
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# 商品 API: 所有人可读; 写操作要登录, 改/删只限商品的卖家 (api/views.py)
+REST_FRAMEWORK = {
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticatedOrReadOnly'],
+}
+
+# 商品 API 分页 (每页默认数量 / ?page_size= 上限)
+API_PAGE_SIZE = 50
+API_MAX_PAGE_SIZE = 200
+API_BULK_MAX_ROWS = 50000   # 批量导入每次请求的最大行数
+
+# 后台任务队列 (jobs 应用, 用 python manage.py run_worker 执行)
+JOBS_VISIBILITY_TIMEOUT = 300   # worker 领取任务后的独占时间 (秒)
+JOBS_RETRY_BASE_DELAY = 10      # 失败重试的退避基数 (秒)
+JOBS_EAGER = False              # True 时入队即在当前进程执行, 不需要 worker
+
+# 缓存: 默认是进程内存; 多进程部署时请换成共享的缓存, 例如
+#     'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+#     'LOCATION': BASE_DIR / 'cache',
+# 否则一个进程里的失效不会通知到其它进程, 只能等超时。
+# 页面结构改动后把 VERSION 加一, 旧的页面和片段缓存全部作废。
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'patch',
+        'VERSION': 1,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    }
+}
+FACET_CACHE_TIMEOUT = 300   # 商店侧栏分类计数的缓存时间 (秒), 商品变动时会提前失效
+PAGE_CACHE_TIMEOUT = 60     # 匿名整页缓存的有效期 (秒), 依赖的商品变动时会提前失效
+PAGE_CACHE_STALE = 600      # 过期后还可以先返回旧页面、同时由一个请求重新渲染的时间 (秒)
+
+# 搜索框输入提示 (goods/suggest.py): 每个进程内存里的前缀索引
+SUGGEST_MAX_TERMS = 100000      # 最多收录的词条数 (商品名 + 课程代码 + 教授), 每个进程约 60 MB
+SUGGEST_REBUILD_SECONDS = 900   # 索引建立超过这个时间后在后台重建, 同步其它进程的修改
+
+# 搜索词统计和热门搜索 (goods/querylog.py): 计数先攒在内存里, 批量写入数据库
+SEARCH_LOG_FLUSH_SIZE = 100         # 攒够这么多次搜索写一次
+SEARCH_LOG_FLUSH_SECONDS = 60       # 或者离上次写入超过这个时间 (秒)
+POPULAR_SEARCHES_DAYS = 30          # 热门搜索只看最近这么多天搜过的词
+POPULAR_SEARCHES_TIMEOUT = 600      # 热门搜索列表的缓存时间 (秒)
+POPULAR_SEARCHES_MIN_COUNT = 3      # 次数达到这个值的词才显示成热门搜索
+SEARCH_LOG_CLIENT_SECONDS = 86400   # 同一个地址搜同一个词, 这段时间 (秒) 内只计一次
+
+# 商店、商品详情、收藏列表和商品 API 的读请求用异步视图 (marketplace/async_views.py, api/async_views.py)。
+# 用 ASGI 部署 (uvicorn PatchProject.asgi:application) 时设为 True; WSGI 下保持 False
+ASYNC_VIEWS = False
+if ASYNC_VIEWS:
+    # ASGI 下每个请求的同步代码都在新线程里执行, 持久连接不会被复用, 只会让用过的线程各占着一个连接
+    DATABASES['default']['CONN_MAX_AGE'] = 0
+
+# 请求指标 (monitoring 应用): 按视图统计耗时、SQL、模板渲染和响应大小, /metrics 提供 Prometheus 格式
+METRICS_SERVER_TIMING = True                # 响应里加 Server-Timing 头 (浏览器开发者工具里可见)
+METRICS_ALLOWED_IPS = ['127.0.0.1', '::1']  # 可以访问 /metrics 的地址, None 表示不限制
+METRICS_N_PLUS_ONE_THRESHOLD = 10           # 同一条 SQL 在一个请求里执行这么多次时记警告日志
+
+# 请求剖析 (monitoring/profiling.py): 签名请求头 / 抽样 / 慢请求, 结果用 manage.py profile_summary 汇总
+PROFILING_ENABLED = False           # 总开关; 关闭时中间件不加载, 没有任何开销
+PROFILING_TOKEN_MAX_AGE = 3600      # manage.py profile_token 生成的令牌有效期 (秒)
+PROFILING_SAMPLE_EVERY = 0          # 平均每 N 个请求用 cProfile 剖析一个, 0 表示不抽样
+PROFILING_SLOW_MS = 0               # 超过这个时间的请求保存调用栈采样, 0 表示不启用
+PROFILING_STACK_INTERVAL_MS = 10    # 调用栈采样间隔 (毫秒)
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_FILES = 200           # 最多保留的剖析文件数, 超出时删除最旧的
+
 # 在文件末尾添加静态文件和媒体文件配置
 STATICFILES_DIRS = [BASE_DIR / 'static']
 
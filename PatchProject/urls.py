@@ -3,9 +3,13 @@ from django.urls import path, include
 from django.conf import settings
 from django.conf.urls.static import static
 
+from monitoring import views as monitoring_views
+
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('goods/', include('goods.urls')),
+    path('api/', include('api.urls')),
+    path('metrics', monitoring_views.metrics, name='metrics'),
     path('', include('marketplace.urls')),  # 添加这一行
 ]
 
@@ -7,6 +7,7 @@ For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/wsgi/
 """
 
+import atexit
 import os
 
 from django.core.wsgi import get_wsgi_application
@@ -14,3 +15,9 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PatchProject.settings')
 
 application = get_wsgi_application()
+
+# 服务器进程启动时在后台建立搜索框输入提示的索引, 退出时写掉还没写入的搜索词计数
+from goods import querylog, suggest  # noqa: E402
+
+suggest.suggestions.start()
+atexit.register(querylog.flush)
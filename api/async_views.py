@@ -0,0 +1,126 @@
+"""商品 API 读请求的异步版本, ASGI 部署时使用 (settings.ASYNC_VIEWS = True)
+
+DRF 的视图只能同步执行, 所以这里只接管协商结果是 JSON 的 GET 请求 (列表和详情),
+输出和 api/views.py 的 DRF 视图一样 (同样的 JSONRenderer 和 ETag);
+其它请求 (写操作、HEAD/OPTIONS、可浏览 API 页面、NDJSON 导出、406) 原样交给 DRF 视图。
+API 的权限是 IsAuthenticatedOrReadOnly, GET 对所有人开放, 所以读请求跳过 DRF 的认证流程
+结果相同; 带 Authorization 头的请求 (凭据错误时 DRF 会拒绝) 也交给 DRF 视图。
+"""
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import NotAcceptable
+from rest_framework.negotiation import DefaultContentNegotiation
+from rest_framework.renderers import JSONRenderer
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from api import views
+from api.pagination import GoodsCursorPagination
+from api.renderers import NDJSONRenderer
+from api.serializers import GoodsSerializer
+from database.replicas import replica_reads
+from goods.models import CatalogueVersion, Goods
+
+LIST_RENDERERS = [*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer]
+
+
+def _json_request(request, renderer_classes):
+    """请求协商出来是 JSON 的 GET 时返回 DRF 的 Request, 否则返回 None (交给 DRF 视图)"""
+    if request.method != 'GET' or 'HTTP_AUTHORIZATION' in request.META:
+        return None
+    drf_request = Request(request)
+    try:
+        renderer, media_type = DefaultContentNegotiation().select_renderer(
+            drf_request, [renderer() for renderer in renderer_classes],
+        )
+    except NotAcceptable:
+        return None
+    if not isinstance(renderer, JSONRenderer):
+        return None
+    drf_request.accepted_renderer, drf_request.accepted_media_type = renderer, media_type
+    return drf_request
+
+
+def _response(drf_request, data, allow, status_code=status.HTTP_200_OK):
+    """和 DRF 的 Response 渲染结果一样: 同样的内容、Content-Type、Vary 和 Allow"""
+    renderer = drf_request.accepted_renderer
+    content = renderer.render(data, drf_request.accepted_media_type, {'request': drf_request})
+    response = HttpResponse(content, status=status_code)
+    if content:
+        response['Content-Type'] = f'{renderer.media_type}; charset={renderer.charset}' \
+            if renderer.charset else renderer.media_type
+    else:
+        del response['Content-Type']
+    response['Allow'] = allow
+    patch_vary_headers(response, ['Accept'])
+    return response
+
+
+def _not_modified(request, etag, last_modified=None):
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    return get_conditional_response(request, etag=etag, last_modified=timestamp)
+
+
+def _list_page(drf_request, fields):
+    """DRF 的游标分页在内部执行查询, 只能同步调用"""
+    goods = Goods.objects.all()
+    if fields is not None:
+        goods = goods.only(*{'id', 'created_at', *fields})
+    paginator = GoodsCursorPagination()
+    page = paginator.paginate_queryset(goods, drf_request)
+    return paginator.get_paginated_response(GoodsSerializer(page, many=True, fields=fields).data).data
+
+
+def _same_as(drf_view):
+    """可浏览 API 的面包屑按 URL 找到视图上的 DRF 类来取名字, 异步视图沿用 DRF 视图的"""
+    def decorator(view):
+        view.cls, view.initkwargs = drf_view.cls, drf_view.initkwargs
+        return view
+    return decorator
+
+
+@replica_reads
+@_same_as(views.goods_list)
+@csrf_exempt
+async def goods_list(request):
+    drf_request = _json_request(request, LIST_RENDERERS)
+    if drf_request is None:
+        return await sync_to_async(views.goods_list)(request)
+    allow = 'GET, POST, OPTIONS'
+    etag = views.list_etag(request, await CatalogueVersion.stamp().afirst())
+    response = _not_modified(request, etag)
+    if response is None:
+        try:
+            fields = views._requested_fields(drf_request)
+        except ValueError as exc:
+            response = _response(drf_request, {'fields': [str(exc)]}, allow, status.HTTP_400_BAD_REQUEST)
+        else:
+            response = _response(drf_request, await sync_to_async(_list_page)(drf_request, fields), allow)
+    response.headers.setdefault('ETag', etag)
+    return response
+
+
+@replica_reads
+@_same_as(views.goods_detail)
+@csrf_exempt
+async def goods_detail(request, id):
+    drf_request = _json_request(request, api_settings.DEFAULT_RENDERER_CLASSES)
+    if drf_request is None:
+        return await sync_to_async(views.goods_detail)(request, id=id)
+    allow = 'GET, PUT, DELETE, OPTIONS'
+    # 一条查询: ETag 和 Last-Modified 直接用取出来的商品计算
+    goods = await Goods.objects.filter(id=id).afirst()
+    if goods is None:
+        return _response(drf_request, None, allow, status.HTTP_404_NOT_FOUND)
+
+    etag = f'"{id}-{goods.updated_at.timestamp()}"'
+    response = _not_modified(request, etag, goods.updated_at)
+    if response is None:
+        response = _response(drf_request, GoodsSerializer(goods).data, allow)
+    response.headers.setdefault('ETag', etag)
+    response.headers.setdefault('Last-Modified', http_date(int(goods.updated_at.timestamp())))
+    return response
@@ -0,0 +1,121 @@
+"""商品批量导入 (POST /api/goods/bulk/)
+
+每行是一个商品对象: 带 id 的行按部分字段更新已有商品, 不带 id 的行新建。
+整批一次校验, 然后在同一个事务里用 bulk_create / bulk_update 写入,
+返回每行的错误信息 (行号从 0 开始)。
+
+新建的商品属于调用者, 只能更新调用者自己的商品; seller 字段忽略。
+"""
+from django.db import transaction
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+
+from api.serializers import GoodsBulkSerializer
+from goods.models import Goods
+from goods.signals import goods_bulk_saved
+
+BATCH_SIZE = 500
+# SQLite / BigAutoField 的 id 上限
+MAX_ID = 2 ** 63 - 1
+
+
+def _id_errors(value):
+    if isinstance(value, bool) or not isinstance(value, int) or not 0 < value <= MAX_ID:
+        return {'id': ['A valid positive integer is required.']}
+    return None
+
+
+def _validate(rows, partial):
+    """用同一个 serializer 实例逐行校验 (与 ListSerializer 的做法相同),
+    返回与 rows 对齐的 (validated, errors); partial (更新) 时还要校验 id"""
+    serializer = GoodsBulkSerializer(partial=partial)
+    validated, errors = [], []
+    for row in rows:
+        id_errors = _id_errors(row['id']) if partial else None
+        if id_errors:
+            validated.append(None)
+            errors.append(id_errors)
+            continue
+        try:
+            validated.append(serializer.run_validation(row))
+            errors.append({})
+        except ValidationError as exc:
+            validated.append(None)
+            errors.append(exc.detail)
+    return validated, errors
+
+
+def ingest(rows, seller, atomic=False):
+    """以 seller 的身份导入一批商品, 返回 {'created': [...], 'updated': [...], 'errors': [...]}
+
+    atomic=True 时任何一行出错就整批不写入。
+    """
+    errors = {}
+    creates, updates = [], []
+    seen_ids = set()
+    for index, row in enumerate(rows):
+        if not isinstance(row, dict):
+            errors[index] = {'non_field_errors': ['Expected an object.']}
+        elif row.get('id') is not None:
+            # 同一批里重复的 id 只有第一行有效; 无效的 id 由 _validate 报错
+            if _id_errors(row['id']) is None:
+                if row['id'] in seen_ids:
+                    errors[index] = {'id': [f'Duplicate id {row["id"]} in this batch.']}
+                    continue
+                seen_ids.add(row['id'])
+            updates.append((index, row))
+        else:
+            creates.append((index, row))
+
+    # 校验: 新建要求完整字段, 更新只校验出现的字段
+    validated = {}
+    for group, partial in ((creates, False), (updates, True)):
+        if not group:
+            continue
+        data, group_errors = _validate([row for _, row in group], partial)
+        for (index, _), values, row_errors in zip(group, data, group_errors):
+            if row_errors:
+                errors[index] = row_errors
+            else:
+                validated[index] = values
+
+    # 要更新的商品一次性查询 (id 已经校验过)
+    existing = Goods.objects.in_bulk([row['id'] for index, row in updates if index in validated])
+
+    new_objects, changed_objects, changed_fields = [], [], set()
+    for index, values in sorted(validated.items()):
+        row = rows[index]
+        if row.get('id') is None:
+            new_objects.append((index, Goods(**values, seller=seller)))
+            continue
+        goods = existing.get(row['id'])
+        if goods is None:
+            errors[index] = {'id': [f'Item {row["id"]} does not exist.']}
+            continue
+        if goods.seller_id != seller.id:
+            errors[index] = {'id': [f'You can only update your own items (item {row["id"]}).']}
+            continue
+        for name, value in values.items():
+            setattr(goods, name, value)
+        changed_fields.update(values)
+        changed_objects.append(goods)
+
+    result = {'created': [], 'updated': [], 'errors': [
+        {'index': index, 'errors': errors[index]} for index in sorted(errors)
+    ]}
+    if atomic and errors:
+        return result
+
+    with transaction.atomic():
+        created = Goods.objects.bulk_create([goods for _, goods in new_objects], batch_size=BATCH_SIZE)
+        if changed_objects and changed_fields:
+            # bulk_update 不会处理 auto_now, 手动更新修改时间
+            now = timezone.now()
+            for goods in changed_objects:
+                goods.updated_at = now
+            Goods.objects.bulk_update(changed_objects, sorted(changed_fields | {'updated_at'}), batch_size=BATCH_SIZE)
+        goods_bulk_saved.send(sender=Goods, instances=[*created, *changed_objects])
+
+    result['created'] = [goods.pk for goods in created]
+    result['updated'] = [goods.pk for goods in changed_objects]
+    return result
@@ -0,0 +1,10 @@
+from django.conf import settings
+from rest_framework.pagination import CursorPagination
+
+
+class GoodsCursorPagination(CursorPagination):
+    """商品列表游标分页, 按 (created_at, id) 倒序; 每页数量可用 ?page_size= 调整, 上限见 settings"""
+    ordering = ('-created_at', '-id')
+    page_size = getattr(settings, 'API_PAGE_SIZE', 50)
+    page_size_query_param = 'page_size'
+    max_page_size = getattr(settings, 'API_MAX_PAGE_SIZE', 200)
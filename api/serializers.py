@@ -1,6 +1,30 @@
 from rest_framework import serializers
 from goods.models import Goods
-class GoodsSerializer(serializers.ModelSerializer):
+
+
+class DynamicFieldsModelSerializer(serializers.ModelSerializer):
+    """支持 fields 参数只输出部分字段 (稀疏字段集)"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class GoodsSerializer(DynamicFieldsModelSerializer):
     class Meta:
         model = Goods
         fields = '__all__'
+        # 卖家就是发布商品的用户, 由视图设置, 不能通过 API 修改
+        read_only_fields = ['seller']
+
+
+class GoodsBulkSerializer(serializers.ModelSerializer):
+    """批量导入用: seller 只读, 新建的商品属于调用者 (api.bulk 设置)"""
+
+    class Meta:
+        model = Goods
+        fields = '__all__'
+        read_only_fields = ['seller']
@@ -0,0 +1,236 @@
+import json
+
+from django.contrib.auth.models import User
+from django.test import TestCase, override_settings
+
+from goods.models import Goods
+
+
+class PermissionTests(TestCase):
+    """所有人可读; 写操作要登录, 改/删只限卖家"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass12345')
+        cls.other = User.objects.create_user('other', password='pass12345')
+        cls.item = Goods.objects.create(name='Easel', price=5, seller=cls.seller)
+
+    def setUp(self):
+        self.client = self.client_class(enforce_csrf_checks=True)
+
+    def send(self, method, url, data=None):
+        return getattr(self.client, method)(url, json.dumps(data or {}), content_type='application/json')
+
+    def detail(self):
+        return f'/api/goods/{self.item.id}/'
+
+    def test_anonymous_clients_can_only_read(self):
+        self.assertEqual(self.client.get('/api/goods/').status_code, 200)
+        self.assertEqual(self.client.get(self.detail()).status_code, 200)
+        changes = {'name': 'pwned', 'price': '1'}
+        for method, url in (('post', '/api/goods/'), ('put', self.detail()), ('delete', self.detail())):
+            self.assertIn(self.send(method, url, changes).status_code, (401, 403), method)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.name, 'Easel')
+        self.assertEqual(Goods.objects.count(), 1)
+
+    def test_only_the_seller_can_change_an_item(self):
+        # 测试时关掉 CSRF 检查, 只看权限
+        self.client = self.client_class()
+        self.client.force_login(self.other)
+        self.assertEqual(self.send('put', self.detail(), {'name': 'Mine now', 'price': '1'}).status_code, 403)
+        self.assertEqual(self.send('delete', self.detail()).status_code, 403)
+        self.assertTrue(Goods.objects.filter(pk=self.item.pk).exists())
+
+        self.client.force_login(self.seller)
+        response = self.send('put', self.detail(), {'name': 'Easel v2', 'price': '6', 'seller': self.other.id})
+        self.assertEqual(response.status_code, 200)
+        self.item.refresh_from_db()
+        self.assertEqual((self.item.name, self.item.seller_id), ('Easel v2', self.seller.id))
+        self.assertEqual(self.send('delete', self.detail()).status_code, 204)
+
+    def test_created_items_belong_to_the_caller(self):
+        self.client = self.client_class()
+        self.client.force_login(self.other)
+        response = self.send('post', '/api/goods/', {'name': 'Tripod', 'price': '9', 'seller': self.seller.id})
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(Goods.objects.get(pk=response.json()['id']).seller, self.other)
+
+
+class ListTests(TestCase):
+    """游标分页、?fields= 和 NDJSON 导出"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [Goods.objects.create(name=f'Item {i}', price=i).id for i in range(5)]
+
+    def test_cursor_round_trip(self):
+        seen, url = [], '/api/goods/?page_size=2'
+        pages = []
+        while url:
+            body = self.client.get(url).json()
+            pages.append(body)
+            seen += [item['id'] for item in body['results']]
+            url = body['next']
+        self.assertEqual(seen, self.ids[::-1])
+        self.assertEqual(len(pages), 3)
+        previous = self.client.get(pages[-1]['previous']).json()
+        self.assertEqual([item['id'] for item in previous['results']], seen[2:4])
+        self.assertEqual(self.client.get('/api/goods/?cursor=garbage').status_code, 404)
+
+    def test_sparse_fields(self):
+        body = self.client.get('/api/goods/?fields=id,name').json()
+        self.assertEqual(set(body['results'][0]), {'id', 'name'})
+        response = self.client.get('/api/goods/?fields=id,password,secret')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': ['Unknown fields: password, secret']})
+
+    def test_ndjson_export_streams_every_row(self):
+        for url, headers in (('/api/goods/?format=ndjson&fields=id,price', {}),
+                             ('/api/goods/?fields=id,price', {'accept': 'application/x-ndjson'})):
+            response = self.client.get(url, headers=headers)
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.streaming)
+            self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+            lines = b''.join(response.streaming_content).decode().splitlines()
+            self.assertEqual([json.loads(line) for line in lines],
+                             [{'id': goods_id, 'price': f'{i}.00'} for i, goods_id in enumerate(self.ids)])
+        # 错误信息也按 NDJSON 输出
+        response = self.client.get('/api/goods/?format=ndjson&fields=x')
+        self.assertEqual((response.status_code, response['Content-Type']), (400, 'application/x-ndjson; charset=utf-8'))
+        self.assertEqual(json.loads(response.content), {'fields': ['Unknown fields: x']})
+
+
+class ConditionalTests(TestCase):
+    """列表和详情的 ETag: 304 / 412"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass12345')
+        cls.items = [Goods.objects.create(name=f'Item {i}', price=i, seller=cls.seller) for i in range(3)]
+
+    def test_list_not_modified(self):
+        etag = self.client.get('/api/goods/')['ETag']
+        # ETag 只要一条走索引的查询
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get('/api/goods/', headers={'if-none-match': etag}).status_code, 304)
+        self.assertNotEqual(self.client.get('/api/goods/?page_size=1')['ETag'], etag)
+
+    def test_list_etag_changes_on_update_and_delete(self):
+        etags = [self.client.get('/api/goods/')['ETag']]
+        self.items[0].name = 'Renamed'
+        self.items[0].save()
+        etags.append(self.client.get('/api/goods/')['ETag'])
+        # 删除的不是最新修改的商品, 最大的 updated_at 不变, 靠删除计数发现
+        self.items[1].delete()
+        response = self.client.get('/api/goods/', headers={'if-none-match': etags[-1]})
+        self.assertEqual(response.status_code, 200)
+        etags.append(response['ETag'])
+        self.assertEqual(len(set(etags)), 3)
+
+    def test_detail_precondition_failed(self):
+        self.client.force_login(self.seller)
+        url = f'/api/goods/{self.items[0].id}/'
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+
+        def put(if_match):
+            data = json.dumps({'name': 'Easel', 'price': '5'})
+            return self.client.put(url, data, content_type='application/json', headers={'if-match': if_match})
+
+        self.assertEqual(put('"stale"').status_code, 412)
+        self.assertEqual(put(etag).status_code, 200)
+        # 修改之后旧的 ETag 就过期了
+        self.assertEqual(put(etag).status_code, 412)
+
+
+class BulkTests(TestCase):
+    """POST /api/goods/bulk/"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass12345')
+        cls.other = User.objects.create_user('other', password='pass12345')
+        cls.mine = Goods.objects.create(name='Easel', price=5, seller=cls.seller)
+        cls.theirs = Goods.objects.create(name='Tripod', price=5, seller=cls.other)
+
+    def setUp(self):
+        self.client.force_login(self.seller)
+
+    def post(self, rows, query=''):
+        return self.client.post(f'/api/goods/bulk/{query}', json.dumps(rows), content_type='application/json')
+
+    def errors(self, response):
+        return {error['index']: error['errors'] for error in response.json()['errors']}
+
+    def test_requires_login(self):
+        self.client.logout()
+        response = self.post([{'id': self.theirs.id, 'name': 'pwned'}])
+        self.assertIn(response.status_code, (401, 403))
+        self.theirs.refresh_from_db()
+        self.assertEqual(self.theirs.name, 'Tripod')
+
+    def test_insert_and_update(self):
+        response = self.post([
+            {'name': 'Canvas', 'price': '3', 'seller': self.other.id},
+            {'id': self.mine.id, 'name': 'Easel v2', 'seller': self.other.id},
+        ])
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual(body['updated'], [self.mine.id])
+        created = Goods.objects.get(pk=body['created'][0])
+        self.assertEqual((created.name, created.seller), ('Canvas', self.seller))
+        self.mine.refresh_from_db()
+        self.assertEqual((self.mine.name, self.mine.seller), ('Easel v2', self.seller))
+
+    def test_ndjson_body(self):
+        response = self.client.post('/api/goods/bulk/', '{"name": "Canvas", "price": "3"}\n\n',
+                                    content_type='application/x-ndjson')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['created']), 1)
+
+    def test_cannot_update_other_sellers_items(self):
+        response = self.post([{'id': self.theirs.id, 'name': 'pwned'}])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('id', self.errors(response)[0])
+        self.theirs.refresh_from_db()
+        self.assertEqual(self.theirs.name, 'Tripod')
+
+    def test_partial_errors(self):
+        response = self.post([
+            {'name': 'Canvas', 'price': '3'},
+            {'name': 'No price'},
+            'not an object',
+            {'id': 999999, 'name': 'Ghost'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        self.assertEqual(sorted(self.errors(response)), [1, 2, 3])
+        self.assertEqual(len(response.json()['created']), 1)
+
+    def test_atomic_mode_writes_nothing_on_error(self):
+        response = self.post([{'name': 'Canvas', 'price': '3'}, {'name': 'No price'}], '?atomic=1')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['created'], [])
+        self.assertFalse(Goods.objects.filter(name='Canvas').exists())
+
+    @override_settings(API_BULK_MAX_ROWS=2)
+    def test_row_cap(self):
+        response = self.post([{'name': f'Item {i}', 'price': '1'} for i in range(3)])
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'detail': 'At most 2 items per request.'})
+        self.assertEqual(self.post({'name': 'Canvas'}).status_code, 400)
+
+    def test_bad_and_duplicate_ids_are_row_errors(self):
+        bad = ['abc', {'a': 1}, 10 ** 30, -1, 0, True, 1.5]
+        response = self.post([
+            *({'id': value, 'name': 'x'} for value in bad),
+            {'id': self.mine.id, 'name': 'First'},
+            {'id': self.mine.id, 'name': 'Second'},
+        ])
+        self.assertEqual(response.status_code, 207)
+        errors = self.errors(response)
+        self.assertEqual(sorted(errors), [*range(len(bad)), len(bad) + 1])
+        self.assertIn('Duplicate id', errors[len(bad) + 1]['id'][0])
+        self.assertEqual(response.json()['updated'], [self.mine.id])
+        self.mine.refresh_from_db()
+        self.assertEqual(self.mine.name, 'First')
@@ -1,7 +1,12 @@
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, views
+
+# ASGI 部署时读请求用异步版本, 其它请求仍由 DRF 视图处理
+reads = async_views if settings.ASYNC_VIEWS else views
 
 urlpatterns = [
-    path('goods/', views.goods_list),
-    path('goods/<int:id>/', views.goods_detail)
+    path('goods/', reads.goods_list),
+    path('goods/bulk/', views.goods_bulk),
+    path('goods/<int:id>/', reads.goods_detail)
 ]
\ No newline at end of file
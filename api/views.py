@@ -1,30 +1,148 @@
+import hashlib
+
+from django.conf import settings
+from django.http import StreamingHttpResponse
+from django.views.decorators.http import condition
 from rest_framework import status
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
 from rest_framework.response import Response
-from rest_framework.decorators import api_view
+from rest_framework.decorators import api_view, parser_classes, permission_classes, renderer_classes
+from rest_framework.settings import api_settings
 
+from api import bulk
+from api.pagination import GoodsCursorPagination
+from api.parsers import NDJSONParser
+from api.renderers import NDJSONRenderer, dumps
 from api.serializers import GoodsSerializer
-from goods.models import Goods
+from database.replicas import replica_reads
+from goods.models import CatalogueVersion, Goods
+
+# NDJSON 导出时每次从数据库取的行数
+EXPORT_CHUNK_SIZE = 2000
+
+
+def _requested_fields(request):
+    """解析 ?fields=id,name,price; 未指定时返回 None (全部字段)"""
+    raw = request.query_params.get('fields')
+    if not raw:
+        return None
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = set(fields) - set(GoodsSerializer().fields)
+    if unknown:
+        raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+    return fields
+
+
+def _stream_ndjson(queryset, fields):
+    """逐块读取并输出, 内存占用与总行数无关"""
+    serializer = GoodsSerializer(fields=fields)
+    buffer = []
+    for goods in queryset.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+        buffer.append(dumps(serializer.to_representation(goods)))
+        if len(buffer) >= EXPORT_CHUNK_SIZE:
+            yield '\n'.join(buffer) + '\n'
+            buffer = []
+    if buffer:
+        yield '\n'.join(buffer) + '\n'
+
+
+def _list_etag(request):
+    """列表的 ETag: 商品目录的版本 (最大修改时间 + 删除数, 见 CatalogueVersion) + 查询参数
+
+    一条走索引的查询, 不用像 COUNT 那样扫描整张表。
+    """
+    if request.method not in ('GET', 'HEAD'):
+        return None
+    return list_etag(request, CatalogueVersion.stamp().first())
+
+
+def list_etag(request, stamp):
+    latest, deletions = stamp or (None, None)
+    key = f"{latest}:{deletions or 0}:{request.META.get('QUERY_STRING', '')}:" \
+          f"{request.META.get('HTTP_ACCEPT', '')}"
+    return f'"{hashlib.md5(key.encode()).hexdigest()}"'
+
 
+def _detail_updated_at(request, id):
+    if not hasattr(request, '_goods_updated_at'):
+        request._goods_updated_at = Goods.objects.filter(id=id).values_list('updated_at', flat=True).first()
+    return request._goods_updated_at
 
+
+def _detail_etag(request, id):
+    updated_at = _detail_updated_at(request, id)
+    return f'"{id}-{updated_at.timestamp()}"' if updated_at else None
+
+
+@replica_reads
 @api_view(['GET','POST'])
+@renderer_classes([*api_settings.DEFAULT_RENDERER_CLASSES, NDJSONRenderer])
+@condition(etag_func=_list_etag)
 def goods_list(request):
     if request.method == 'GET':
-         goods = Goods.objects.all()
-         serializer = GoodsSerializer(goods, many=True)
-         return Response(serializer.data)
+        try:
+            fields = _requested_fields(request)
+        except ValueError as exc:
+            return Response({'fields': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+
+        goods = Goods.objects.all()
+        if fields is not None:
+            # 只查需要的列; 分页游标要用 created_at 和 id
+            goods = goods.only(*{'id', 'created_at', *fields})
+
+        # 全量导出: ?format=ndjson 或 Accept: application/x-ndjson
+        if request.accepted_renderer.format == NDJSONRenderer.format:
+            return StreamingHttpResponse(
+                _stream_ndjson(goods.order_by('id'), fields),
+                content_type=NDJSONRenderer.media_type,
+            )
+
+        paginator = GoodsCursorPagination()
+        page = paginator.paginate_queryset(goods, request)
+        serializer = GoodsSerializer(page, many=True, fields=fields)
+        return paginator.get_paginated_response(serializer.data)
     if request.method == "POST":
         serializer = GoodsSerializer(data=request.data)
         if serializer.is_valid():
-            serializer.save()
+            serializer.save(seller=request.user)
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+@parser_classes([*api_settings.DEFAULT_PARSER_CLASSES, NDJSONParser])
+def goods_bulk(request):
+    """批量新建/更新自己的商品: JSON 数组或 NDJSON; ?atomic=1 时有任何错误就整批不写入"""
+    rows = request.data
+    if not isinstance(rows, list):
+        return Response({'detail': 'Expected a list of items.'}, status=status.HTTP_400_BAD_REQUEST)
+    if len(rows) > settings.API_BULK_MAX_ROWS:
+        return Response({'detail': f'At most {settings.API_BULK_MAX_ROWS} items per request.'},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    atomic = request.query_params.get('atomic') in ('1', 'true')
+    result = bulk.ingest(rows, request.user, atomic=atomic)
+    if not result['errors']:
+        code = status.HTTP_200_OK
+    elif result['created'] or result['updated']:
+        code = status.HTTP_207_MULTI_STATUS
+    else:
+        code = status.HTTP_400_BAD_REQUEST
+    return Response(result, status=code)
 
 
+@replica_reads
 @api_view(['GET','PUT','DELETE'])
+@condition(etag_func=_detail_etag, last_modified_func=_detail_updated_at)
 def goods_detail(request,id):
     try:
         goods = Goods.objects.get(id=id)
     except Goods.DoesNotExist:
         return Response(status=status.HTTP_404_NOT_FOUND)
+    # 登录由 IsAuthenticatedOrReadOnly 检查; 修改和删除只限卖家本人
+    if request.method not in SAFE_METHODS and goods.seller_id != request.user.id:
+        return Response({'detail': 'Only the seller can change this item.'}, status=status.HTTP_403_FORBIDDEN)
     if request.method == 'GET':
         serializer = GoodsSerializer(goods)
         return Response(serializer.data)
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class DatabaseConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'database'
+
+    def ready(self):
+        # 每个 SQLite 连接打开时执行 settings.SQLITE_PRAGMAS (见 database/sqlite.py)
+        from database import sqlite
+        sqlite.install()
@@ -0,0 +1,234 @@
+# database/management/commands/stress_sqlite.py
+"""SQLite 并发读写压力测试: Django 默认配置和 settings 里的配置对比
+
+在临时文件里建测试库, 用 seed_marketplace 生成数据后复制一份, 两份库分别用两种配置跑
+同样的负载: readers 个线程反复读商店第一页和商品详情, writers 个线程反复收藏/取消收藏和
+发消息 (和 marketplace 的视图走同样的代码)。输出每秒读写次数、p95 延迟和失败的写操作:
+
+    python manage.py stress_sqlite --items 5000 --readers 8 --writers 4 --seconds 10
+
+- default: Django 的默认值 (DELETE 日志、DEFERRED 事务、不持久连接: 每次操作重新连接、
+  不重试);
+- tuned: settings 里的 SQLITE_PRAGMAS、transaction_mode、CONN_MAX_AGE 和 SQLITE_WRITE_RETRIES。
+
+不会碰正式数据库和 media 目录。
+"""
+import json
+import os
+import random
+import shutil
+import tempfile
+import threading
+import time
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, transaction
+from django.db.models import F
+from django.test import override_settings
+
+from database.transactions import is_locked, retry_on_locked
+from goods import conversations
+from goods.models import Favorite, Goods
+
+
+@retry_on_locked
+def toggle_favorite(user_id, item_id):
+    """和 marketplace.views.toggle_favorite 一样的写事务"""
+    with transaction.atomic():
+        favorite, created = Favorite.objects.get_or_create(user_id=user_id, item_id=item_id)
+        if created:
+            Goods.touch(item_id, favorite_count=F('favorite_count') + 1)
+        elif Favorite.objects.filter(pk=favorite.pk).delete()[0]:
+            Goods.touch(item_id, favorite_count=F('favorite_count') - 1)
+
+
+def read_shop(rng, state):
+    list(Goods.objects.order_by('-created_at', '-id').prefetch_related('images')[:24])
+
+
+def read_item(rng, state):
+    Goods.objects.select_related('seller').prefetch_related('images').get(pk=rng.choice(state['item_ids']))
+
+
+def write_favorite(rng, state):
+    toggle_favorite(rng.choice(state['user_ids']), rng.choice(state['item_ids']))
+
+
+def write_message(rng, state):
+    item = rng.choice(state['items'])
+    buyer = rng.choice(state['users'])
+    conversation = conversations.start(item, buyer)
+    conversations.send(conversation, buyer, 'Is this still available?')
+
+
+READS = (read_shop, read_item)
+WRITES = (write_favorite, write_message)
+
+
+def _profiles():
+    """(名称, DATABASES 的覆盖项, 其它 settings)"""
+    return [
+        ('default', {'CONN_MAX_AGE': 0, 'OPTIONS': {}},
+         {'SQLITE_PRAGMAS': {}, 'SQLITE_WRITE_RETRIES': 0}),
+        ('tuned', {'CONN_MAX_AGE': settings.DATABASES['default'].get('CONN_MAX_AGE', 0),
+                   'OPTIONS': settings.DATABASES['default'].get('OPTIONS', {})},
+         {'SQLITE_PRAGMAS': settings.SQLITE_PRAGMAS, 'SQLITE_WRITE_RETRIES': settings.SQLITE_WRITE_RETRIES}),
+    ]
+
+
+class Worker(threading.Thread):
+    """在 deadline 之前反复执行 operations, 记录成功次数、延迟和失败"""
+
+    def __init__(self, operations, state, seed, start, deadline, reconnect):
+        super().__init__(daemon=True)
+        self.operations = operations
+        self.state = state
+        self.rng = random.Random(seed)
+        self.start_barrier = start
+        self.deadline = deadline
+        self.reconnect = reconnect
+        self.latencies = []
+        self.locked = 0
+        self.errors = []
+
+    def run(self):
+        self.start_barrier.wait()
+        try:
+            while time.perf_counter() < self.deadline[0]:
+                operation = self.rng.choice(self.operations)
+                started = time.perf_counter()
+                try:
+                    operation(self.rng, self.state)
+                    self.latencies.append((time.perf_counter() - started) * 1000)
+                except OperationalError as exc:
+                    if not is_locked(exc):
+                        raise
+                    self.locked += 1
+                finally:
+                    if self.reconnect:
+                        connection.close()
+        except Exception as exc:
+            self.errors.append(repr(exc))
+        finally:
+            connection.close()
+
+
+def _p95(latencies):
+    return sorted(latencies)[int(len(latencies) * 0.95) - 1] if latencies else 0.0
+
+
+class Command(BaseCommand):
+    help = 'Stress SQLite with concurrent reads and writes, default vs configured connection profile'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=5000)
+        parser.add_argument('--readers', type=int, default=8)
+        parser.add_argument('--writers', type=int, default=4)
+        parser.add_argument('--seconds', type=float, default=10)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('stress_sqlite only runs against SQLite.')
+
+        settings_dict = connection.settings_dict
+        saved = {key: settings_dict.get(key) for key in ('CONN_MAX_AGE', 'OPTIONS')}
+        test_settings = settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        results = {}
+        with tempfile.TemporaryDirectory() as tmp, override_settings(MEDIA_ROOT=os.path.join(tmp, 'media')):
+            seeded = os.path.join(tmp, 'seeded.sqlite3')
+            test_settings['NAME'] = seeded
+            with override_settings(SQLITE_PRAGMAS={}):
+                old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self._seed(options)
+                state = self._state()
+                connection.close()
+                for name, database, overrides in _profiles():
+                    # 每种配置一份独立的库: journal_mode=WAL 会写进文件
+                    path = os.path.join(tmp, f'{name}.sqlite3')
+                    shutil.copyfile(seeded, path)
+                    settings_dict.update(database, NAME=path)
+                    with override_settings(**overrides):
+                        results[name] = self._run(state, options)
+                    connection.close()
+                settings_dict['NAME'] = seeded
+            finally:
+                settings_dict.update(saved)
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = old_test_name
+
+        self._report(results, options)
+
+    def _seed(self, options):
+        self.stdout.write(f"Seeding {options['items']} items...")
+        call_command('seed_marketplace', goods=options['items'], users=max(options['items'] // 50, 10),
+                     no_images=True, seed=options['seed'], prefix='stress', stdout=StringIO())
+
+    def _state(self):
+        from django.contrib.auth.models import User
+
+        items = list(Goods.objects.order_by('?')[:500])
+        users = list(User.objects.order_by('?')[:200])
+        return {
+            'items': items, 'item_ids': [item.id for item in items],
+            'users': users, 'user_ids': [user.id for user in users],
+        }
+
+    def _run(self, state, options):
+        reconnect = not connection.settings_dict['CONN_MAX_AGE']
+        workers = options['readers'] + options['writers']
+        start = threading.Barrier(workers + 1)
+        deadline = [float('inf')]
+        threads = [
+            Worker(READS if index < options['readers'] else WRITES, state, options['seed'] + index,
+                   start, deadline, reconnect)
+            for index in range(workers)
+        ]
+        for thread in threads:
+            thread.start()
+        deadline[0] = time.perf_counter() + options['seconds']
+        start.wait()
+        for thread in threads:
+            thread.join()
+
+        errors = [error for thread in threads for error in thread.errors]
+        if errors:
+            raise CommandError(f'Worker failed: {errors[0]}')
+        readers, writers = threads[:options['readers']], threads[options['readers']:]
+        reads = [latency for thread in readers for latency in thread.latencies]
+        writes = [latency for thread in writers for latency in thread.latencies]
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            journal = cursor.fetchone()[0]
+        return {
+            'journal_mode': journal,
+            'reads_per_s': round(len(reads) / options['seconds'], 1),
+            'writes_per_s': round(len(writes) / options['seconds'], 1),
+            'read_p95_ms': round(_p95(reads), 2),
+            'write_p95_ms': round(_p95(writes), 2),
+            'locked_reads': sum(thread.locked for thread in readers),
+            'locked_writes': sum(thread.locked for thread in writers),
+        }
+
+    def _report(self, results, options):
+        self.stdout.write(f"{options['readers']} readers, {options['writers']} writers, "
+                          f"{options['seconds']:g}s per profile")
+        self.stdout.write(f'{"profile":<10}{"journal":>9}{"reads/s":>10}{"read p95":>10}'
+                          f'{"writes/s":>10}{"write p95":>11}{"locked r/w":>12}')
+        for name, row in results.items():
+            locked = f"{row['locked_reads']}/{row['locked_writes']}"
+            self.stdout.write(
+                f"{name:<10}{row['journal_mode']:>9}{row['reads_per_s']:>10.1f}{row['read_p95_ms']:>10.1f}"
+                f"{row['writes_per_s']:>10.1f}{row['write_p95_ms']:>11.1f}{locked:>12}"
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'options': {key: options[key] for key in ('items', 'readers', 'writers', 'seconds')},
+                           'results': results}, fh, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
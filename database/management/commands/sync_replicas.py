@@ -0,0 +1,69 @@
+# database/management/commands/sync_replicas.py
+"""把主库复制到 settings.DATABASE_REPLICAS 的每个 SQLite 副本
+
+    python manage.py sync_replicas                 # 复制一次
+    python manage.py sync_replicas --interval 5    # 每 5 秒复制一次, Ctrl+C 结束
+
+用 SQLite 的在线备份 API, 直接写进副本文件: 读到的是主库某一时刻的一致快照, 不用停写;
+正在读副本的连接 (WAL) 继续读旧版本, 复制完成后的新查询看到新数据。不替换文件, 所以
+已经打开的持久连接不会读到被删掉的旧文件。
+"""
+import sqlite3
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+def copy_database(source, target, pages=-1):
+    """把 source 文件的内容复制到 target 文件, 返回复制的页数
+
+    pages 是每一步复制的页数 (-1 表示一次全部复制); 分步时每步之间释放副本的写锁,
+    主库在复制过程中有写入时备份会从头开始。
+    """
+    src = sqlite3.connect(f'file:{source}?mode=ro', uri=True)
+    dst = sqlite3.connect(target)
+    copied = []
+    try:
+        dst.execute(f"PRAGMA busy_timeout = {settings.SQLITE_PRAGMAS.get('busy_timeout', 5000)}")
+        src.backup(dst, pages=pages, progress=lambda status, remaining, total: copied.append(total))
+    finally:
+        src.close()
+        dst.close()
+    return copied[-1] if copied else 0
+
+
+class Command(BaseCommand):
+    help = 'Copy the primary SQLite database into every replica listed in settings.DATABASE_REPLICAS'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--interval', type=float, default=0,
+                            help='Keep running and copy every N seconds (default: copy once)')
+        parser.add_argument('--pages', type=int, default=-1,
+                            help='Pages per backup step; -1 copies everything in one step')
+
+    def handle(self, *args, **options):
+        primary = connections[DEFAULT_DB_ALIAS].settings_dict
+        if primary['ENGINE'] != 'django.db.backends.sqlite3':
+            raise CommandError('sync_replicas only copies SQLite databases.')
+        if not settings.DATABASE_REPLICAS:
+            raise CommandError('settings.DATABASE_REPLICAS is empty.')
+        targets = []
+        for alias in settings.DATABASE_REPLICAS:
+            replica = connections[alias].settings_dict
+            if replica['ENGINE'] != primary['ENGINE'] or str(replica['NAME']) == str(primary['NAME']):
+                raise CommandError(f'Replica {alias!r} must be a separate SQLite file.')
+            targets.append((alias, str(replica['NAME'])))
+
+        while True:
+            for alias, target in targets:
+                started = time.perf_counter()
+                pages = copy_database(str(primary['NAME']), target, options['pages'])
+                self.stdout.write(f'{alias}: copied {pages} pages in {(time.perf_counter() - started) * 1000:.0f}ms')
+            if not options['interval']:
+                return
+            try:
+                time.sleep(options['interval'])
+            except KeyboardInterrupt:
+                return
@@ -0,0 +1,52 @@
+# database/middleware.py
+"""请求级别的读写分流状态, 写过数据库的浏览器在一段时间内只读主库 (见 database/replicas.py)"""
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from database import replicas
+
+
+def _pin(response):
+    seconds = settings.REPLICA_STICKY_SECONDS
+    response.set_cookie(replicas.COOKIE, str(int(time.time() + seconds)), max_age=seconds,
+                        httponly=True, samesite='Lax')
+
+
+class ReplicaMiddleware:
+    """放在 SessionMiddleware 前面, 保存会话的写操作也算在内; 没有配置副本时不加载"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = replicas.begin()
+        try:
+            response = self.get_response(request)
+        finally:
+            routing = replicas.end(token)
+        if routing.wrote:
+            _pin(response)
+        return response
+
+    async def __acall__(self, request):
+        token = replicas.begin()
+        try:
+            response = await self.get_response(request)
+        finally:
+            routing = replicas.end(token)
+        if routing.wrote:
+            _pin(response)
+        return response
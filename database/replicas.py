@@ -0,0 +1,93 @@
+# database/replicas.py
+"""读请求分流到只读副本 (settings.DATABASE_REPLICAS)
+
+只有用 @replica_reads 标记过的视图的 GET/HEAD 请求会读副本 (商店、商品详情和商品 API),
+视图里顺带的查询 (分类计数、相关商品、当前用户) 也一起走副本; 其它视图、写操作和事务
+里的读都走主库 default。
+
+副本是异步复制的 (manage.py sync_replicas), 可能落后几秒。为了让用户看到自己刚写的数据,
+一个请求里只要有写操作 (路由器的 db_for_write 被调用), 之后这个请求的读都回到主库,
+并且 ReplicaMiddleware 给响应加一个 cookie, REPLICA_STICKY_SECONDS 秒内这个浏览器的
+请求都只读主库。
+
+当前请求的状态放在 contextvar 里, 异步视图放到线程池里的查询也能看到。
+"""
+import functools
+import random
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+COOKIE = 'pin_primary'
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+_current = ContextVar('database_routing', default=None)
+
+
+class Routing:
+    """一个请求的路由状态"""
+
+    __slots__ = ('replica', 'wrote')
+
+    def __init__(self):
+        self.replica = False    # 视图允许读副本
+        self.wrote = False      # 这个请求写过数据库
+
+
+def begin():
+    return _current.set(Routing())
+
+
+def end(token):
+    routing = _current.get()
+    _current.reset(token)
+    return routing
+
+
+def read_alias():
+    """读操作用的数据库别名; None 表示由 Django 决定 (default, 或者对象本来所在的库)"""
+    routing = _current.get()
+    if routing is None or not routing.replica or routing.wrote or not settings.DATABASE_REPLICAS:
+        return None
+    if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+        # 事务里的读要看到事务自己写的数据
+        return None
+    return random.choice(settings.DATABASE_REPLICAS)
+
+
+def written():
+    routing = _current.get()
+    if routing is not None:
+        routing.wrote = True
+
+
+def pinned(request):
+    """这个浏览器最近写过数据, 还在只读主库的时间窗口里"""
+    try:
+        return float(request.COOKIES.get(COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+def _allow(request):
+    routing = _current.get()
+    if routing is not None and request.method in SAFE_METHODS and not pinned(request):
+        routing.replica = True
+
+
+def replica_reads(view):
+    """标记可以读副本的视图; 放在其它装饰器外面, ETag 等条件请求的查询也走副本"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            _allow(request)
+            return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            _allow(request)
+            return view(request, *args, **kwargs)
+    return wrapper
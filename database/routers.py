@@ -0,0 +1,29 @@
+# database/routers.py
+"""settings.DATABASE_ROUTERS: 写操作走主库, @replica_reads 视图里的读走副本 (见 database/replicas.py)"""
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+
+from database import replicas
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        return replicas.read_alias()
+
+    def db_for_write(self, model, **hints):
+        replicas.written()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # 副本是主库的拷贝, 从副本读出的对象可以和主库的对象关联
+        databases = {DEFAULT_DB_ALIAS, *settings.DATABASE_REPLICAS}
+        if obj1._state.db in databases and obj2._state.db in databases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # 副本的表结构随 sync_replicas 从主库复制
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
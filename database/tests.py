@@ -0,0 +1,138 @@
+import os
+import sqlite3
+import tempfile
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import OperationalError, connection, transaction
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+
+from database import replicas, sqlite
+from database.management.commands.sync_replicas import copy_database
+from database.middleware import ReplicaMiddleware
+from database.routers import PrimaryReplicaRouter
+from database.transactions import retry_on_locked
+from goods.models import Goods
+
+
+class PragmaTests(TestCase):
+
+    def pragma(self, name):
+        with connection.cursor() as cursor:
+            cursor.execute(f'PRAGMA {name}')
+            return cursor.fetchone()[0]
+
+    def test_connection_has_configured_pragmas(self):
+        self.assertEqual(self.pragma('busy_timeout'), 5000)
+        self.assertEqual(self.pragma('synchronous'), 1)  # NORMAL
+        self.assertEqual(self.pragma('cache_size'), -64000)
+
+    def test_busy_timeout_is_set_first(self):
+        with override_settings(SQLITE_PRAGMAS={'synchronous': 'normal', 'busy_timeout': 100}):
+            self.assertEqual(sqlite.pragmas(), ['PRAGMA busy_timeout = 100', 'PRAGMA synchronous = normal'])
+
+    def test_invalid_pragma_is_rejected(self):
+        with override_settings(SQLITE_PRAGMAS={'synchronous': 'normal; DROP TABLE x'}):
+            with self.assertRaises(ValueError):
+                sqlite.pragmas()
+
+
+@override_settings(SQLITE_WRITE_RETRIES=2, SQLITE_RETRY_DELAY=0)
+class RetryTests(SimpleTestCase):
+
+    def failing(self, *errors):
+        func = mock.Mock(side_effect=[*errors, 'ok'], __qualname__='write')
+        return func, retry_on_locked(func)
+
+    def test_retries_locked_errors(self):
+        func, wrapped = self.failing(OperationalError('database is locked'), OperationalError('database is locked'))
+        with self.assertLogs('database.transactions', 'WARNING'):
+            self.assertEqual(wrapped(), 'ok')
+        self.assertEqual(func.call_count, 3)
+
+    def test_gives_up_after_retries(self):
+        func, wrapped = self.failing(*[OperationalError('database is locked')] * 3)
+        with self.assertLogs('database.transactions', 'WARNING'), self.assertRaises(OperationalError):
+            wrapped()
+        self.assertEqual(func.call_count, 3)
+
+    def test_other_errors_are_not_retried(self):
+        func, wrapped = self.failing(OperationalError('no such table: goods_goods'))
+        with self.assertRaises(OperationalError):
+            wrapped()
+        self.assertEqual(func.call_count, 1)
+
+
+class NestedRetryTests(TestCase):
+
+    @override_settings(SQLITE_WRITE_RETRIES=2, SQLITE_RETRY_DELAY=0)
+    def test_inner_calls_are_not_retried(self):
+        func = mock.Mock(side_effect=OperationalError('database is locked'), __qualname__='write')
+        with transaction.atomic(), self.assertRaises(OperationalError):
+            retry_on_locked(func)()
+        self.assertEqual(func.call_count, 1)
+
+
+@override_settings(DATABASE_REPLICAS=['replica'])
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        self.seen = []
+
+    def view(self, request):
+        self.seen.append(self.router.db_for_read(Goods))
+        if request.method == 'POST' or 'write' in request.GET:
+            self.assertEqual(self.router.db_for_write(Goods), 'default')
+        self.seen.append(self.router.db_for_read(Goods))
+        return HttpResponse('ok')
+
+    def test_marked_views_read_from_replica_until_they_write(self):
+        middleware = ReplicaMiddleware(replicas.replica_reads(self.view))
+        response = middleware(RequestFactory().get('/'))
+        self.assertEqual(self.seen, ['replica', 'replica'])
+        self.assertNotIn(replicas.COOKIE, response.cookies)
+
+        self.seen.clear()
+        response = middleware(RequestFactory().get('/', {'write': 1}))
+        self.assertEqual(self.seen, ['replica', None])
+        self.assertEqual(response.cookies[replicas.COOKIE]['max-age'], 30)
+
+        # 写过数据的浏览器在时间窗口里只读主库
+        self.seen.clear()
+        request = RequestFactory().get('/')
+        request.COOKIES[replicas.COOKIE] = response.cookies[replicas.COOKIE].value
+        middleware(request)
+        self.assertEqual(self.seen, [None, None])
+
+    def test_unmarked_views_and_writes_use_primary(self):
+        ReplicaMiddleware(self.view)(RequestFactory().get('/'))
+        ReplicaMiddleware(replicas.replica_reads(self.view))(RequestFactory().post('/'))
+        self.assertEqual(self.seen, [None, None, None, None])
+
+    def test_replicas_are_not_migrated(self):
+        self.assertIs(self.router.allow_migrate('replica', 'goods'), False)
+        self.assertIsNone(self.router.allow_migrate('default', 'goods'))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_middleware_not_used_without_replicas(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ReplicaMiddleware(self.view)
+
+
+class CopyDatabaseTests(SimpleTestCase):
+
+    def test_copies_primary_into_replica(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        primary, replica = os.path.join(tmp.name, 'primary.sqlite3'), os.path.join(tmp.name, 'replica.sqlite3')
+        with sqlite3.connect(primary) as db:
+            db.execute('CREATE TABLE t (x)')
+            db.executemany('INSERT INTO t VALUES (?)', [(i,) for i in range(100)])
+        db.close()
+
+        self.assertGreater(copy_database(primary, replica), 0)
+        copy = sqlite3.connect(replica)
+        self.addCleanup(copy.close)
+        self.assertEqual(copy.execute('SELECT count(*) FROM t').fetchone()[0], 100)
@@ -0,0 +1,54 @@
+# database/transactions.py
+"""写操作遇到 "database is locked" 时有限次重试
+
+IMMEDIATE 事务在 BEGIN 时按 busy_timeout 等待写锁, 只有在繁忙时等满了才会报错; 这时整个
+写操作退避后重来, 最多 SQLITE_WRITE_RETRIES 次:
+
+    @retry_on_locked
+    def send(conversation, sender, content):
+        with transaction.atomic():
+            ...
+
+被装饰的函数要能安全地整个重来 (失败时它的事务已经回滚)。已经在外层事务里调用时不重试,
+直接把异常抛给外层: 外层事务已经失败, 只能由最外层重来。
+"""
+import functools
+import logging
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections
+
+logger = logging.getLogger(__name__)
+
+LOCKED_MESSAGES = ('database is locked', 'database table is locked')
+
+
+def is_locked(exc):
+    return isinstance(exc, OperationalError) and str(exc).startswith(LOCKED_MESSAGES)
+
+
+def retry_delay(attempt):
+    """第 attempt 次重试前的等待 (秒): 指数退避 + 抖动, 避免同时失败的写操作又同时重来"""
+    return settings.SQLITE_RETRY_DELAY * 2 ** attempt * random.uniform(0.5, 1.5)
+
+
+def retry_on_locked(func=None, *, using=DEFAULT_DB_ALIAS):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if connections[using].in_atomic_block:
+                return func(*args, **kwargs)
+            retries = settings.SQLITE_WRITE_RETRIES
+            for attempt in range(retries + 1):
+                try:
+                    return func(*args, **kwargs)
+                except OperationalError as exc:
+                    if attempt == retries or not is_locked(exc):
+                        raise
+                    logger.warning('%s: %s, retrying (%d/%d)', func.__qualname__, exc, attempt + 1, retries)
+                    time.sleep(retry_delay(attempt))
+        return wrapper
+
+    return decorator(func) if func is not None else decorator
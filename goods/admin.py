@@ -1,6 +1,6 @@
 # goods/admin.py
 from django.contrib import admin
-from .models import Goods, GoodsImage, OutcomeImage, Message, Favorite
+from .models import Goods, GoodsImage, OutcomeImage, Conversation, Message, Favorite, SearchQuery
 
 class GoodsImageInline(admin.TabularInline):
     """商品图片内联编辑"""
@@ -56,6 +56,13 @@ class OutcomeImageAdmin(admin.ModelAdmin):
     list_filter = ['goods']
 
 
+@admin.register(Conversation)
+class ConversationAdmin(admin.ModelAdmin):
+    list_display = ['item', 'buyer', 'seller', 'last_message_at', 'message_count', 'buyer_unread', 'seller_unread']
+    list_filter = ['last_message_at']
+    raw_id_fields = ['item', 'buyer', 'seller', 'last_sender']
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
     list_display = ['sender', 'item', 'created_at', 'is_read']
@@ -65,4 +72,10 @@ class MessageAdmin(admin.ModelAdmin):
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ['user', 'item', 'created_at']
-    list_filter = ['created_at']
\ No newline at end of file
+    list_filter = ['created_at']
+
+@admin.register(SearchQuery)
+class SearchQueryAdmin(admin.ModelAdmin):
+    list_display = ['query', 'count', 'last_searched_at']
+    search_fields = ['query']
+    ordering = ['-count']
@@ -0,0 +1,50 @@
+# goods/analysis.py
+"""搜索用的分词: 中英文混排的商品文字 -> 空格分隔的词
+
+FTS5 的 unicode61 分词器按空白和标点切分, 连续的汉字会被当成一个词, "水彩颜料套装"
+搜 "颜料" 就找不到。所以写入索引和查询之前先在 Python 里分好词, 再交给 FTS5:
+
+- 连续的汉字用 jieba 分词: 索引用搜索引擎模式 (cut_for_search, 长词之外再切出其中的短词);
+  查询先用精确模式 (cut) 分词, 长词再换成其中的短词, 所以 "水彩颜料" 也能搜到写成
+  "水彩 颜料" 的商品 (索引里一定有这些短词);
+- 其它文字按字母和数字切开, 课程代码 "DSD-3003-B" / "dsd3003b" 都是 dsd 3003 b,
+  查询时每个词做前缀匹配, 两种写法互相都能搜到。
+
+大小写和变音符号由 FTS5 处理 (remove_diacritics)。jieba 的词典在第一次分中文时加载 (约 1 秒)。
+"""
+import logging
+import re
+
+import jieba
+
+jieba.setLogLevel(logging.WARNING)
+
+# 汉字 (CJK 统一表意文字及扩展 A、兼容表意文字)
+_CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+_CHUNK_RE = re.compile(f'([{_CJK}]+)|([^\\W_{_CJK}]+)')
+# 字母和数字的分界: "dsd3003b" -> dsd, 3003, b
+_PART_RE = re.compile(r'\d+|[^\W\d_]+')
+
+
+def _tokens(text, cut):
+    for cjk, word in _CHUNK_RE.findall(text):
+        if cjk:
+            yield from (token for token in cut(cjk) if token.strip())
+        else:
+            yield from _PART_RE.findall(word)
+
+
+def _query_cut(text):
+    for word in jieba.cut(text):
+        parts = [part for part in jieba.cut_for_search(word) if part != word]
+        yield from parts or [word]
+
+
+def index_text(text):
+    """写入全文索引的文字"""
+    return ' '.join(_tokens(text, jieba.cut_for_search))
+
+
+def query_terms(query):
+    """查询里的词 (小写), 每个词在 FTS5 里做前缀匹配"""
+    return [token.lower() for token in _tokens(query, _query_cut)]
@@ -2,4 +2,8 @@ from django.apps import AppConfig
 
 class GoodsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
-    name = 'goods'
\ No newline at end of file
+    name = 'goods'
+
+    def ready(self):
+        # 注册信号处理 (搜索索引同步等)
+        from goods import signals  # noqa: F401
@@ -0,0 +1,94 @@
+# goods/conversations.py
+"""买家和卖家的对话 (收件箱)
+
+每个 (商品, 买家) 一个 Conversation, 最后一条消息和双方的未读数冗余保存在对话上:
+发消息时在同一个事务里插入 Message 并用 F() 更新计数, 收件箱和未读数只读对话表,
+不扫描消息。标记已读是一条批量 UPDATE, 不逐条保存消息。
+"""
+from django.db import transaction
+from django.db.models import F, Q, Sum
+
+from database.transactions import retry_on_locked
+from goods.models import Conversation, Message
+
+PREVIEW_LENGTH = 140
+
+# 收件箱: ?box= 的值 -> 当前用户在对话里的角色
+BOXES = {
+    'selling': 'seller',
+    'buying': 'buyer',
+}
+
+
+@retry_on_locked
+def start(item, buyer):
+    """买家和卖家关于 item 的对话, 没有时创建"""
+    conversation, _ = Conversation.objects.get_or_create(item=item, buyer=buyer, defaults={'seller_id': item.seller_id})
+    return conversation
+
+
+@retry_on_locked
+def send(conversation, sender, content):
+    """追加一条消息, 同时更新对话的最后消息和对方的未读数; 返回新消息"""
+    unread = 'buyer_unread' if sender.pk == conversation.seller_id else 'seller_unread'
+    with transaction.atomic():
+        message = Message.objects.create(
+            conversation=conversation, item_id=conversation.item_id, sender=sender, content=content,
+        )
+        Conversation.objects.filter(pk=conversation.pk).update(
+            last_message_at=message.created_at,
+            last_message_preview=content[:PREVIEW_LENGTH],
+            last_sender=sender,
+            message_count=F('message_count') + 1,
+            **{unread: F(unread) + 1},
+        )
+    return message
+
+
+@retry_on_locked
+def mark_read(conversation, user):
+    """把对方发来的未读消息标记为已读, 返回标记的条数; 没有未读时不写数据库"""
+    field = conversation.unread_field(user)
+    if not getattr(conversation, field):
+        return 0
+    with transaction.atomic():
+        updated = conversation.messages.filter(is_read=False).exclude(sender=user).update(is_read=True)
+        Conversation.objects.filter(pk=conversation.pk).update(**{field: 0})
+    setattr(conversation, field, 0)
+    return updated
+
+
+@retry_on_locked
+def mark_all_read(user, box):
+    """把收件箱里所有对话标记为已读: 消息和对话各一条 UPDATE; 返回对话数"""
+    role = BOXES[box]
+    unread = Conversation.objects.filter(**{role: user, f'{role}_unread__gt': 0})
+    with transaction.atomic():
+        Message.objects.filter(conversation__in=unread, is_read=False).exclude(sender=user).update(is_read=True)
+        return unread.update(**{f'{role}_unread': 0})
+
+
+def for_user(user):
+    """user 参与的对话 (买家或卖家)"""
+    return Conversation.objects.filter(Q(buyer=user) | Q(seller=user))
+
+
+def inbox(user, box):
+    """收件箱里的对话; 分页时按 (last_message_at, id) 倒序, 有对应的索引"""
+    return (
+        Conversation.objects.filter(**{BOXES[box]: user})
+        .select_related('item', 'buyer', 'seller').prefetch_related('item__images')
+    )
+
+
+def unread_counts(user):
+    """{box: 未读消息数}, 一条查询"""
+    totals = for_user(user).aggregate(**{
+        box: Sum(f'{role}_unread', filter=Q(**{role: user})) for box, role in BOXES.items()
+    })
+    return {box: total or 0 for box, total in totals.items()}
+
+
+def thread(conversation):
+    """对话里的消息; 分页时按 (created_at, id) 倒序, 有对应的索引"""
+    return conversation.messages.select_related('sender')
@@ -0,0 +1,47 @@
+# goods/facets.py
+"""商店侧栏的专业 / 类别计数
+
+一次 GROUP BY (major, category) 查询得到二维计数表, 两个分面都从这张表里求和:
+专业的计数按当前类别筛选 (不按专业本身筛选), 类别的计数反过来, 这样选中一个
+专业后仍能看到切换到其它专业会有多少商品。
+
+没有搜索词时用的是全部商品的计数表, 存在缓存里, 商品保存/删除时失效
+(见 goods/signals.py), 普通的浏览和筛选不需要额外查询。
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count
+
+from goods.models import Goods
+
+CACHE_KEY = 'goods:facets'
+
+
+def grouped_counts(queryset):
+    """{(major, category): 数量}"""
+    rows = queryset.order_by().values_list('major', 'category').annotate(n=Count('id'))
+    return {(major, category): n for major, category, n in rows}
+
+
+def catalogue_counts():
+    """全部商品的计数表 (带缓存)"""
+    counts = cache.get(CACHE_KEY)
+    if counts is None:
+        counts = grouped_counts(Goods.objects.all())
+        cache.set(CACHE_KEY, counts, getattr(settings, 'FACET_CACHE_TIMEOUT', 300))
+    return counts
+
+
+def invalidate():
+    cache.delete(CACHE_KEY)
+
+
+def facet_counts(counts, major='', category=''):
+    """返回 (各专业数量, 各类别数量) 两个字典, 每个分面不受自身筛选影响"""
+    majors, categories = {}, {}
+    for (row_major, row_category), n in counts.items():
+        if not category or row_category == category:
+            majors[row_major] = majors.get(row_major, 0) + n
+        if not major or row_major == major:
+            categories[row_category] = categories.get(row_category, 0) + n
+    return majors, categories
@@ -0,0 +1,143 @@
+# goods/imagehash.py
+"""商品图片的感知哈希 (pHash), 用来发现重复发布的同一张照片
+
+pHash: 灰度图缩到 32x32, 做 DCT, 取左上角 8x8 的低频系数, 大于中位数的位为 1,
+得到 64 位整数。同一张照片重新压缩、缩放、调亮度后, 哈希只差几位; 两个哈希的
+汉明距离 (不同的位数) 不超过 DUPLICATE_DISTANCE 就算重复。
+
+查找用多索引哈希: 64 位分成 BANDS 段 (每段 16 位), 每段是 GoodsImage 上一个带索引
+的列。距离不超过 BANDS - 1 的两个哈希至少有一段完全相同 (抽屉原理), 所以只要按
+各段做等值查询 (B-tree 索引, 和图片总数成对数关系), 再在 Python 里核对候选的
+距离, 不需要扫描所有图片。
+
+哈希在上传请求里计算 (marketplace/views.py 的 _save_item, 在写事务之前), 用来当场
+提示卖家; 其它途径保存的图片由后台任务补上 (goods/signals.py), 已有的图片用
+``python manage.py hash_goods_images`` 在进程池里批量计算。
+"""
+import logging
+from functools import reduce
+from operator import or_
+
+import cv2
+import numpy as np
+from django.core.files.uploadedfile import UploadedFile
+from django.db.models import Q
+
+from goods.models import GoodsImage
+
+logger = logging.getLogger(__name__)
+
+BANDS = 4
+BAND_BITS = 64 // BANDS
+BAND_FIELDS = tuple(f'phash_band{band}' for band in range(BANDS))
+# 多索引查找保证能找到的最大距离
+DUPLICATE_DISTANCE = BANDS - 1
+
+# DCT 前缩小到的边长, 和保留的低频系数边长 (8x8 = 64 位)
+DCT_SIZE = 32
+HASH_SIZE = 8
+
+
+def phash(data):
+    """图片文件内容 (bytes) 的 64 位 pHash (无符号整数); 不是有效图片时返回 None"""
+    # JPEG 直接按 1/4 尺寸解码, 比完整解码快得多, 对 32x32 的结果没有影响
+    try:
+        image = cv2.imdecode(np.frombuffer(data, np.uint8), cv2.IMREAD_REDUCED_GRAYSCALE_4)
+    except cv2.error:
+        return None
+    if image is None:
+        return None
+    small = cv2.resize(image, (DCT_SIZE, DCT_SIZE), interpolation=cv2.INTER_AREA).astype(np.float32)
+    low = cv2.dct(small)[:HASH_SIZE, :HASH_SIZE]
+    bits = (low > np.median(low)).flatten()
+    return int.from_bytes(np.packbits(bits).tobytes(), 'big')
+
+
+def distance(a, b):
+    """汉明距离"""
+    return (a ^ b).bit_count()
+
+
+def to_signed(value):
+    """无符号 64 位 -> BigIntegerField 能存的有符号整数"""
+    return value - (1 << 64) if value >= 1 << 63 else value
+
+
+def to_unsigned(value):
+    return value + (1 << 64) if value < 0 else value
+
+
+def bands(value):
+    """高位在前, 每段 BAND_BITS 位"""
+    mask = (1 << BAND_BITS) - 1
+    return [(value >> (BAND_BITS * (BANDS - 1 - band))) & mask for band in range(BANDS)]
+
+
+def hash_fields(value):
+    """GoodsImage 上要保存的字段; value 为 None 时为空"""
+    if value is None:
+        return {}
+    return {'phash': to_signed(value), **dict(zip(BAND_FIELDS, bands(value)))}
+
+
+def hash_file(field_file):
+    """读取 FieldFile / 上传的文件并计算 pHash, 读取或解码失败时返回 None"""
+    try:
+        if isinstance(field_file, UploadedFile):
+            # 还没保存的上传文件: 读完放回开头, 之后保存到存储时还要读
+            field_file.seek(0)
+            data = field_file.read()
+            field_file.seek(0)
+        else:
+            with field_file.open('rb') as fh:
+                data = fh.read()
+        return phash(data)
+    except OSError as exc:
+        logger.warning('Could not hash image %s: %s', field_file.name, exc)
+        return None
+
+
+def hash_image(instance):
+    """计算 GoodsImage 的 pHash 并保存, 成功返回 True"""
+    if not instance.image:
+        return False
+    value = hash_file(instance.image)
+    if value is None:
+        return False
+    fields = hash_fields(value)
+    GoodsImage.objects.filter(pk=instance.pk).update(**fields)
+    for name, field_value in fields.items():
+        setattr(instance, name, field_value)
+    return True
+
+
+def candidates(value):
+    """至少有一段和 value 相同的图片 (每段一次索引查找)"""
+    match = reduce(or_, (Q(**{field: band}) for field, band in zip(BAND_FIELDS, bands(value))))
+    # 不按 Meta.ordering 排序, 查询只走各段的索引
+    return GoodsImage.objects.filter(match).order_by()
+
+
+def near_duplicates(value, max_distance=DUPLICATE_DISTANCE, exclude_goods=None):
+    """和 value 的距离不超过 max_distance 的图片, [(图片 id, 商品 id, 距离)], 近的在前"""
+    if not 0 <= max_distance <= DUPLICATE_DISTANCE:
+        raise ValueError(f'max_distance must be between 0 and {DUPLICATE_DISTANCE}')
+    found_in = candidates(value)
+    if exclude_goods is not None:
+        found_in = found_in.exclude(goods_id=exclude_goods)
+    found = []
+    for pk, goods_id, stored in found_in.values_list('pk', 'goods_id', 'phash'):
+        d = distance(value, to_unsigned(stored))
+        if d <= max_distance:
+            found.append((pk, goods_id, d))
+    return sorted(found, key=lambda row: (row[2], row[0]))
+
+
+def duplicate_goods(goods, max_distance=DUPLICATE_DISTANCE):
+    """图片和 goods 的某张图片几乎一样的其它商品 id, 按最小距离排序"""
+    best = {}
+    hashes = goods.images.exclude(phash=None).values_list('phash', flat=True)
+    for stored in hashes:
+        for _, goods_id, d in near_duplicates(to_unsigned(stored), max_distance, exclude_goods=goods.pk):
+            best[goods_id] = min(d, best.get(goods_id, d))
+    return sorted(best, key=lambda goods_id: (best[goods_id], goods_id))
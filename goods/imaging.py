@@ -0,0 +1,100 @@
+# goods/imaging.py
+"""商品图片的多尺寸 WebP 缩略图
+
+上传的原图一般 100-350 KB, 但在网格里只显示成小方块。这里用 Pillow 为每张
+GoodsImage / OutcomeImage 生成几种宽度的 WebP 缩略图, 保存在原图目录下的
+derivatives/ 里, 路径记录在 ``variants`` 字段中, 模板通过 srcset 让浏览器
+按显示尺寸选择合适的文件。
+"""
+import io
+import logging
+import os
+
+from django.core.files.base import ContentFile
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from goods.models import Goods
+
+logger = logging.getLogger(__name__)
+
+# 缩略图宽度 (像素)
+DERIVATIVE_WIDTHS = (256, 512, 1024)
+WEBP_QUALITY = 80
+
+
+def derivative_name(name, width):
+    """goods_images/a.jpg -> goods_images/derivatives/a_jpg_256w.webp
+
+    扩展名也放进文件名, 同一目录里的 a.jpg 和 a.png 不会共用缩略图。
+    """
+    directory, filename = os.path.split(name)
+    stem, extension = os.path.splitext(filename)
+    suffix = f'_{extension[1:].lower()}' if extension else ''
+    return f'{directory}/derivatives/{stem}{suffix}_{width}w.webp'
+
+
+def is_current(instance):
+    """variants 是否对应当前的原图 (换图后需要重新生成)"""
+    variants = instance.variants or {}
+    if not instance.image or not variants:
+        return False
+    return all(name == derivative_name(instance.image.name, width) for width, name in variants.items())
+
+
+def _encode(image, width):
+    copy = image.copy()
+    copy.thumbnail((width, width * 10), Image.LANCZOS)
+    buffer = io.BytesIO()
+    copy.save(buffer, 'WEBP', quality=WEBP_QUALITY, method=4)
+    return buffer.getvalue()
+
+
+def render_derivatives(field_file):
+    """读取原图并生成各尺寸缩略图, 返回 {宽度字符串: 存储路径}
+
+    原图比某个宽度还小时不放大, 只生成一张原始宽度的 WebP。
+    """
+    storage = field_file.storage
+    with field_file.open('rb') as fh:
+        image = Image.open(fh)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+
+    variants = {}
+    for width in DERIVATIVE_WIDTHS:
+        target = min(width, image.width)
+        name = derivative_name(field_file.name, target)
+        if storage.exists(name):
+            storage.delete(name)
+        variants[str(target)] = storage.save(name, ContentFile(_encode(image, target)))
+        if target < width:
+            break
+    return variants
+
+
+def build_derivatives(instance):
+    """为 GoodsImage / OutcomeImage 生成缩略图并保存 variants, 成功返回 True"""
+    if not instance.image:
+        return False
+    try:
+        variants = render_derivatives(instance.image)
+    except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+        # 文件缺失或不是有效图片时保留原图显示, 不影响上传流程
+        logger.warning('Could not build derivatives for %s: %s', instance.image.name, exc)
+        return False
+    delete_derivatives(instance, keep=variants.values())
+    instance.variants = variants
+    type(instance).objects.filter(pk=instance.pk).update(variants=variants)
+    # 页面里的图片地址变了, 让 ETag / 缓存失效
+    Goods.touch(instance.goods_id)
+    return True
+
+
+def delete_derivatives(instance, keep=()):
+    """删除记录在 variants 里的缩略图文件"""
+    storage = instance.image.storage
+    for name in (instance.variants or {}).values():
+        if name not in keep and storage.exists(name):
+            storage.delete(name)
@@ -0,0 +1,120 @@
+# goods/management/commands/benchmark_search.py
+"""对比 FTS5 搜索和原来的四列 icontains 查询
+
+在临时测试库里生成 N 条商品, 分别用两种方式查询同一组关键词,
+输出每个关键词的中位数 / p95 耗时 (毫秒)。不会碰正式数据库。
+
+    python manage.py benchmark_search --rows 100000
+"""
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, models
+
+from goods import search
+from goods.models import Goods
+
+WORDS = [
+    'watercolor', 'acrylic', 'gouache', 'oil', 'paint', 'brush', 'set', 'canvas',
+    'sketchbook', 'charcoal', 'graphite', 'pencil', 'marker', 'ink', 'pastel',
+    'clay', 'resin', 'palette', 'easel', 'tablet', 'camera', 'lens', 'tripod',
+    'textbook', 'history', 'anatomy', 'figure', 'drawing', 'color', 'theory',
+    'metallic', 'rough', 'cold', 'press', 'paper', 'large', 'small', 'used', 'new',
+]
+PROFESSORS = ['S. Maku', 'J. Chen', 'A. Rivera', 'M. Okafor', 'L. Novak', 'K. Tanaka', 'R. Patel']
+DEPARTMENTS = ['DSD', 'ILL', 'FIA', 'ANI', 'PHO', 'FLM', 'ADV', 'AHI', 'HUM', 'CMC']
+QUERIES = ['watercolor', 'DSD-3003', 'paint brush', 'maku', 'anatomy textbook', 'zzznomatch']
+
+
+def _vocabulary(rng, size=3000):
+    """生成词表和 Zipf 分布权重, 美术用品词随机分布在常用到少见的位置"""
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    vocabulary = [''.join(rng.choice(letters) for _ in range(rng.randint(3, 9))) for _ in range(size)]
+    for word in WORDS:
+        vocabulary[rng.randint(5, size // 4)] = word
+    weights = [1 / (rank + 1) for rank in range(size)]
+    return vocabulary, weights
+
+
+def _sentence(rng, vocabulary, words):
+    return ' '.join(rng.choices(vocabulary[0], weights=vocabulary[1], k=words))
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark FTS5 search against the icontains scan on a synthetic catalogue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100_000)
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=24, help='Results per page')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Full-text search requires the SQLite backend.')
+
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            self._populate(options['rows'], options['seed'])
+            self._run(options['repeat'], options['limit'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+    def _populate(self, rows, seed):
+        rng = random.Random(seed)
+        vocabulary = _vocabulary(rng)
+        self.stdout.write(f'Generating {rows} items...')
+        batch = []
+        for i in range(rows):
+            batch.append(Goods(
+                name=_sentence(rng, vocabulary, 3).title(),
+                description=_sentence(rng, vocabulary, 30),
+                price=rng.randint(1, 200),
+                professor=rng.choice(PROFESSORS),
+                course_code=f'{rng.choice(DEPARTMENTS)}-{rng.randint(1000, 4999)}-{rng.choice("ABC")}',
+            ))
+            if len(batch) == 5000:
+                Goods.objects.bulk_create(batch)
+                batch = []
+        if batch:
+            Goods.objects.bulk_create(batch)
+        started = time.perf_counter()
+        search.rebuild()
+        self.stdout.write(f'Index built in {time.perf_counter() - started:.2f}s')
+
+    def _time(self, func, repeat):
+        samples = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            samples.append((time.perf_counter() - started) * 1000)
+        return statistics.median(samples), _percentile(samples, 0.95)
+
+    def _run(self, repeat, limit):
+        self.stdout.write(f'{"query":<20}{"icontains p50/p95 ms":>24}{"fts5 p50/p95 ms":>22}')
+        for query in QUERIES:
+            def icontains():
+                items = Goods.objects.filter(
+                    models.Q(name__icontains=query) |
+                    models.Q(description__icontains=query) |
+                    models.Q(professor__icontains=query) |
+                    models.Q(course_code__icontains=query)
+                ).order_by('-created_at', '-id')
+                return list(items[:limit])
+
+            def fts():
+                ids = [goods_id for goods_id, _ in search.ranked_ids(query, limit=limit)]
+                return Goods.objects.in_bulk(ids)
+
+            old = self._time(icontains, repeat)
+            new = self._time(fts, repeat)
+            self.stdout.write(
+                f'{query:<20}{old[0]:>14.2f} / {old[1]:<8.2f}{new[0]:>12.2f} / {new[1]:<8.2f}'
+            )
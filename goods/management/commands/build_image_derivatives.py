@@ -0,0 +1,26 @@
+# goods/management/commands/build_image_derivatives.py
+from django.core.management.base import BaseCommand
+
+from goods import imaging
+from goods.models import GoodsImage, OutcomeImage
+
+
+class Command(BaseCommand):
+    help = '为已有的商品图片和 Outcome 图片生成 WebP 缩略图'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Rebuild images that already have derivatives')
+
+    def handle(self, *args, **options):
+        for model in (GoodsImage, OutcomeImage):
+            built = skipped = failed = 0
+            for instance in model.objects.order_by('pk').iterator(chunk_size=500):
+                if not options['force'] and imaging.is_current(instance):
+                    skipped += 1
+                elif imaging.build_derivatives(instance):
+                    built += 1
+                else:
+                    failed += 1
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: {built} built, {skipped} up to date, {failed} failed'
+            )
@@ -0,0 +1,14 @@
+# goods/management/commands/rebuild_search_index.py
+from django.core.management.base import BaseCommand, CommandError
+
+from goods import search
+
+
+class Command(BaseCommand):
+    help = '重建商品全文搜索索引 (SQLite FTS5)'
+
+    def handle(self, *args, **options):
+        if not search.is_available():
+            raise CommandError('Full-text search requires the SQLite backend.')
+        count = search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Indexed {count} items.'))
@@ -0,0 +1,319 @@
+# goods/management/commands/seed_marketplace.py
+"""生成压测用的模拟数据
+
+    python manage.py seed_marketplace --users 20000 --goods 1000000 --seed 1
+
+用户、商品和对话用 bulk_create 分批写入 (需要拿回主键), 行数更多的图片、留言、收藏
+直接 executemany 插入; 每批一个事务。
+分布尽量接近真实情况: 少数卖家发布大部分商品, 专业/类别有冷有热,
+价格是对数正态分布, 收藏数是长尾分布 (大部分商品没人收藏)。
+
+图片不逐个生成: 先用 Pillow 画一小组图片 (--image-pool) 并生成 WebP 缩略图,
+所有商品的图片记录都指向这组文件。因为文件是共用的, 删除模拟商品时缩略图
+也会被一起删掉, 请只在专门的压测数据库里使用。
+"""
+import io
+import itertools
+import json
+import math
+import random
+import time
+from contextlib import contextmanager
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.utils import timezone
+from PIL import Image, ImageDraw
+
+from goods import conversations, imaging, search
+from goods.models import Goods, GoodsImage, OutcomeImage, Conversation, Message, Favorite
+
+# 单个商品最多的收藏数
+MAX_FAVORITES = 500
+
+# 各类别的商品名用词
+NOUNS = {
+    'paints': ['Watercolor Set', 'Acrylic Paint', 'Gouache Tubes', 'Oil Paint Set', 'Paint Pans'],
+    'brushes': ['Round Brush', 'Flat Brush Set', 'Fan Brush', 'Sable Brushes', 'Detail Brushes'],
+    'papers': ['Cold Press Paper', 'Canvas Panel', 'Sketchbook', 'Bristol Pad', 'Mixed Media Paper'],
+    'tools': ['Palette Knife', 'Cutting Mat', 'Metal Ruler', 'Easel', 'Drafting Triangle'],
+    'mediums': ['Gel Medium', 'Linseed Oil', 'Masking Fluid', 'Gesso', 'Varnish'],
+    'markers': ['Alcohol Markers', 'Fineliner Set', 'India Ink', 'Brush Pens', 'Dip Pen Nibs'],
+    'pencils': ['Graphite Pencils', 'Colored Pencils', 'Charcoal Sticks', 'Mechanical Pencil', 'Blending Stumps'],
+    'pastels': ['Soft Pastels', 'Oil Pastels', 'Pastel Pencils', 'Chalk Pastels', 'Pastel Paper'],
+    'modeling': ['Polymer Clay', 'Sculpting Tools', 'Armature Wire', 'Plaster', 'Resin Kit'],
+    'textbook': ['Anatomy Textbook', 'Color Theory Book', 'Art History Survey', 'Typography Manual', 'Figure Drawing Guide'],
+    'filming': ['Tripod', 'Camera Lens', 'LED Panel', 'Shotgun Mic', 'Gimbal'],
+    'electronic': ['Drawing Tablet', 'Stylus', 'SD Card', 'External Drive', 'Light Box'],
+}
+ADJECTIVES = ['Barely Used', 'New', 'Half-used', 'Professional', 'Student', 'Large', 'Travel', 'Vintage', 'Complete']
+DEPARTMENTS = ['DSD', 'ILL', 'FIA', 'ANI', 'PHO', 'FLM', 'ADV', 'AHI', 'HUM', 'CMC', 'VIS', 'VFX']
+PROFESSORS = ['S. Maku', 'J. Chen', 'A. Rivera', 'M. Okafor', 'L. Novak', 'K. Tanaka', 'R. Patel', 'E. Moreau']
+PAYMENTS = [key for key, _ in Goods.PAYMENT_CHOICES]
+MESSAGES = [
+    'Is this still available?', 'Would you take ${price}?', 'Can I pick it up on campus tomorrow?',
+    'How much of it is left?', 'Do you have photos of the back?', 'I can pay with Venmo.',
+]
+REPLIES = [
+    'Yes, still available!', 'I can do that.', 'Sure, how about 5pm at the library?',
+    'About half is left.', 'Sorry, the price is firm.', 'Just sent you more photos.',
+]
+
+IMAGE_SIZE = (800, 800)
+
+
+def _zipf_cum_weights(size, exponent=1.0):
+    """rng.choices 用的累计权重, 排名越靠前越常见"""
+    return list(itertools.accumulate(1 / (rank + 1) ** exponent for rank in range(size)))
+
+
+def _long_tail(rng, mean):
+    """均值约为 mean 的长尾整数 (Pareto, alpha=1.5): 大多数为 0, 少数很大"""
+    if mean <= 0:
+        return 0
+    return int(mean / 2 * (rng.paretovariate(1.5) - 1))
+
+
+def _synthetic_image(rng):
+    """渐变背景加几个色块, 生成 JPEG 字节"""
+    start = tuple(rng.randint(0, 255) for _ in range(3))
+    end = tuple(rng.randint(0, 255) for _ in range(3))
+    mask = Image.linear_gradient('L').resize(IMAGE_SIZE).rotate(rng.randint(0, 359))
+    image = Image.composite(Image.new('RGB', IMAGE_SIZE, start), Image.new('RGB', IMAGE_SIZE, end), mask)
+    draw = ImageDraw.Draw(image)
+    for _ in range(rng.randint(3, 8)):
+        x, y = rng.randint(0, 700), rng.randint(0, 700)
+        box = (x, y, x + rng.randint(40, 300), y + rng.randint(40, 300))
+        color = tuple(rng.randint(0, 255) for _ in range(3))
+        (draw.ellipse if rng.random() < 0.5 else draw.rectangle)(box, fill=color)
+    buffer = io.BytesIO()
+    image.save(buffer, 'JPEG', quality=85)
+    return buffer.getvalue()
+
+
+def _insert_rows(model, fields, rows):
+    """直接 executemany 插入元组
+
+    图片/留言/收藏的行数是商品的好几倍, bulk_create 逐字段做 ORM 预处理的开销
+    比 SQLite 写入本身还大。rows 里的值必须已经是数据库能接受的格式。
+    """
+    if not rows:
+        return
+    quote = connection.ops.quote_name
+    columns = ', '.join(quote(model._meta.get_field(name).column) for name in fields)
+    placeholders = ', '.join(['%s'] * len(fields))
+    with connection.cursor() as cursor:
+        cursor.executemany(f'INSERT INTO {quote(model._meta.db_table)} ({columns}) VALUES ({placeholders})', rows)
+
+
+@contextmanager
+def _explicit_timestamps(*fields):
+    """临时关闭 auto_now / auto_now_add, 让模拟数据的时间分布在过去一段时间里"""
+    saved = [(field, field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, auto_now, auto_now_add in saved:
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+class Command(BaseCommand):
+    help = 'Populate the database with synthetic users, items, images, messages and favorites'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--goods', type=int, default=10_000)
+        parser.add_argument('--messages', type=float, default=1.5, help='Average messages per item')
+        parser.add_argument('--favorites', type=float, default=2.0, help='Average favorites per item')
+        parser.add_argument('--days', type=int, default=365, help='Spread created_at over this many days')
+        parser.add_argument('--image-pool', type=int, default=40, help='Distinct synthetic images to generate')
+        parser.add_argument('--no-images', action='store_true')
+        parser.add_argument('--batch-size', type=int, default=10_000)
+        parser.add_argument('--prefix', default='seed', help='Username prefix for generated users')
+        parser.add_argument('--seed', type=int, default=42)
+
+    def handle(self, *args, **options):
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise CommandError('The database backend must return primary keys from bulk_create.')
+        if options['users'] < 1:
+            raise CommandError('--users must be at least 1.')
+        if User.objects.filter(username__startswith=f"{options['prefix']}_").exists():
+            raise CommandError(f"Users named {options['prefix']}_* already exist; pass a different --prefix.")
+
+        if connection.vendor == 'sqlite':
+            # 只对本次连接生效: 不等待每次提交落盘, 加大页缓存减少索引维护的磁盘读写
+            with connection.cursor() as cursor:
+                cursor.execute('PRAGMA synchronous = OFF')
+                cursor.execute('PRAGMA cache_size = -262144')
+
+        self.rng = random.Random(options['seed'])
+        self.now = timezone.now()
+        self.days = options['days']
+        self.batch_size = options['batch_size']
+        started = time.perf_counter()
+
+        user_ids = self._create_users(options['users'], options['prefix'])
+        pool = [] if options['no_images'] else self._image_pool(options['image_pool'])
+        with _explicit_timestamps(Goods._meta.get_field('created_at'), Goods._meta.get_field('updated_at')):
+            self._create_goods(options['goods'], user_ids, pool, options['messages'], options['favorites'])
+
+        if search.is_available():
+            self.stdout.write('Rebuilding search index...')
+            search.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Done in {time.perf_counter() - started:.1f}s'))
+
+    def _random_time(self):
+        # 越新的商品越多
+        age = self.days * self.rng.random() ** 2
+        return self.now - timedelta(days=age)
+
+    def _after(self, moment, hours):
+        return min(moment + timedelta(hours=self.rng.uniform(1, hours)), self.now)
+
+    def _create_users(self, count, prefix):
+        password = make_password('password')  # 哈希很慢, 所有用户共用一个
+        ids = []
+        for start in range(0, count, self.batch_size):
+            users = [
+                User(username=f'{prefix}_{i:07d}', email=f'{prefix}_{i:07d}@example.com',
+                     password=password, date_joined=self.now)
+                for i in range(start, min(start + self.batch_size, count))
+            ]
+            ids.extend(user.pk for user in User.objects.bulk_create(users))
+        self.stdout.write(f'{len(ids)} users created (password: "password")')
+        return ids
+
+    def _image_pool(self, size):
+        """生成共用的图片文件和缩略图, 返回 [(原图路径, variants 的 JSON), ...]"""
+        pool = []
+        for index in range(size):
+            upload_to = 'goods_images' if index % 4 else 'outcome_images'
+            name = default_storage.save(f'{upload_to}/seed/seed_{index}.jpg', ContentFile(_synthetic_image(self.rng)))
+            variants = imaging.render_derivatives(GoodsImage(image=name).image)
+            pool.append((name, json.dumps(variants)))
+        self.stdout.write(f'{len(pool)} synthetic images generated')
+        return pool
+
+    def _create_goods(self, total, user_ids, pool, messages_per_item, favorites_per_item):
+        rng = self.rng
+        majors = [key for key, _ in Goods.MAJOR_CHOICES]
+        categories = [key for key, _ in Goods.CATEGORY_CHOICES]
+        rng.shuffle(majors)
+        rng.shuffle(categories)
+        major_weights = _zipf_cum_weights(len(majors), 0.8)
+        category_weights = _zipf_cum_weights(len(categories), 0.8)
+        seller_weights = _zipf_cum_weights(len(user_ids), 0.9)
+        adapt = connection.ops.adapt_datetimefield_value
+        goods_pool = [entry for entry in pool if entry[0].startswith('goods_images/')] or pool
+        outcome_pool = [entry for entry in pool if entry[0].startswith('outcome_images/')] or pool
+
+        created = {'images': 0, 'conversations': 0, 'messages': 0, 'favorites': 0}
+        started = time.perf_counter()
+        for start in range(0, total, self.batch_size):
+            count = min(self.batch_size, total - start)
+            sellers = rng.choices(user_ids, cum_weights=seller_weights, k=count)
+            item_majors = rng.choices(majors, cum_weights=major_weights, k=count)
+            item_categories = rng.choices(categories, cum_weights=category_weights, k=count)
+            items = []
+            for seller, major, category in zip(sellers, item_majors, item_categories):
+                created_at = self._random_time()
+                price = min(max(math.exp(rng.gauss(2.7, 0.9)), 1), 999)
+                items.append(Goods(
+                    name=f'{rng.choice(ADJECTIVES)} {rng.choice(NOUNS[category])}',
+                    description=' '.join(rng.choices(ADJECTIVES + NOUNS[category], k=rng.randint(5, 40))),
+                    price=Decimal(f'{price:.2f}'),
+                    created_at=created_at,
+                    updated_at=created_at,
+                    seller_id=seller,
+                    major=major if rng.random() > 0.1 else '',
+                    category=category,
+                    professor=rng.choice(PROFESSORS) if rng.random() < 0.6 else '',
+                    course_code=f'{rng.choice(DEPARTMENTS)}-{rng.randint(1000, 4999)}-{rng.choice("ABC")}'
+                    if rng.random() < 0.5 else '',
+                    payment_methods=','.join(rng.sample(PAYMENTS, rng.randint(1, 3))),
+                    # 收藏行在下面插入, 计数先定好, 和 toggle_favorite 维护的值一致
+                    favorite_count=min(_long_tail(rng, favorites_per_item), MAX_FAVORITES, len(user_ids)),
+                ))
+
+            with transaction.atomic():
+                Goods.objects.bulk_create(items)
+                images, outcomes, threads, messages, favorites = [], [], [], [], []
+                for item in items:
+                    if goods_pool:
+                        for order in range(rng.choices((1, 2, 3), weights=(5, 3, 2))[0]):
+                            images.append((item.pk, *rng.choice(goods_pool), order))
+                        for order in range(rng.choices((0, 1, 2), weights=(6, 3, 1))[0]):
+                            outcomes.append((item.pk, *rng.choice(outcome_pool), order))
+                    count = int(rng.expovariate(1 / messages_per_item)) if messages_per_item > 0 else 0
+                    messages.extend(self._conversation_messages(item, count, user_ids, threads))
+                    for user_id in rng.sample(user_ids, item.favorite_count):
+                        favorites.append((user_id, item.pk, adapt(self._after(item.created_at, hours=720))))
+                _insert_rows(GoodsImage, ('goods', 'image', 'variants', 'order'), images)
+                _insert_rows(OutcomeImage, ('goods', 'image', 'variants', 'order'), outcomes)
+                Conversation.objects.bulk_create(threads)
+                _insert_rows(
+                    Message, ('conversation', 'item', 'sender', 'content', 'created_at', 'is_read'),
+                    [(conversation.pk, *row) for conversation, *row in messages],
+                )
+                _insert_rows(Favorite, ('user', 'item', 'created_at'), favorites)
+
+            created['images'] += len(images) + len(outcomes)
+            created['conversations'] += len(threads)
+            created['messages'] += len(messages)
+            created['favorites'] += len(favorites)
+            done = start + count
+            elapsed = time.perf_counter() - started
+            self.stdout.write(f'{done}/{total} items ({done / elapsed:,.0f}/s)')
+
+        self.stdout.write(
+            f"{total} items, {created['images']} images, {created['conversations']} conversations, "
+            f"{created['messages']} messages, "
+            f"{created['favorites']} favorites created"
+        )
+
+    def _conversation_messages(self, item, count, user_ids, new_threads):
+        """count 条买家留言, 大约一半有卖家回复; 新对话追加到 new_threads
+
+        返回 (对话, item, sender, content, created_at, is_read) 的列表, 对话的计数在这里算好。
+        """
+        rng = self.rng
+        adapt = connection.ops.adapt_datetimefield_value
+        by_buyer, rows = {}, []
+
+        def add(conversation, sender, content, sent_at, is_read):
+            rows.append((conversation, item.pk, sender, content, adapt(sent_at), is_read))
+            conversation.message_count += 1
+            if sent_at >= conversation.last_message_at:
+                conversation.last_message_at = sent_at
+                conversation.last_message_preview = content[:conversations.PREVIEW_LENGTH]
+                conversation.last_sender_id = sender
+            if not is_read:
+                if sender == item.seller_id:
+                    conversation.buyer_unread += 1
+                else:
+                    conversation.seller_unread += 1
+
+        for _ in range(count):
+            buyer = rng.choice(user_ids)
+            if buyer == item.seller_id:
+                continue
+            if buyer not in by_buyer:
+                by_buyer[buyer] = Conversation(
+                    item_id=item.pk, buyer_id=buyer, seller_id=item.seller_id, last_message_at=item.created_at,
+                )
+                new_threads.append(by_buyer[buyer])
+            sent_at = self._after(item.created_at, hours=240)
+            add(by_buyer[buyer], buyer, rng.choice(MESSAGES).format(price=int(item.price * Decimal('0.8'))),
+                sent_at, rng.random() < 0.7)
+            if rng.random() < 0.5:
+                add(by_buyer[buyer], item.seller_id, rng.choice(REPLIES), self._after(sent_at, hours=24),
+                    rng.random() < 0.8)
+        return rows
@@ -0,0 +1,17 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0006_message_favorite'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['-created_at', '-id'], name='goods_created_id_idx'),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated manually
+
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    # FTS5 只在 SQLite 上可用, 其它数据库由 goods.search 退回 icontains 查询
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        "CREATE VIRTUAL TABLE IF NOT EXISTS goods_goods_search USING fts5("
+        "name, description, professor, course_code, "
+        "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+    )
+    schema_editor.execute(
+        'INSERT INTO goods_goods_search (rowid, name, description, professor, course_code) '
+        'SELECT id, name, description, professor, course_code FROM goods_goods'
+    )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute('DROP TABLE IF EXISTS goods_goods_search')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0007_goods_created_id_idx'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
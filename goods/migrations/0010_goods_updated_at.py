@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:20
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0009_image_variants'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True),
+        ),
+        # 已有商品的修改时间取发布时间
+        migrations.RunSQL(
+            'UPDATE goods_goods SET updated_at = created_at',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['updated_at'], name='goods_updated_at_idx'),
+        ),
+    ]
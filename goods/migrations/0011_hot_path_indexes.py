@@ -0,0 +1,35 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:22
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0010_goods_updated_at'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='favorite',
+            index=models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['major', '-created_at', '-id'], name='goods_major_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['category', '-created_at', '-id'], name='goods_category_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['seller', '-created_at', '-id'], name='goods_seller_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['item', 'created_at'], name='message_item_created_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 5.2.8 on 2026-10-18 13:40
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0011_hot_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarGoods',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('score', models.FloatField()),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_links', to='goods.goods')),
+                ('similar', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='similar_to', to='goods.goods')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['item', '-score'], name='similar_item_score_idx')],
+                'unique_together': {('item', 'similar')},
+            },
+        ),
+    ]
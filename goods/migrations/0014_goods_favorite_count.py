@@ -0,0 +1,36 @@
+# Generated by Django 5.2.8 on 2026-10-18 18:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0013_facet_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goods',
+            name='favorite_count',
+            field=models.IntegerField(default=0, editable=False),
+        ),
+        # 按已有收藏回填
+        migrations.RunSQL(
+            'UPDATE goods_goods SET favorite_count = ('
+            'SELECT COUNT(*) FROM goods_favorite WHERE goods_favorite.item_id = goods_goods.id)',
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['-favorite_count', '-id'], name='goods_favorite_count_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['major', '-favorite_count', '-id'], name='goods_major_favorites_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goods',
+            index=models.Index(fields=['category', '-favorite_count', '-id'], name='goods_category_favorites_idx'),
+        ),
+    ]
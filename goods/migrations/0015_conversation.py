@@ -0,0 +1,141 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:02
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+PREVIEW_LENGTH = 140
+
+
+def split_conversations(apps, schema_editor):
+    """以前每个商品只有一个公开留言板: 按买家拆成对话
+
+    卖家的留言归到它之前最近一次发言的买家; 在任何买家之前的卖家留言归到第一个发言的买家。
+    一直没有买家留言的商品, 卖家的留言没有对象, 也没有对话能显示, 直接删除。
+    """
+    Goods = apps.get_model('goods', 'Goods')
+    Message = apps.get_model('goods', 'Message')
+    Conversation = apps.get_model('goods', 'Conversation')
+    sellers = dict(Goods.objects.filter(messages__isnull=False).distinct().order_by().values_list('id', 'seller_id'))
+
+    threads, members, orphans = {}, {}, []
+
+    def add(key, message_id, sender_id, content, created_at, is_read):
+        item_id, seller_id = key[0], sellers.get(key[0])
+        if key not in threads:
+            threads[key] = Conversation(item_id=item_id, buyer_id=key[1], seller_id=seller_id)
+            members[key] = []
+        thread = threads[key]
+        thread.last_message_at = created_at
+        thread.last_message_preview = content[:PREVIEW_LENGTH]
+        thread.last_sender_id = sender_id
+        thread.message_count += 1
+        if not is_read:
+            if sender_id == seller_id:
+                thread.buyer_unread += 1
+            else:
+                thread.seller_unread += 1
+        members[key].append(message_id)
+
+    current_item = last_buyer = None
+    # 第一个买家出现之前的卖家留言
+    early = []
+    rows = Message.objects.order_by('item_id', 'created_at', 'id').values_list(
+        'id', 'item_id', 'sender_id', 'content', 'created_at', 'is_read',
+    )
+    for message_id, item_id, sender_id, content, created_at, is_read in rows.iterator(chunk_size=5000):
+        if item_id != current_item:
+            orphans += [message[0] for message in early]
+            current_item, last_buyer, early = item_id, None, []
+        if sender_id != sellers.get(item_id):
+            last_buyer = sender_id
+            for message in early:
+                add((item_id, last_buyer), *message)
+            early = []
+        elif last_buyer is None:
+            early.append((message_id, sender_id, content, created_at, is_read))
+            continue
+        add((item_id, last_buyer), message_id, sender_id, content, created_at, is_read)
+    orphans += [message[0] for message in early]
+
+    Conversation.objects.bulk_create(threads.values(), batch_size=5000)
+    table = schema_editor.quote_name(Message._meta.db_table)
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'UPDATE {table} SET conversation_id = %s WHERE id = %s',
+            [(threads[key].pk, message_id) for key, ids in members.items() for message_id in ids],
+        )
+    for start in range(0, len(orphans), 500):
+        Message.objects.filter(id__in=orphans[start:start + 500]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0014_goods_favorite_count'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Conversation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('last_message_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('last_message_preview', models.CharField(blank=True, max_length=140)),
+                ('message_count', models.IntegerField(default=0)),
+                ('buyer_unread', models.IntegerField(default=0)),
+                ('seller_unread', models.IntegerField(default=0)),
+            ],
+            options={
+                'ordering': ['-last_message_at'],
+            },
+        ),
+        migrations.RemoveIndex(
+            model_name='message',
+            name='message_item_created_idx',
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='buyer',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='buying_conversations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='item',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='conversations', to='goods.goods'),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='last_sender',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='conversation',
+            name='seller',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='selling_conversations', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AddField(
+            model_name='message',
+            name='conversation',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='goods.conversation'),
+        ),
+        migrations.AddIndex(
+            model_name='message',
+            index=models.Index(fields=['conversation', '-created_at', '-id'], name='message_conversation_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['seller', '-last_message_at', '-id'], name='conversation_seller_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='conversation',
+            index=models.Index(fields=['buyer', '-last_message_at', '-id'], name='conversation_buyer_idx'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='conversation',
+            unique_together={('item', 'buyer')},
+        ),
+        migrations.RunPython(split_conversations, migrations.RunPython.noop),
+    ]
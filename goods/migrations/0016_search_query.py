@@ -0,0 +1,64 @@
+# Generated by Django 5.2.8 on 2026-10-18 14:57
+
+import re
+
+from django.db import migrations, models
+
+
+# 从这个迁移起搜索索引里存分好词的文字, 已有的商品在这里重新分词。分词和写入是
+# goods/analysis.py、goods/search.py 当时的冻结副本 (只用 jieba, 不导入应用代码),
+# 之后那两个文件怎么改都不影响这个迁移。
+CJK = '\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+CHUNK_RE = re.compile(f'([{CJK}]+)|([^\\W_{CJK}]+)')
+PART_RE = re.compile(r'\d+|[^\W\d_]+')
+BATCH_SIZE = 2000
+
+
+def index_text(text, jieba):
+    tokens = []
+    for cjk, word in CHUNK_RE.findall(text):
+        if cjk:
+            tokens.extend(token for token in jieba.cut_for_search(cjk) if token.strip())
+        else:
+            tokens.extend(PART_RE.findall(word))
+    return ' '.join(tokens)
+
+
+def reindex_search(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor != 'sqlite':
+        return
+    import jieba
+
+    with connection.cursor() as cursor, connection.cursor() as source:
+        cursor.execute('DELETE FROM goods_goods_search')
+        source.execute('SELECT id, name, description, professor, course_code FROM goods_goods')
+        while rows := source.fetchmany(BATCH_SIZE):
+            cursor.executemany(
+                'INSERT INTO goods_goods_search (rowid, name, description, professor, course_code) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [[goods_id, *(index_text(text, jieba) for text in texts)] for goods_id, *texts in rows],
+            )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0015_conversation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchQuery',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('query', models.CharField(max_length=100, unique=True)),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('last_searched_at', models.DateTimeField()),
+            ],
+            options={
+                'indexes': [models.Index(fields=['-count'], name='search_query_count_idx')],
+            },
+        ),
+        migrations.RunPython(reindex_search, migrations.RunPython.noop),
+    ]
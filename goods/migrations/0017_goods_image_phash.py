@@ -0,0 +1,54 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0016_search_query'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='goodsimage',
+            name='phash',
+            field=models.BigIntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='goodsimage',
+            name='phash_band0',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='goodsimage',
+            name='phash_band1',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='goodsimage',
+            name='phash_band2',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='goodsimage',
+            name='phash_band3',
+            field=models.IntegerField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='goodsimage',
+            index=models.Index(fields=['phash_band0'], name='goods_image_phash0_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goodsimage',
+            index=models.Index(fields=['phash_band1'], name='goods_image_phash1_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goodsimage',
+            index=models.Index(fields=['phash_band2'], name='goods_image_phash2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='goodsimage',
+            index=models.Index(fields=['phash_band3'], name='goods_image_phash3_idx'),
+        ),
+    ]
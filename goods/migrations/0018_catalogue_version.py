@@ -0,0 +1,20 @@
+# Generated by Django 5.2.8 on 2026-10-18 15:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('goods', '0017_goods_image_phash'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('deletions', models.PositiveBigIntegerField(default=0)),
+            ],
+        ),
+    ]
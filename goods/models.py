@@ -1,6 +1,7 @@
 # goods/models.py
 from django.db import models
 from django.contrib.auth.models import User
+from django.utils import timezone
 
 
 class Goods(models.Model):
@@ -50,8 +51,12 @@ class Goods(models.Model):
     description = models.TextField(blank=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
+    # 最后修改时间 (图片变动时也会更新), 用于 ETag / Last-Modified
+    updated_at = models.DateTimeField(auto_now=True)
     # 卖家信息
     seller = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True, related_name='items')
+    # 收藏数 (冗余计数, 收藏/取消收藏时用 F() 原子加减; 偏差用 manage.py reconcile_favorite_counts 修正)
+    favorite_count = models.IntegerField(default=0, editable=False)
     # 新增字段
     major = models.CharField(max_length=50, choices=MAJOR_CHOICES, blank=True)
     professor = models.CharField(max_length=100, blank=True)
@@ -73,27 +78,104 @@ class Goods(models.Model):
         verbose_name = "Item"
         verbose_name_plural = "Items"
         ordering = ['-created_at']
+        indexes = [
+            # 商品列表游标分页 (created_at, id)
+            models.Index(fields=['-created_at', '-id'], name='goods_created_id_idx'),
+            models.Index(fields=['updated_at'], name='goods_updated_at_idx'),
+            # 商店按专业/类别筛选、我的账户按卖家筛选, 都按发布时间倒序
+            models.Index(fields=['major', '-created_at', '-id'], name='goods_major_created_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='goods_category_created_idx'),
+            models.Index(fields=['seller', '-created_at', '-id'], name='goods_seller_created_idx'),
+            # 侧栏分面计数 GROUP BY (major, category), 覆盖索引不用读表也不用临时排序
+            models.Index(fields=['major', 'category'], name='goods_major_category_idx'),
+            # 商店 "最多收藏" 排序 (含按专业/类别筛选), 不用对收藏表做聚合
+            models.Index(fields=['-favorite_count', '-id'], name='goods_favorite_count_idx'),
+            models.Index(fields=['major', '-favorite_count', '-id'], name='goods_major_favorites_idx'),
+            models.Index(fields=['category', '-favorite_count', '-id'], name='goods_category_favorites_idx'),
+        ]
 
     def __str__(self):
         return self.name
 
+    @classmethod
+    def touch(cls, goods_id, **changes):
+        """只更新 updated_at (图片等关联数据变化时调用), 然后发送 goods_touched 信号
 
-class GoodsImage(models.Model):
+        changes 是同一条 UPDATE 里顺带修改的字段, 例如 favorite_count=F('favorite_count') + 1。
+        """
+        from goods.signals import goods_touched
+
+        cls.objects.filter(pk=goods_id).update(updated_at=timezone.now(), **changes)
+        goods_touched.send(sender=cls, goods_id=goods_id, fields=tuple(changes))
+
+
+class ResponsiveImage(models.Model):
+    """带多尺寸 WebP 缩略图的图片 (见 goods/imaging.py)"""
+    # {"256": "goods_images/derivatives/a_256w.webp", ...}
+    variants = models.JSONField(default=dict, blank=True, editable=False)
+
+    # 网格卡片默认使用的宽度
+    DISPLAY_WIDTH = 512
+
+    class Meta:
+        abstract = True
+
+    def _variant_items(self):
+        return sorted((int(width), name) for width, name in (self.variants or {}).items())
+
+    @property
+    def srcset(self):
+        """用于 <img srcset>, 没有缩略图时为空字符串"""
+        storage = self.image.storage
+        return ', '.join(f'{storage.url(name)} {width}w' for width, name in self._variant_items())
+
+    @property
+    def display_url(self):
+        """不支持 srcset 时的默认图片: 不小于 DISPLAY_WIDTH 的最小缩略图, 否则原图"""
+        items = self._variant_items()
+        for width, name in items:
+            if width >= self.DISPLAY_WIDTH:
+                return self.image.storage.url(name)
+        if items:
+            return self.image.storage.url(items[-1][1])
+        return self.image.url
+
+    @property
+    def thumbnail_url(self):
+        """最小的缩略图, 用于小图标/缩略图按钮"""
+        items = self._variant_items()
+        return self.image.storage.url(items[0][1]) if items else self.image.url
+
+
+class GoodsImage(ResponsiveImage):
     """商品主图 (最多3张)"""
     goods = models.ForeignKey(Goods, on_delete=models.CASCADE, related_name='images')
     image = models.ImageField(upload_to='goods_images/')
     order = models.IntegerField(default=0, help_text="Display order")
+    # 64 位感知哈希 (有符号存储) 和它的 4 段 16 位, 用来查找重复的照片 (见 goods/imagehash.py)
+    phash = models.BigIntegerField(null=True, blank=True, editable=False)
+    phash_band0 = models.IntegerField(null=True, blank=True, editable=False)
+    phash_band1 = models.IntegerField(null=True, blank=True, editable=False)
+    phash_band2 = models.IntegerField(null=True, blank=True, editable=False)
+    phash_band3 = models.IntegerField(null=True, blank=True, editable=False)
 
     class Meta:
         ordering = ['order']
         verbose_name = "Product Image"
         verbose_name_plural = "Product Images"
+        indexes = [
+            # 多索引哈希: 每段一个索引, 按任意一段等值查找候选
+            models.Index(fields=['phash_band0'], name='goods_image_phash0_idx'),
+            models.Index(fields=['phash_band1'], name='goods_image_phash1_idx'),
+            models.Index(fields=['phash_band2'], name='goods_image_phash2_idx'),
+            models.Index(fields=['phash_band3'], name='goods_image_phash3_idx'),
+        ]
 
     def __str__(self):
         return f"{self.goods.name} - Image {self.order}"
 
 
-class OutcomeImage(models.Model):
+class OutcomeImage(ResponsiveImage):
     """Outcome作品图 (最多5张)"""
     goods = models.ForeignKey(Goods, on_delete=models.CASCADE, related_name='outcomes')
     image = models.ImageField(upload_to='outcome_images/')
@@ -108,9 +190,49 @@ class OutcomeImage(models.Model):
         return f"{self.goods.name} - Outcome {self.order}"
 
 
+class Conversation(models.Model):
+    """一个买家和卖家关于某个商品的对话
+
+    最后一条消息和双方的未读数冗余保存在这里 (由 goods/conversations.py 维护),
+    收件箱只读这张表, 不扫描消息。
+    """
+    item = models.ForeignKey(Goods, on_delete=models.CASCADE, related_name='conversations')
+    buyer = models.ForeignKey(User, on_delete=models.CASCADE, related_name='buying_conversations')
+    # 创建对话时的卖家 (item.seller)
+    seller = models.ForeignKey(User, on_delete=models.CASCADE, null=True, blank=True,
+                               related_name='selling_conversations')
+    last_message_at = models.DateTimeField(default=timezone.now)
+    last_message_preview = models.CharField(max_length=140, blank=True)
+    last_sender = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name='+')
+    message_count = models.IntegerField(default=0)
+    buyer_unread = models.IntegerField(default=0)
+    seller_unread = models.IntegerField(default=0)
+
+    class Meta:
+        unique_together = ('item', 'buyer')
+        ordering = ['-last_message_at']
+        indexes = [
+            # 收件箱按最后消息时间倒序, 游标分页
+            models.Index(fields=['seller', '-last_message_at', '-id'], name='conversation_seller_idx'),
+            models.Index(fields=['buyer', '-last_message_at', '-id'], name='conversation_buyer_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.buyer.username} / {self.item.name}"
+
+    def unread_field(self, user):
+        """user 一方的未读计数字段名"""
+        return 'seller_unread' if user.pk == self.seller_id else 'buyer_unread'
+
+    def other_party(self, user):
+        return self.buyer if user.pk == self.seller_id else self.seller
+
+
 class Message(models.Model):
     """买家卖家对话消息"""
     item = models.ForeignKey(Goods, on_delete=models.CASCADE, related_name='messages')
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, null=True, blank=True,
+                                     related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
@@ -118,6 +240,10 @@ class Message(models.Model):
 
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # 对话页从最新的消息往前翻页
+            models.Index(fields=['conversation', '-created_at', '-id'], name='message_conversation_idx'),
+        ]
 
     def __str__(self):
         return f"{self.sender.username} -> {self.item.name}"
@@ -132,6 +258,65 @@ class Favorite(models.Model):
     class Meta:
         unique_together = ('user', 'item')
         ordering = ['-created_at']
+        indexes = [
+            # 收藏列表按收藏时间倒序
+            models.Index(fields=['user', '-created_at'], name='favorite_user_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.user.username} favorited {self.item.name}"
+
+
+class SimilarGoods(models.Model):
+    """预先计算的相关商品 (见 goods/similarity.py), 每个商品保存分数最高的几个"""
+    item = models.ForeignKey(Goods, on_delete=models.CASCADE, related_name='similar_links')
+    similar = models.ForeignKey(Goods, on_delete=models.CASCADE, related_name='similar_to')
+    score = models.FloatField()
+
+    class Meta:
+        unique_together = ('item', 'similar')
+        indexes = [
+            # 详情页按分数读取相关商品
+            models.Index(fields=['item', '-score'], name='similar_item_score_idx'),
+        ]
 
     def __str__(self):
-        return f"{self.user.username} favorited {self.item.name}"
\ No newline at end of file
+        return f"{self.item_id} ~ {self.similar_id} ({self.score:.3f})"
+
+
+class SearchQuery(models.Model):
+    """商店搜索词的累计次数 (见 goods/querylog.py), 用于热门搜索"""
+    query = models.CharField(max_length=100, unique=True)
+    count = models.PositiveIntegerField(default=0)
+    last_searched_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            # 热门搜索按次数倒序
+            models.Index(fields=['-count'], name='search_query_count_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.query} ({self.count})"
+
+
+class CatalogueVersion(models.Model):
+    """删除过的商品数 (只有一行), 和最大的 updated_at 一起当作整个商品目录的版本 (商品 API 列表的 ETag)
+
+    新增和修改商品都会更新 updated_at, 只有删除看不出来, 所以由 goods/signals.py 在删除商品时加一。
+    """
+    deletions = models.PositiveBigIntegerField(default=0)
+
+    @classmethod
+    def record_deletion(cls):
+        if not cls.objects.filter(pk=1).update(deletions=models.F('deletions') + 1):
+            cls.objects.get_or_create(pk=1, defaults={'deletions': 1})
+
+    @classmethod
+    def stamp(cls):
+        """(最大的 updated_at, 删除数) 的查询, 用 first() / afirst() 取; 没有商品时结果是 None
+
+        按 updated_at 倒序取第一行走 goods_updated_at_idx, 只读一个索引项, 和商品数量无关。
+        """
+        deletions = cls.objects.filter(pk=1).values('deletions')
+        return Goods.objects.order_by('-updated_at').values_list('updated_at', models.Subquery(deletions))
@@ -0,0 +1,139 @@
+# goods/querylog.py
+"""商店搜索词统计和热门搜索
+
+每次搜索只在进程内存的计数器里加一; 累计 SEARCH_LOG_FLUSH_SIZE 次或者离上次写入超过
+SEARCH_LOG_FLUSH_SECONDS 秒时, 由当时的请求用一条批量 upsert (INSERT ... ON CONFLICT DO
+UPDATE) 把计数加到 SearchQuery 上, 不是每次搜索写一次数据库。服务器进程退出时把剩下的
+写掉 (PatchProject/wsgi.py, asgi.py); 进程崩溃时最多丢一批计数, 对热门排行没有影响。
+
+写入直接用 default 连接的游标, 不经过数据库路由器: 统计写入不算用户自己的写操作,
+不会让触发写入的用户被固定到主库 (见 database/replicas.py)。
+
+防刷: 同一个地址 (REMOTE_ADDR) 搜同一个词, SEARCH_LOG_CLIENT_SECONDS 内只计一次
+(记录在缓存里, 多个进程共用缓存时才是全局去重); 次数达到 POPULAR_SEARCHES_MIN_COUNT
+的词才会显示成热门搜索, 一个地址刷不上去。
+
+热门搜索是最近 POPULAR_SEARCHES_DAYS 天搜过的词里次数最多的几个, 结果缓存
+POPULAR_SEARCHES_TIMEOUT 秒。
+"""
+import functools
+import hashlib
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import timedelta
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections, transaction
+from django.utils import timezone
+
+from database.transactions import retry_on_locked
+from goods.models import SearchQuery
+
+logger = logging.getLogger(__name__)
+
+POPULAR_CACHE_KEY = 'goods:popular_searches'
+POPULAR_LIMIT = 8
+
+_lock = threading.Lock()
+_pending = Counter()
+_last_flush = time.monotonic()
+
+
+def normalize(query):
+    """合并空白、忽略大小写; 超过字段长度的截断"""
+    return ' '.join(query.split()).casefold()[:SearchQuery._meta.get_field('query').max_length]
+
+
+def record(query, client=None):
+    """记录一次搜索, 返回是否应该写入数据库 (由调用方调用 flush, 异步视图要放到线程里)
+
+    client 是客户端地址; 给出时同一个 client 的同一个词在 SEARCH_LOG_CLIENT_SECONDS 内只计一次。
+    """
+    query = normalize(query)
+    if not query:
+        return False
+    if client is not None and not cache.add(_seen_key(client, query), 1, settings.SEARCH_LOG_CLIENT_SECONDS):
+        return False
+    with _lock:
+        _pending[query] += 1
+        return (
+            sum(_pending.values()) >= settings.SEARCH_LOG_FLUSH_SIZE
+            or time.monotonic() - _last_flush >= settings.SEARCH_LOG_FLUSH_SECONDS
+        )
+
+
+def _seen_key(client, query):
+    return 'goods:searched:' + hashlib.md5(f'{client}\0{query}'.encode()).hexdigest()
+
+
+def flush():
+    """把内存里的计数加到数据库, 返回写入的搜索词数; 失败时计数放回去, 下次再写"""
+    global _pending, _last_flush
+    with _lock:
+        batch, _pending = _pending, Counter()
+        _last_flush = time.monotonic()
+    if not batch:
+        return 0
+    try:
+        _write(batch)
+    except DatabaseError:
+        logger.exception('Flushing %d search queries failed', len(batch))
+        with _lock:
+            _pending.update(batch)
+        return 0
+    return len(batch)
+
+
+@retry_on_locked
+def _write(batch):
+    now = timezone.now()
+    table = SearchQuery._meta.db_table
+    connection = connections[DEFAULT_DB_ALIAS]
+    with transaction.atomic(using=DEFAULT_DB_ALIAS), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (query, count, last_searched_at) VALUES (%s, %s, %s) '
+            f'ON CONFLICT (query) DO UPDATE SET count = {table}.count + excluded.count, '
+            'last_searched_at = excluded.last_searched_at',
+            [(query, count, connection.ops.adapt_datetimefield_value(now)) for query, count in sorted(batch.items())],
+        )
+
+
+def _searched(request):
+    """请求里的搜索词; 搜索结果翻页 (after/before) 不重复计数"""
+    if request.method != 'GET' or request.GET.get('after') or request.GET.get('before'):
+        return False
+    return record(request.GET.get('search', ''), request.META.get('REMOTE_ADDR', ''))
+
+
+def logs_searches(view):
+    """统计视图收到的 ?search=; 放在页面缓存外面, 命中缓存的搜索也计数"""
+    if iscoroutinefunction(view):
+        @functools.wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if _searched(request):
+                await sync_to_async(flush, thread_sensitive=False)()
+            return await view(request, *args, **kwargs)
+    else:
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if _searched(request):
+                flush()
+            return view(request, *args, **kwargs)
+    return wrapper
+
+
+def popular(limit=POPULAR_LIMIT):
+    """热门搜索词 (带缓存)"""
+    queries = cache.get(POPULAR_CACHE_KEY)
+    if queries is None:
+        since = timezone.now() - timedelta(days=settings.POPULAR_SEARCHES_DAYS)
+        queries = list(
+            SearchQuery.objects.filter(last_searched_at__gte=since, count__gte=settings.POPULAR_SEARCHES_MIN_COUNT)
+            .order_by('-count', 'query').values_list('query', flat=True)[:POPULAR_LIMIT]
+        )
+        cache.set(POPULAR_CACHE_KEY, queries, settings.POPULAR_SEARCHES_TIMEOUT)
+    return queries[:limit]
@@ -0,0 +1,167 @@
+# goods/search.py
+"""商品全文搜索 (SQLite FTS5)
+
+goods_goods_search 是 Goods 的 FTS5 影子表, rowid 就是商品 id,
+由 goods/signals.py 在保存/删除时同步, 也可以用
+``python manage.py rebuild_search_index`` 整表重建。
+
+- 写入索引和查询前先用 goods/analysis.py 分词 (中文用 jieba, 课程代码拆成字母和数字),
+  索引里存的是分好词的文字; 分词规则改了之后要重建索引
+- 结果按 bm25 相关度排序, name 权重最高, 其次是 course_code / professor
+- 每个词都做前缀匹配, "DSD-3003" 会命中 "DSD-3003-B", "颜料" 会命中 "水彩颜料套装"
+- 非 SQLite 数据库上 is_available() 返回 False, 调用方退回 icontains 查询
+"""
+from django.db import connection, transaction
+from django.db.models.expressions import RawSQL
+
+from goods import analysis
+
+SEARCH_TABLE = 'goods_goods_search'
+
+# 建表 SQL, 迁移和重建命令共用; prefix 为 2/3 字符前缀建立额外索引
+CREATE_TABLE_SQL = (
+    f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+    "name, description, professor, course_code, "
+    "prefix='2 3', tokenize='unicode61 remove_diacritics 2')"
+)
+DROP_TABLE_SQL = f'DROP TABLE IF EXISTS {SEARCH_TABLE}'
+
+# 重建索引时每批读出的商品数
+REBUILD_BATCH_SIZE = 2000
+
+# bm25 列权重, 顺序与建表时的列一致
+COLUMN_WEIGHTS = (10.0, 1.0, 4.0, 6.0)
+
+
+def is_available(using=None):
+    """当前数据库是否支持 FTS5 搜索"""
+    conn = connection if using is None else using
+    return conn.vendor == 'sqlite'
+
+
+def build_match(query):
+    """把用户输入转成 FTS5 MATCH 表达式
+
+    每个词单独加引号 (避免 AND/OR/NEAR 等语法被解释) 并做前缀匹配,
+    词之间是 AND 关系。没有可搜索的词时返回空字符串。
+    """
+    return ' '.join(f'"{token}"*' for token in analysis.query_terms(query))
+
+
+def filter_matching(queryset, query):
+    """只保留匹配 query 的商品, 不排序 (分面计数等场合用)"""
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(id__in=RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', [match]))
+
+
+def _document(goods):
+    return [analysis.index_text(goods.name), analysis.index_text(goods.description),
+            analysis.index_text(goods.professor), analysis.index_text(goods.course_code)]
+
+
+def index_goods(goods):
+    """写入/更新一个商品的索引"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [goods.pk])
+        cursor.execute(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, professor, course_code) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [goods.pk, *_document(goods)],
+        )
+
+
+def index_many(goods_list):
+    """批量写入索引 (bulk_create / bulk_update 之后调用)"""
+    if not is_available() or not goods_list:
+        return
+    with connection.cursor() as cursor:
+        ids = [goods.pk for goods in goods_list]
+        # SQLite 单条语句的参数个数有限制, 分批删除
+        for start in range(0, len(ids), 500):
+            chunk = ids[start:start + 500]
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({", ".join(["%s"] * len(chunk))})', chunk,
+            )
+        cursor.executemany(
+            f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, professor, course_code) '
+            'VALUES (%s, %s, %s, %s, %s)',
+            [[goods.pk, *_document(goods)] for goods in goods_list],
+        )
+
+
+def remove_goods(goods_id):
+    """删除一个商品的索引"""
+    if not is_available():
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [goods_id])
+
+
+def rebuild(using=None):
+    """清空并从 goods_goods 重新生成整个索引, 返回索引的行数"""
+    conn = connection if using is None else using
+    if not is_available(conn):
+        return 0
+    # 一个事务里完成: 每批单独提交时 FTS5 每次都要写回索引段, 慢 3 倍多
+    with transaction.atomic(using=conn.alias), conn.cursor() as cursor, conn.cursor() as source:
+        cursor.execute(CREATE_TABLE_SQL)
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+        # 分词在 Python 里做, 分批读出商品再写入
+        source.execute('SELECT id, name, description, professor, course_code FROM goods_goods')
+        while rows := source.fetchmany(REBUILD_BATCH_SIZE):
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, name, description, professor, course_code) '
+                'VALUES (%s, %s, %s, %s, %s)',
+                [[goods_id, *map(analysis.index_text, texts)] for goods_id, *texts in rows],
+            )
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+        cursor.execute(f'SELECT count(*) FROM {SEARCH_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def ranked_ids(query, major='', category='', after=None, backwards=False, limit=25):
+    """按相关度返回 [(goods_id, score), ...]
+
+    排序为 (score 升序, id 降序); bm25 分数越小越相关。
+    after 是上一页边界行的 (score, id), 用于游标翻页;
+    backwards=True 时反向取 after 之前的行 (调用方负责把结果倒过来)。
+    """
+    match = build_match(query)
+    if not match:
+        return []
+
+    where = [f'{SEARCH_TABLE} MATCH %s']
+    params = [match]
+    if major:
+        where.append('g.major = %s')
+        params.append(major)
+    if category:
+        where.append('g.category = %s')
+        params.append(category)
+
+    # 没有筛选条件时不需要 join 商品表, 直接用 FTS 的 rowid
+    weights = ', '.join(str(w) for w in COLUMN_WEIGHTS)
+    if len(where) > 1:
+        source = f'SELECT g.id AS id, bm25({SEARCH_TABLE}, {weights}) AS score ' \
+                 f'FROM {SEARCH_TABLE} JOIN goods_goods g ON g.id = {SEARCH_TABLE}.rowid'
+    else:
+        source = f'SELECT rowid AS id, bm25({SEARCH_TABLE}, {weights}) AS score FROM {SEARCH_TABLE}'
+    sql = f'SELECT id, score FROM ({source} WHERE {" AND ".join(where)})'
+    if after is not None:
+        score, goods_id = after
+        if backwards:
+            sql += ' WHERE (score < %s OR (score = %s AND id > %s))'
+        else:
+            sql += ' WHERE (score > %s OR (score = %s AND id < %s))'
+        params += [score, score, goods_id]
+    sql += ' ORDER BY score DESC, id ASC' if backwards else ' ORDER BY score ASC, id DESC'
+    sql += ' LIMIT %s'
+    params.append(limit)
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchall()
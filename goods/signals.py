@@ -0,0 +1,148 @@
+# goods/signals.py
+"""Goods 相关的信号处理: 同步搜索索引、输入提示和分面计数缓存, 安排图片缩略图、感知哈希和相关商品任务"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from goods import facets, imaging, search, similarity, suggest
+from goods.models import CatalogueVersion, Goods, GoodsImage, OutcomeImage
+from jobs.queue import enqueue
+
+# bulk_create / bulk_update 不会触发 post_save, 批量写入商品后由调用方发送:
+#     goods_bulk_saved.send(sender=Goods, instances=[...])
+goods_bulk_saved = Signal()
+
+# Goods.touch() 之后发送 (图片增删、缩略图生成等), 参数 goods_id 和 fields (顺带修改的字段名)
+goods_touched = Signal()
+
+# 批量写入时每个相关商品任务处理的商品数
+SIMILARITY_BATCH = 500
+# 影响相关商品的字段, 只改了别的字段 (价格、收藏数等) 时不重新计算
+SIMILARITY_FIELDS = tuple(name for name in similarity.FIELDS if name != 'id')
+
+
+@receiver(post_save, sender=Goods)
+def index_goods_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    search.index_goods(instance)
+
+
+@receiver(goods_bulk_saved, sender=Goods)
+def index_goods_on_bulk_save(sender, instances, **kwargs):
+    search.index_many(instances)
+
+
+@receiver(pre_save, sender=Goods)
+def remember_suggest_terms(sender, instance, raw=False, **kwargs):
+    # 修改商品时要先从输入提示里去掉旧的名字 / 课程代码 / 教授
+    if not raw:
+        instance._suggest_old_terms = suggest.old_terms(instance)
+
+
+@receiver(post_save, sender=Goods)
+def update_suggestions_on_save(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    old_terms = instance.__dict__.pop('_suggest_old_terms', None)
+    transaction.on_commit(lambda: suggest.goods_saved(instance, old_terms))
+
+
+@receiver(goods_bulk_saved, sender=Goods)
+def update_suggestions_on_bulk_save(sender, instances, **kwargs):
+    # 批量修改不知道旧值, 只加入新值; 旧值等定期重建时去掉
+    def add():
+        for instance in instances:
+            suggest.goods_saved(instance)
+    transaction.on_commit(add)
+
+
+@receiver(post_delete, sender=Goods)
+def update_suggestions_on_delete(sender, instance, **kwargs):
+    transaction.on_commit(lambda: suggest.goods_deleted(instance))
+
+
+@receiver(post_save, sender=Goods)
+@receiver(post_delete, sender=Goods)
+@receiver(goods_bulk_saved, sender=Goods)
+def invalidate_facets(sender, raw=False, **kwargs):
+    # 提交后再失效, 否则并发请求可能在提交前把旧计数重新写回缓存
+    if not raw:
+        transaction.on_commit(facets.invalidate)
+
+
+@receiver(pre_save, sender=Goods)
+def remember_similarity_fields(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw or instance._state.adding or instance.pk is None:
+        return
+    if update_fields is not None and not set(update_fields) & set(SIMILARITY_FIELDS):
+        instance._similarity_old = _similarity_values(instance)
+        return
+    instance._similarity_old = Goods.objects.filter(pk=instance.pk).values_list(*SIMILARITY_FIELDS).first()
+
+
+def _similarity_values(instance):
+    return tuple(getattr(instance, name) for name in SIMILARITY_FIELDS)
+
+
+@receiver(post_save, sender=Goods)
+def update_similar_goods_on_save(sender, instance, created=False, raw=False, **kwargs):
+    if raw:
+        return
+    old = instance.__dict__.pop('_similarity_old', None)
+    if not created and old == _similarity_values(instance):
+        return
+    enqueue('goods.tasks.update_similar_goods', ids=[instance.pk])
+
+
+@receiver(goods_bulk_saved, sender=Goods)
+def update_similar_goods_on_bulk_save(sender, instances, **kwargs):
+    ids = [instance.pk for instance in instances]
+    for start in range(0, len(ids), SIMILARITY_BATCH):
+        enqueue('goods.tasks.update_similar_goods', ids=ids[start:start + SIMILARITY_BATCH])
+
+
+@receiver(post_delete, sender=Goods)
+def unindex_goods_on_delete(sender, instance, **kwargs):
+    search.remove_goods(instance.pk)
+
+
+@receiver(post_delete, sender=Goods)
+def count_goods_deletion(sender, instance, **kwargs):
+    # 删除不会改变最大的 updated_at, 商品 API 列表的 ETag 靠这个计数发现
+    CatalogueVersion.record_deletion()
+
+
+@receiver(post_save, sender=GoodsImage)
+@receiver(post_save, sender=OutcomeImage)
+def build_image_derivatives(sender, instance, raw=False, **kwargs):
+    # 缩略图在后台 worker 里生成, 不阻塞上传请求
+    if raw or imaging.is_current(instance):
+        return
+    enqueue('goods.tasks.build_image_derivatives', model=sender._meta.label_lower, pk=instance.pk)
+
+
+@receiver(post_save, sender=GoodsImage)
+def hash_goods_image(sender, instance, raw=False, **kwargs):
+    # 上传请求里已经算好的不再排任务 (marketplace/views.py 的 _save_item)
+    if raw or instance.phash is not None or not instance.image:
+        return
+    enqueue('goods.tasks.hash_goods_image', pk=instance.pk)
+
+
+@receiver(post_save, sender=GoodsImage)
+@receiver(post_save, sender=OutcomeImage)
+@receiver(post_delete, sender=GoodsImage)
+@receiver(post_delete, sender=OutcomeImage)
+def touch_goods_on_image_change(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    Goods.touch(instance.goods_id)
+
+
+@receiver(post_delete, sender=GoodsImage)
+@receiver(post_delete, sender=OutcomeImage)
+def delete_image_derivatives(sender, instance, **kwargs):
+    names = list((instance.variants or {}).values())
+    if names:
+        enqueue('goods.tasks.delete_files', names=names)
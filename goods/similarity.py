@@ -0,0 +1,237 @@
+# goods/similarity.py
+"""相关商品 (内容相似度)
+
+把 name / description / course_code / professor 切词后用特征哈希映射到固定维度,
+在候选集合内做 TF-IDF 加权的余弦相似度, 每个商品把分数最高的 TOP_K 个存进
+SimilarGoods 表; 详情页只需要一次按 (item, score) 索引的查询。
+
+候选集合是同一类别 (没有类别时同一专业) 里最新的 CANDIDATE_POOL 个商品,
+目录再大单个商品的计算量也是固定的。发布/修改商品后由后台任务增量更新,
+全量重建用 manage.py build_similar_goods。
+"""
+import re
+import zlib
+from functools import lru_cache
+
+import numpy as np
+from django.db import transaction
+from django.db.models import Count, Min, Q
+
+from goods.models import Goods, SimilarGoods
+
+DIMENSIONS = 1024
+TOP_K = 6
+CANDIDATE_POOL = 5000
+# 增量更新时, 新商品只会加入和它最相似的这些候选商品的列表
+REVERSE_LIMIT = 50
+
+FIELDS = ('id', 'name', 'description', 'course_code', 'professor', 'major', 'category')
+NAME_WEIGHT = 2.0
+COURSE_WEIGHT = 3.0
+PROFESSOR_WEIGHT = 2.0
+MAJOR_WEIGHT = 1.0
+STOP_WORDS = frozenset('a an and are as at be by for from in is it of on or that the this to with'.split())
+TOKEN_RE = re.compile(r'\w\w+')
+
+
+@lru_cache(maxsize=100_000)
+def _bucket(token):
+    # 不能用 hash(): 每个进程的随机种子不同
+    return zlib.crc32(token.encode()) % DIMENSIONS
+
+
+def features(row):
+    """values() 取出的一行 -> (哈希桶列表, 权重列表)"""
+    buckets, weights = [], []
+
+    def add(token, weight):
+        buckets.append(_bucket(token))
+        weights.append(weight)
+
+    for field, weight in (('name', NAME_WEIGHT), ('description', 1.0)):
+        for token in TOKEN_RE.findall(row[field].lower()):
+            if token not in STOP_WORDS:
+                add(token, weight)
+    code = row['course_code'].strip().upper()
+    if code:
+        add(f'course:{code}', COURSE_WEIGHT)
+        add(f'dept:{code.split("-")[0]}', COURSE_WEIGHT / 2)
+    professor = row['professor'].strip().lower()
+    if professor:
+        add(f'professor:{professor}', PROFESSOR_WEIGHT)
+    if row['major']:
+        add(f'major:{row["major"]}', MAJOR_WEIGHT)
+    return buckets, weights
+
+
+def _term_matrix(rows):
+    """次线性词频矩阵 log(1 + tf), 每行一个商品"""
+    matrix = np.zeros((len(rows), DIMENSIONS), dtype=np.float32)
+    for i, row in enumerate(rows):
+        buckets, weights = features(row)
+        if buckets:
+            matrix[i] = np.bincount(buckets, weights, minlength=DIMENSIONS)
+    return np.log1p(matrix, out=matrix)
+
+
+def _idf(pool):
+    df = np.count_nonzero(pool, axis=0)
+    return (np.log((1 + len(pool)) / (1 + df)) + 1).astype(np.float32)
+
+
+def _normalize(matrix, idf):
+    weighted = matrix * idf
+    norms = np.linalg.norm(weighted, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return weighted / norms
+
+
+def _best(scores, k):
+    """分数最高且大于 0 的 k 个下标, 按分数从高到低"""
+    k = min(k, len(scores))
+    if k == 0:
+        return []
+    top = np.argpartition(-scores, k - 1)[:k]
+    top = top[np.argsort(-scores[top], kind='stable')]
+    return [int(i) for i in top if scores[i] > 0]
+
+
+def _partition(queryset, category, major):
+    """候选范围: 同一类别; 没有类别时同一专业"""
+    if category:
+        return queryset.filter(category=category)
+    return queryset.filter(category='', major=major)
+
+
+def _pool(queryset):
+    return list(queryset.order_by('-created_at', '-id').values(*FIELDS)[:CANDIDATE_POOL])
+
+
+def related(goods, limit=4):
+    """详情页的相关商品; 还没有计算结果时退回同一类别的最新商品"""
+    return precomputed(goods.pk, limit) or latest_in_category(goods, limit)
+
+
+def precomputed(goods_id, limit=4):
+    """SimilarGoods 里的相关商品, 只需要商品 id (可以和取商品本身的查询同时进行)"""
+    return list(_precomputed(goods_id).prefetch_related('images')[:limit])
+
+
+def latest_in_category(goods, limit=4):
+    return list(_latest(goods.pk, goods.category, goods.major).prefetch_related('images')[:limit])
+
+
+def related_stamps(goods_id, category, major, limit=4):
+    """related() 会选出的商品的 [(id, updated_at)], 只取两列, 用于详情页的 ETag"""
+    return list(_precomputed(goods_id).values_list('id', 'updated_at')[:limit]) \
+        or list(_latest(goods_id, category, major).values_list('id', 'updated_at')[:limit])
+
+
+def _precomputed(goods_id):
+    return Goods.objects.filter(similar_to__item_id=goods_id).order_by('-similar_to__score')
+
+
+def _latest(goods_id, category, major):
+    return _partition(Goods.objects.exclude(pk=goods_id), category, major).order_by('-created_at', '-id')
+
+
+def update(goods_id):
+    """重新计算一个商品的相关商品, 并把它加入最相似的候选商品的列表; 返回保存的条数"""
+    row = Goods.objects.filter(pk=goods_id).values(*FIELDS).first()
+    if row is None:
+        return 0
+    pool_rows = _pool(_partition(Goods.objects.exclude(pk=goods_id), row['category'], row['major']))
+    if not pool_rows:
+        SimilarGoods.objects.filter(Q(item_id=goods_id) | Q(similar_id=goods_id)).delete()
+        return 0
+
+    pool = _term_matrix(pool_rows)
+    idf = _idf(pool)
+    scores = _normalize(pool, idf) @ _normalize(_term_matrix([row]), idf)[0]
+    ids = [pool_row['id'] for pool_row in pool_rows]
+
+    with transaction.atomic():
+        # 别的商品列表里指向它的链接也删掉: 类别/专业/文字改了以后, 旧分区里的商品不该再
+        # 显示它, 分数也过时了; 新的候选商品由 _offer 按新分数重新加入 (删掉后列表没满, 一定会加回)
+        SimilarGoods.objects.filter(Q(item_id=goods_id) | Q(similar_id=goods_id)).delete()
+        SimilarGoods.objects.bulk_create([
+            SimilarGoods(item_id=goods_id, similar_id=ids[i], score=float(scores[i])) for i in _best(scores, TOP_K)
+        ])
+        _offer(goods_id, {ids[i]: float(scores[i]) for i in _best(scores, REVERSE_LIMIT)})
+    return min(TOP_K, len(pool_rows))
+
+
+def _offer(goods_id, candidates):
+    """把商品加入候选商品的相关列表 (分数够高或列表未满时), 再把列表裁回 TOP_K"""
+    if not candidates:
+        return
+    stats = {
+        stat['item_id']: stat for stat in
+        SimilarGoods.objects.filter(item_id__in=candidates).values('item_id').annotate(n=Count('id'), low=Min('score'))
+    }
+    links = [
+        SimilarGoods(item_id=candidate, similar_id=goods_id, score=score)
+        for candidate, score in candidates.items()
+        if candidate not in stats or stats[candidate]['n'] < TOP_K or stats[candidate]['low'] < score
+    ]
+    SimilarGoods.objects.bulk_create(
+        links, update_conflicts=True, unique_fields=['item', 'similar'], update_fields=['score'],
+    )
+    for link in links:
+        if link.item_id in stats and stats[link.item_id]['n'] >= TOP_K:
+            extra = SimilarGoods.objects.filter(item_id=link.item_id).order_by('-score', 'id')[TOP_K:]
+            SimilarGoods.objects.filter(id__in=list(extra.values_list('id', flat=True))).delete()
+
+
+def _partitions():
+    # 要显式 order_by, 否则 Meta.ordering 的 created_at 会进入 DISTINCT
+    for category in Goods.objects.exclude(category='').order_by('category').values_list('category', flat=True).distinct():
+        yield _partition(Goods.objects.all(), category, '')
+    for major in Goods.objects.filter(category='').order_by('major').values_list('major', flat=True).distinct():
+        yield _partition(Goods.objects.all(), '', major)
+
+
+def rebuild(block_size=1000, progress=None):
+    """全量重建 SimilarGoods, 返回处理的商品数; progress(已处理数) 用于输出进度
+
+    按类别分区, 每个分区一个事务; 分区内每次取 block_size 个商品和候选集合做矩阵乘法。
+    """
+    done = 0
+    for partition in _partitions():
+        pool_rows = _pool(partition)
+        if not pool_rows:
+            continue
+        pool_raw = _term_matrix(pool_rows)
+        idf = _idf(pool_raw)
+        pool = _normalize(pool_raw, idf)
+        pool_ids = np.array([row['id'] for row in pool_rows])
+
+        with transaction.atomic():
+            SimilarGoods.objects.filter(item__in=partition).delete()
+            block = []
+            for row in partition.order_by('id').values(*FIELDS).iterator(chunk_size=block_size):
+                block.append(row)
+                if len(block) == block_size:
+                    _store_block(block, pool, pool_ids, idf)
+                    done += len(block)
+                    block = []
+                    if progress:
+                        progress(done)
+            if block:
+                _store_block(block, pool, pool_ids, idf)
+                done += len(block)
+                if progress:
+                    progress(done)
+    return done
+
+
+def _store_block(rows, pool, pool_ids, idf):
+    block_ids = np.array([row['id'] for row in rows])
+    scores = _normalize(_term_matrix(rows), idf) @ pool.T
+    # 自己不算相关商品
+    scores[block_ids[:, None] == pool_ids[None, :]] = -1
+    links = []
+    for item_id, item_scores in zip(block_ids, scores):
+        for i in _best(item_scores, TOP_K):
+            links.append(SimilarGoods(item_id=int(item_id), similar_id=int(pool_ids[i]), score=float(item_scores[i])))
+    SimilarGoods.objects.bulk_create(links, batch_size=5000)
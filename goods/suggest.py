@@ -0,0 +1,283 @@
+# goods/suggest.py
+"""搜索框的输入提示: 商品名、课程代码和教授名的前缀索引 (进程内存)
+
+索引是两个平行的有序数组: keys 是规范化 (casefold、合并空白) 后的文本, owners 是对应的
+词条编号。查询时两次 bisect 找出以前缀开头的 key 的范围, 按词条的商品数排序后返回前几个;
+范围超过 SCAN_LIMIT 个 key 的短前缀 (例如一个字母), 第一次查询后缓存排名, 所以每次查询的
+工作量有上限, 和商品总数无关。
+商品名和教授名除了整个文本, 后面几个词开头的部分也各有一个 key, 输入 "econ" 能提示
+"Intro to Economics"。
+
+- 建立: 三条 GROUP BY 查询, 每种词条只取商品数最多的 SUGGEST_MAX_TERMS 个, 合计也不超过
+  这个数, 所以 100 万商品时内存也有上限 (每个词条约 0.6 KB); 被截掉的是只有很少商品用到的名字。
+  服务器启动时在后台线程里建立 (PatchProject/wsgi.py, asgi.py), 建好之前返回空提示;
+  其它进程 (测试、管理命令) 第一次查询时同步建立。
+- 增量更新: goods/signals.py 在商品保存/删除时调用 goods_saved / goods_deleted,
+  只更新本进程的索引; 新词条在索引满了时不加入。
+- 重建: 多进程部署时别的进程的修改、批量导入 (不知道修改前的值) 都靠定期重建同步,
+  索引建立超过 SUGGEST_REBUILD_SECONDS 后, 下一次查询在后台线程重建, 期间继续用旧索引。
+"""
+import heapq
+import logging
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Count
+
+from goods.models import Goods
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('name', 'course_code', 'professor')
+
+# 匹配的 key 不超过这个数时直接排序; 超过时 (短前缀) 用缓存的排名
+SCAN_LIMIT = 256
+TOP_CACHED = 20
+# 比任何字符都大, prefix + _LAST 是以 prefix 开头的 key 的上界
+_LAST = '\U0010ffff'
+# 商品名 / 教授名除了开头之外, 再为后面几个词建 key
+WORD_KEYS = 3
+MAX_QUERY_LENGTH = 100
+
+
+def normalize(text):
+    return ' '.join(text.split()).casefold()
+
+
+def _key_texts(kind, norm):
+    if kind == 'course_code':
+        return [norm]
+    words = norm.split(' ')
+    return [norm, *(' '.join(words[i:]) for i in range(1, min(len(words), WORD_KEYS + 1)))]
+
+
+class Term:
+    __slots__ = ('kind', 'norm', 'text', 'count')
+
+    def __init__(self, kind, norm, text, count):
+        self.kind = kind
+        self.norm = norm
+        self.text = text
+        self.count = count
+
+
+class PrefixIndex:
+    """有序数组 + bisect 的前缀索引; 由调用方 (Suggestions) 加锁"""
+
+    def __init__(self, max_terms):
+        self.max_terms = max_terms
+        self.keys = []
+        self.owners = []
+        self.terms = {}     # 编号 -> Term
+        self.ids = {}       # (kind, norm) -> 编号
+        self._next_id = 0
+        # 匹配的 key 超过 SCAN_LIMIT 的短前缀 -> 商品数最多的 TOP_CACHED 个词条编号;
+        # 第一次查询时全部扫描一遍, 之后直接用, 商品数的变化等重建时更新
+        self._top = {}
+
+    @classmethod
+    def build(cls, counts, max_terms):
+        """counts: {(kind, 原文): 商品数}; 只保留商品数最多的 max_terms 个词条"""
+        index = cls(max_terms)
+        merged = {}
+        # 原文按商品数从多到少处理, 规范化后相同的词条显示最常见的写法
+        for (kind, text), count in sorted(counts.items(), key=lambda item: -item[1]):
+            norm = normalize(text)
+            if not norm:
+                continue
+            term = merged.get((kind, norm))
+            if term is None:
+                merged[(kind, norm)] = Term(kind, norm, ' '.join(text.split()), count)
+            else:
+                term.count += count
+        kept = sorted(merged.values(), key=lambda term: -term.count)[:max_terms]
+
+        pairs = []
+        for term_id, term in enumerate(kept):
+            index.terms[term_id] = term
+            index.ids[(term.kind, term.norm)] = term_id
+            pairs.extend((key, term_id) for key in _key_texts(term.kind, term.norm))
+        pairs.sort()
+        index.keys = [key for key, _ in pairs]
+        index.owners = [term_id for _, term_id in pairs]
+        index._next_id = len(kept)
+        return index
+
+    def __len__(self):
+        return len(self.terms)
+
+    def add(self, kind, text):
+        norm = normalize(text)
+        if not norm:
+            return
+        term_id = self.ids.get((kind, norm))
+        if term_id is not None:
+            self.terms[term_id].count += 1
+            return
+        if len(self.terms) >= self.max_terms:
+            return
+        term_id = self._next_id
+        self._next_id += 1
+        self.terms[term_id] = Term(kind, norm, ' '.join(text.split()), 1)
+        self.ids[(kind, norm)] = term_id
+        for key in _key_texts(kind, norm):
+            position = bisect_left(self.keys, key)
+            self.keys.insert(position, key)
+            self.owners.insert(position, term_id)
+
+    def remove(self, kind, text):
+        term_id = self.ids.get((kind, normalize(text)))
+        if term_id is None:
+            return
+        term = self.terms[term_id]
+        term.count -= 1
+        if term.count > 0:
+            return
+        del self.terms[term_id], self.ids[(kind, term.norm)]
+        for key in _key_texts(kind, term.norm):
+            position = bisect_left(self.keys, key)
+            while self.owners[position] != term_id:
+                position += 1
+            del self.keys[position], self.owners[position]
+
+    def lookup(self, prefix, limit):
+        """以 prefix 开头的词条, 商品数多的在前"""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        start = bisect_left(self.keys, prefix)
+        stop = bisect_left(self.keys, prefix + _LAST, start)
+        if stop - start <= SCAN_LIMIT:
+            ids = set(self.owners[start:stop])
+        else:
+            ids = self._top.get(prefix)
+            if ids is None:
+                ids = self._top[prefix] = heapq.nsmallest(TOP_CACHED, set(self.owners[start:stop]), key=self._rank)
+            # 缓存之后删除的词条跳过
+            ids = [term_id for term_id in ids if term_id in self.terms]
+        return [self.terms[term_id] for term_id in heapq.nsmallest(limit, ids, key=self._rank)]
+
+    def _rank(self, term_id):
+        term = self.terms[term_id]
+        return -term.count, term.norm
+
+
+def catalogue_counts(max_terms):
+    """{(kind, 原文): 商品数}, 每种只取商品数最多的 max_terms 个"""
+    counts = {}
+    for kind in KINDS:
+        rows = (
+            Goods.objects.exclude(**{kind: ''}).order_by().values_list(kind)
+            .annotate(n=Count('id')).order_by('-n')[:max_terms]
+        )
+        counts.update(((kind, text), n) for text, n in rows)
+    return counts
+
+
+class Suggestions:
+    """进程里唯一的索引, 负责建立、定期重建和加锁"""
+
+    def __init__(self):
+        self._index = None
+        self._built_at = 0.0
+        self._lock = threading.Lock()
+        self._building = None       # 后台重建线程
+        self._pending = None        # 后台重建期间的增量修改, 建好后重放
+
+    def _build(self):
+        return PrefixIndex.build(catalogue_counts(settings.SUGGEST_MAX_TERMS), settings.SUGGEST_MAX_TERMS)
+
+    def _rebuild_in_background(self):
+        try:
+            index = self._build()
+        except Exception:
+            logger.exception('Building the suggestion index failed')
+            with self._lock:
+                self._building = self._pending = None
+            return
+        finally:
+            close_old_connections()
+        with self._lock:
+            for method, kind, text in self._pending:
+                getattr(index, method)(kind, text)
+            self._index, self._built_at = index, time.monotonic()
+            self._building = self._pending = None
+
+    def start(self):
+        """在后台线程里建立或重建索引 (已经在进行时什么都不做)"""
+        with self._lock:
+            if self._building is not None:
+                return
+            self._pending = []
+            self._building = threading.Thread(target=self._rebuild_in_background, name='suggest-index', daemon=True)
+            self._building.start()
+
+    def lookup(self, prefix, limit):
+        if self._index is None:
+            if self._building is not None:
+                return []
+            index = self._build()
+            with self._lock:
+                if self._index is None:
+                    self._index, self._built_at = index, time.monotonic()
+        elif time.monotonic() - self._built_at > settings.SUGGEST_REBUILD_SECONDS:
+            self.start()
+        with self._lock:
+            return [(term.text, term.kind, term.count) for term in self._index.lookup(prefix, limit)]
+
+    def _apply(self, method, values):
+        with self._lock:
+            for kind, text in values:
+                if not text:
+                    continue
+                if self._index is not None:
+                    getattr(self._index, method)(kind, text)
+                if self._pending is not None:
+                    self._pending.append((method, kind, text))
+
+    def add(self, values):
+        self._apply('add', values)
+
+    def remove(self, values):
+        self._apply('remove', values)
+
+    @property
+    def active(self):
+        return self._index is not None or self._building is not None
+
+    def clear(self):
+        with self._lock:
+            self._index = None
+
+
+suggestions = Suggestions()
+
+
+def terms_of(goods):
+    return [(kind, getattr(goods, kind)) for kind in KINDS]
+
+
+def lookup(prefix, limit):
+    """[(文本, 种类, 商品数)]"""
+    return suggestions.lookup(prefix[:MAX_QUERY_LENGTH], limit)
+
+
+def goods_saved(goods, old_terms=None):
+    if old_terms:
+        suggestions.remove(old_terms)
+    suggestions.add(terms_of(goods))
+
+
+def goods_deleted(goods):
+    suggestions.remove(terms_of(goods))
+
+
+def old_terms(goods):
+    """保存前数据库里的值; 索引不在本进程里时不查询"""
+    if goods._state.adding or goods.pk is None or not suggestions.active:
+        return None
+    row = Goods.objects.filter(pk=goods.pk).values_list(*KINDS).first()
+    return list(zip(KINDS, row)) if row else None
@@ -0,0 +1,34 @@
+# goods/tasks.py
+"""goods 的后台任务, 通过 jobs.queue.enqueue 调度"""
+from django.apps import apps
+from django.core.files.storage import default_storage
+
+from goods import imagehash, imaging, similarity
+from goods.models import GoodsImage
+
+
+def build_image_derivatives(model, pk):
+    """生成 GoodsImage / OutcomeImage 的缩略图; 图片已被删除时直接跳过"""
+    instance = apps.get_model(model).objects.filter(pk=pk).first()
+    if instance is not None and not imaging.is_current(instance):
+        imaging.build_derivatives(instance)
+
+
+def hash_goods_image(pk):
+    """计算商品图片的感知哈希; 图片已被删除或已有哈希时跳过"""
+    instance = GoodsImage.objects.filter(pk=pk).first()
+    if instance is not None and instance.phash is None:
+        imagehash.hash_image(instance)
+
+
+def delete_files(names):
+    """删除存储中的文件 (图片删除后清理缩略图)"""
+    for name in names:
+        if default_storage.exists(name):
+            default_storage.delete(name)
+
+
+def update_similar_goods(ids):
+    """商品发布或修改后重新计算相关商品; 商品已被删除时跳过"""
+    for goods_id in ids:
+        similarity.update(goods_id)
@@ -1,3 +1,511 @@
-from django.test import TestCase
+import shutil
+import tempfile
+from datetime import datetime, timezone as dt_timezone
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import cv2
+import numpy as np
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import SimpleTestCase, TestCase, override_settings, skipUnlessDBFeature
+from django.urls import reverse
+
+from goods import analysis, conversations, facets, imagehash, imaging, querylog, search, similarity, suggest
+from goods.models import Goods, GoodsImage, Conversation, Favorite, SearchQuery, SimilarGoods
+from jobs.models import Job
+from marketplace.pagination import KeysetPaginator
+from marketplace.views import SHOP_PAGE_SIZE, _search_page
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTests(TestCase):
+    """热点查询必须走索引: 不能全表扫描, 也不能用临时 B 树排序
+
+    查询写法和 marketplace/views.py 里保持一致; 改了视图里的筛选或排序时这里也要跟着改。
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seller', password='pass12345')
+        cls.item = Goods.objects.create(name='Brush', price=5, seller=cls.user, major='design', category='paints')
+
+    def explain(self, queryset):
+        sql, params = queryset.query.sql_with_params()
+        with connection.cursor() as cursor:
+            cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+            return [row[-1] for row in cursor.fetchall()]
+
+    def assertIndexed(self, queryset, table):
+        """table 必须用索引查找 (SEARCH), 整个查询不能出现全表扫描或临时排序"""
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan format is SQLite specific')
+        plan = self.explain(queryset)
+        detail = '\n'.join(plan)
+        for line in plan:
+            # "SCAN t" 是全表扫描; "SCAN t USING INDEX ..." 是按索引顺序读, 允许
+            self.assertFalse(line.startswith('SCAN ') and ' USING ' not in line, f'Full scan:\n{detail}')
+            self.assertNotIn('TEMP B-TREE', line, f'Sort without index:\n{detail}')
+        self.assertTrue(any(line.startswith(f'SEARCH {table} ') for line in plan), f'No index search:\n{detail}')
+
+    def shop_queryset(self, **filters):
+        return Goods.objects.filter(**filters).order_by('-created_at', '-id')[:25]
+
+    def test_shop_by_major(self):
+        self.assertIndexed(self.shop_queryset(major='design'), 'goods_goods')
+
+    def test_shop_by_category(self):
+        self.assertIndexed(self.shop_queryset(category='paints'), 'goods_goods')
+
+    def test_shop_by_major_and_category(self):
+        self.assertIndexed(self.shop_queryset(major='design', category='paints'), 'goods_goods')
+
+    def test_shop_next_page(self):
+        paginator = KeysetPaginator(('-created_at', '-id'))
+        cursor = paginator._after(paginator.ordering, [datetime(2026, 1, 1, tzinfo=dt_timezone.utc), 100])
+        queryset = Goods.objects.filter(cursor, major='design').order_by(*paginator.ordering)[:25]
+        self.assertIndexed(queryset, 'goods_goods')
+
+    def test_shop_most_favorited(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan format is SQLite specific')
+        # 第一页直接按索引顺序读前 25 行, 之后的页从游标位置开始查找
+        plan = self.explain(Goods.objects.order_by('-favorite_count', '-id')[:25])
+        self.assertEqual(plan, ['SCAN goods_goods USING INDEX goods_favorite_count_idx'])
+        paginator = KeysetPaginator(('-favorite_count', '-id'))
+        queryset = Goods.objects.filter(paginator._after(paginator.ordering, [3, 100])).order_by(*paginator.ordering)
+        self.assertIndexed(queryset[:25], 'goods_goods')
+        for filters in ({'major': 'design'}, {'category': 'paints'}):
+            self.assertIndexed(Goods.objects.filter(**filters).order_by(*paginator.ordering)[:25], 'goods_goods')
+
+    def test_my_account(self):
+        self.assertIndexed(Goods.objects.filter(seller=self.user), 'goods_goods')
+
+    def test_conversation_thread(self):
+        conversation = Conversation.objects.create(item=self.item, buyer=self.user, seller=self.user)
+        queryset = conversations.thread(conversation).order_by('-created_at', '-id')[:51]
+        self.assertIndexed(queryset, 'goods_message')
+
+    def test_inbox(self):
+        for box in conversations.BOXES:
+            queryset = conversations.inbox(self.user, box).order_by('-last_message_at', '-id')[:21]
+            self.assertIndexed(queryset, 'goods_conversation')
+
+    def test_favorites_list(self):
+        self.assertIndexed(Favorite.objects.filter(user=self.user).select_related('item'), 'goods_favorite')
+
+    def test_facet_counts(self):
+        if connection.vendor != 'sqlite':
+            self.skipTest('Plan format is SQLite specific')
+        plan = self.explain(Goods.objects.order_by().values_list('major', 'category').annotate(n=Count('id')))
+        self.assertEqual(plan, ['SCAN goods_goods USING COVERING INDEX goods_major_category_idx'])
+
+    def test_related_items(self):
+        queryset = Goods.objects.filter(similar_to__item=self.item).order_by('-similar_to__score')[:4]
+        self.assertIndexed(queryset, 'goods_similargoods')
+
+    def test_duplicate_photo_candidates(self):
+        self.assertIndexed(imagehash.candidates(0x0123456789abcdef), 'goods_goodsimage')
+
+
+class SimilarityTests(TestCase):
+
+    def make(self, name, category='paints', **fields):
+        return Goods.objects.create(name=name, price=5, category=category, **fields)
+
+    def test_update_ranks_similar_items_and_links_back(self):
+        target = self.make('Watercolor Paint Set', description='half pans watercolor', course_code='ILL-2000-A')
+        close = self.make('Watercolor Pans', description='watercolor tubes', course_code='ILL-2000-B')
+        far = self.make('Acrylic Paint', description='heavy body acrylic')
+        self.make('Watercolor Paper', category='papers')
+
+        similarity.update(target.id)
+        related = list(SimilarGoods.objects.filter(item=target).order_by('-score').values_list('similar_id', flat=True))
+        self.assertEqual(related, [close.id, far.id])
+        # 另一类别的商品不在候选范围内; 相似的商品反过来也会把 target 加进自己的列表
+        self.assertTrue(SimilarGoods.objects.filter(item=close, similar=target).exists())
+        self.assertEqual([item.id for item in similarity.related(target)], [close.id, far.id])
+
+    def test_update_drops_links_from_the_old_partition(self):
+        target = self.make('Watercolor Paint Set', description='half pans watercolor')
+        close = self.make('Watercolor Pans', description='watercolor tubes')
+        similarity.update(target.id)
+        self.assertTrue(SimilarGoods.objects.filter(item=close, similar=target).exists())
+
+        Goods.objects.filter(pk=target.pk).update(category='papers', name='Cold Press Paper', description='300gsm')
+        paper = self.make('Hot Press Paper', category='papers', description='300gsm')
+        similarity.update(target.id)
+        self.assertFalse(SimilarGoods.objects.filter(item=close, similar=target).exists())
+        self.assertEqual(list(SimilarGoods.objects.filter(similar=target).values_list('item_id', flat=True)), [paper.id])
+
+    def test_related_falls_back_to_latest_in_category(self):
+        older = self.make('Brush')
+        newer = self.make('Brush Set')
+        self.make('Canvas', category='papers')
+        item = self.make('Sable Brush')
+        self.assertEqual([goods.id for goods in similarity.related(item)], [newer.id, older.id])
+
+    def test_only_content_changes_schedule_an_update(self):
+        item = self.make('Sable Brush')
+        jobs = Job.objects.filter(task='goods.tasks.update_similar_goods')
+        self.assertEqual(jobs.count(), 1)
+        item.price = 7
+        item.save()
+        item.save(update_fields=['price'])
+        self.assertEqual(jobs.count(), 1)
+        item.description = 'round, size 4'
+        item.save()
+        self.assertEqual(jobs.count(), 2)
+
+
+class FacetTests(TestCase):
+
+    def setUp(self):
+        facets.invalidate()
+        for major, category in [('design', 'paints'), ('design', 'brushes'), ('film', 'paints'), ('', 'paints')]:
+            Goods.objects.create(name='Watercolor', price=5, major=major, category=category)
+
+    def test_each_facet_ignores_its_own_filter(self):
+        counts = facets.grouped_counts(Goods.objects.all())
+        majors, categories = facets.facet_counts(counts, major='design', category='paints')
+        self.assertEqual(majors, {'design': 1, 'film': 1, '': 1})
+        self.assertEqual(categories, {'paints': 1, 'brushes': 1})
+
+    def test_catalogue_counts_are_cached_until_goods_change(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Goods.objects.create(name='Easel', price=5, major='film', category='tools')
+        self.assertEqual(facets.catalogue_counts()[('film', 'tools')], 1)
+        with self.assertNumQueries(0):
+            facets.catalogue_counts()
+        with self.captureOnCommitCallbacks(execute=True):
+            Goods.objects.filter(category='tools').get().delete()
+        self.assertNotIn(('film', 'tools'), facets.catalogue_counts())
+
+    def test_search_filter(self):
+        Goods.objects.create(name='Tripod', price=5, major='film', category='filming')
+        queryset = search.filter_matching(Goods.objects.all(), 'tripod')
+        self.assertEqual(facets.grouped_counts(queryset), {('film', 'filming'): 1})
+
+
+class PrefixIndexTests(SimpleTestCase):
+
+    def build(self, max_terms=100):
+        return suggest.PrefixIndex.build({
+            ('name', 'Intro to  Economics'): 3,
+            ('name', 'intro to economics'): 1,
+            ('name', 'Intaglio Plates'): 1,
+            ('course_code', 'DSD-3003-B'): 2,
+            ('professor', 'Ada Lovelace'): 1,
+        }, max_terms)
+
+    def texts(self, index, prefix):
+        return [term.text for term in index.lookup(prefix, 10)]
+
+    def test_prefix_and_word_matches(self):
+        index = self.build()
+        self.assertEqual(self.texts(index, 'INT'), ['Intro to Economics', 'Intaglio Plates'])
+        self.assertEqual(index.lookup('int', 10)[0].count, 4)
+        self.assertEqual(self.texts(index, 'econ'), ['Intro to Economics'])
+        self.assertEqual(self.texts(index, 'dsd-30'), ['DSD-3003-B'])
+        self.assertEqual(self.texts(index, 'lovel'), ['Ada Lovelace'])
+        self.assertEqual(self.texts(index, 'x'), [])
+        self.assertEqual(self.texts(index, ' '), [])
+
+    def test_incremental_updates(self):
+        index = self.build()
+        index.add('name', 'Economics Workbook')
+        self.assertEqual(self.texts(index, 'econ'), ['Intro to Economics', 'Economics Workbook'])
+        index.remove('name', 'Economics Workbook')
+        index.remove('professor', 'Ada Lovelace')
+        self.assertEqual(self.texts(index, 'econ'), ['Intro to Economics'])
+        self.assertEqual(self.texts(index, 'ada'), [])
+        self.assertEqual(len(index.keys), len(index.owners))
+
+    def test_memory_is_bounded(self):
+        index = self.build(max_terms=2)
+        self.assertEqual(len(index), 2)
+        index.add('name', 'Palette Knife')
+        self.assertEqual(self.texts(index, 'pal'), [])
+
+
+class SuggestionTests(TestCase):
+
+    def setUp(self):
+        suggest.suggestions.clear()
+        self.addCleanup(suggest.suggestions.clear)
+
+    def fetch(self, query):
+        response = self.client.get(reverse('marketplace:shop_suggest'), {'q': query})
+        return [item['text'] for item in response.json()['suggestions']]
+
+    def test_endpoint_follows_goods_changes(self):
+        item = Goods.objects.create(name='Gouache Set', price=8, professor='Ada Lovelace', course_code='PNT-1001')
+        response = self.client.get(reverse('marketplace:shop_suggest'), {'q': 'gou'})
+        self.assertEqual(response.json(), {
+            'query': 'gou', 'suggestions': [{'text': 'Gouache Set', 'kind': 'name', 'count': 1}],
+        })
+        self.assertIn('max-age=60', response['Cache-Control'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.name = 'Watercolor Set'
+            item.save()
+        self.assertEqual(self.fetch('gou'), [])
+        self.assertEqual(self.fetch('water'), ['Watercolor Set'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            item.delete()
+        self.assertEqual(self.fetch('water'), [])
+        self.assertEqual(self.fetch('pnt'), [])
+
+
+class AnalysisTests(SimpleTestCase):
+
+    def test_chinese_words_and_course_codes(self):
+        self.assertIn('颜料', analysis.index_text('水彩颜料套装').split())
+        self.assertEqual(analysis.query_terms('DSD-3003-B'), ['dsd', '3003', 'b'])
+        self.assertEqual(analysis.query_terms('dsd3003b'), ['dsd', '3003', 'b'])
+        self.assertEqual(analysis.query_terms('Canvas 画布'), ['canvas', '画布'])
+        self.assertEqual(analysis.query_terms(' - '), [])
+
+
+class SearchTests(TestCase):
+
+    def search(self, query, **filters):
+        return [goods_id for goods_id, _ in search.ranked_ids(query, **filters)]
+
+    def test_prefix_matching_and_ranking(self):
+        brush = Goods.objects.create(name='Watercolor Brush', price=5, category='brushes')
+        mention = Goods.objects.create(name='Easel', price=5, description='works with a watercolor brush')
+        code = Goods.objects.create(name='Reader', price=5, course_code='DSD-3003-B')
+        # name 的权重比 description 高
+        self.assertEqual(self.search('water bru'), [brush.id, mention.id])
+        self.assertEqual(self.search('water', category='brushes'), [brush.id])
+        self.assertEqual(self.search('dsd-30'), [code.id])
+        self.assertEqual(self.search('tripod'), [])
+
+    def test_fts_operators_are_quoted(self):
+        easel = Goods.objects.create(name='Easel OR Tripod', price=5)
+        Goods.objects.create(name='Tripod', price=5)
+        self.assertEqual(search.build_match('easel OR tripod'), '"easel"* "or"* "tripod"*')
+        self.assertEqual(self.search('easel OR tripod'), [easel.id])
+        for query in ('"', 'NEAR(easel', 'easel AND NOT', '*', '^easel', 'name:easel', '- + ( )'):
+            search.ranked_ids(query)
+        self.assertEqual(search.build_match('" * ( )'), '')
+        self.assertEqual(self.search('" * ( )'), [])
+
+    def test_cursor_paging(self):
+        for i in range(SHOP_PAGE_SIZE + 6):
+            Goods.objects.create(name=f'Brush {i}', price=5)
+        first = _search_page('brush', '', '', '', '')
+        second = _search_page('brush', '', '', first.next_cursor, '')
+        self.assertEqual(len(first.items), SHOP_PAGE_SIZE)
+        self.assertEqual(len(second.items), 6)
+        self.assertFalse(second.has_next)
+        seen = [goods.id for goods in first.items + second.items]
+        self.assertEqual(len(set(seen)), SHOP_PAGE_SIZE + 6)
+        back = _search_page('brush', '', '', '', second.previous_cursor)
+        self.assertEqual([goods.id for goods in back.items], [goods.id for goods in first.items])
+        # 无效游标按第一页处理
+        self.assertEqual(len(_search_page('brush', '', '', 'garbage', '').items), SHOP_PAGE_SIZE)
+
+    def test_icontains_fallback(self):
+        Goods.objects.create(name='Watercolor Brush', price=5)
+        Goods.objects.create(name='Easel', price=5)
+        cache.clear()
+        with mock.patch('goods.search.is_available', return_value=False):
+            response = self.client.get(reverse('marketplace:shop'), {'search': 'tercol'})
+        self.assertEqual([goods.name for goods in response.context['items']], ['Watercolor Brush'])
+
+
+class SearchAnalysisTests(TestCase):
+
+    def search(self, query):
+        return [goods_id for goods_id, _ in search.ranked_ids(query)]
+
+    def test_mixed_language_matches(self):
+        paints = Goods.objects.create(name='水彩颜料套装', price=5, course_code='DSD-3003-B')
+        canvas = Goods.objects.create(name='Canvas 画布 A3', price=5, professor='王老师')
+        self.assertEqual(self.search('颜料'), [paints.id])
+        self.assertEqual(self.search('水彩 颜料'), [paints.id])
+        self.assertEqual(self.search('dsd3003'), [paints.id])
+        self.assertEqual(self.search('画布 canv'), [canvas.id])
+        self.assertEqual(self.search('油画'), [])
+
+
+@override_settings(SEARCH_LOG_FLUSH_SIZE=3, SEARCH_LOG_FLUSH_SECONDS=3600)
+class QueryLogTests(TestCase):
+
+    def setUp(self):
+        querylog._pending.clear()
+        cache.clear()
+        self.addCleanup(querylog._pending.clear)
+
+    def test_counts_are_written_in_batches(self):
+        self.assertFalse(querylog.record('Watercolor  Set'))
+        self.assertFalse(querylog.record(' '))
+        self.assertFalse(querylog.record('watercolor set'))
+        self.assertTrue(querylog.record('Watercolor set'))
+        self.assertFalse(SearchQuery.objects.exists())
+        self.assertEqual(querylog.flush(), 1)
+        querylog.record('WATERCOLOR SET')
+        querylog.record('tripod')
+        self.assertEqual(querylog.flush(), 2)
+        self.assertEqual(dict(SearchQuery.objects.values_list('query', 'count')), {'watercolor set': 4, 'tripod': 1})
+        self.assertEqual(querylog.flush(), 0)
+
+    def test_each_client_counts_once_per_term(self):
+        self.assertFalse(querylog.record('tripod', '10.0.0.1'))
+        self.assertFalse(querylog.record('Tripod ', '10.0.0.1'))
+        querylog.record('easel', '10.0.0.1')
+        querylog.record('tripod', '10.0.0.2')
+        self.assertEqual(querylog._pending, {'tripod': 2, 'easel': 1})
+
+    @override_settings(POPULAR_SEARCHES_MIN_COUNT=2)
+    def test_shop_searches_and_popular_list(self):
+        Goods.objects.create(name='Tripod', price=5)
+        shop = reverse('marketplace:shop')
+        # 第三次计数时写入; 翻页和同一个地址重复搜同一个词不计数, 最后一次还在内存里
+        for query, address in (('tripod', '10.0.0.1'), ('Tripod', '10.0.0.2'), ('tripod', '10.0.0.1'),
+                               ('easel', '10.0.0.1'), ('tripod', '10.0.0.3')):
+            self.client.get(shop, {'search': query}, REMOTE_ADDR=address)
+        self.client.get(shop, {'search': 'tripod', 'after': 'x'}, REMOTE_ADDR='10.0.0.4')
+        self.assertEqual(querylog._pending, {'tripod': 1})
+        self.assertEqual(dict(SearchQuery.objects.values_list('query', 'count')), {'tripod': 2, 'easel': 1})
+        # easel 只有一个地址搜过, 不够 POPULAR_SEARCHES_MIN_COUNT
+        self.assertEqual(querylog.popular(), ['tripod'])
+        response = self.client.get(shop)
+        self.assertEqual(response.context['popular_searches'], ['tripod'])
+
+
+def photo(seed, size=(640, 480)):
+    """随机的平滑 "照片" (BGR 数组)"""
+    noise = np.random.default_rng(seed).integers(0, 255, (12, 16, 3), dtype=np.uint8)
+    return cv2.GaussianBlur(cv2.resize(noise, size, interpolation=cv2.INTER_CUBIC), (0, 0), 3)
+
+
+def encode(image, ext='.jpg', quality=90):
+    params = [cv2.IMWRITE_JPEG_QUALITY, quality] if ext == '.jpg' else []
+    return cv2.imencode(ext, image, params)[1].tobytes()
+
+
+class ImageHashTests(SimpleTestCase):
+
+    def test_edited_copies_stay_close(self):
+        image = photo(1)
+        value = imagehash.phash(encode(image))
+        copies = [
+            encode(image, quality=50),
+            encode(cv2.resize(image, (320, 240), interpolation=cv2.INTER_AREA)),
+            encode(cv2.convertScaleAbs(image, beta=25)),
+            encode(image, '.png'),
+        ]
+        for data in copies:
+            self.assertLessEqual(imagehash.distance(value, imagehash.phash(data)), imagehash.DUPLICATE_DISTANCE)
+        self.assertGreater(imagehash.distance(value, imagehash.phash(encode(photo(2)))), 10)
+        self.assertIsNone(imagehash.phash(b'not an image'))
+
+    def test_storage_fields(self):
+        value = 0xfedcba9876543210
+        fields = imagehash.hash_fields(value)
+        self.assertLess(fields['phash'], 0)
+        self.assertEqual(imagehash.to_unsigned(fields['phash']), value)
+        self.assertEqual([fields[name] for name in imagehash.BAND_FIELDS], [0xfedc, 0xba98, 0x7654, 0x3210])
+        self.assertEqual(imagehash.hash_fields(None), {})
+
+
+class DuplicatePhotoTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seller', password='pass12345')
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.client.force_login(self.user)
+
+    def post(self, name, *images):
+        files = [SimpleUploadedFile(f'{name}{i}.jpg', data, 'image/jpeg') for i, data in enumerate(images)]
+        return self.client.post(reverse('marketplace:post_item'), {
+            'name': name, 'price': '5', 'product_images': files,
+        }, follow=True)
+
+    def warnings(self, response):
+        return [str(message) for message in response.context['messages'] if message.level_tag == 'warning']
+
+    def test_reposted_photo_is_flagged_on_upload(self):
+        self.assertEqual(self.warnings(self.post('Easel', encode(photo(1)))), [])
+        easel = Goods.objects.get(name='Easel')
+        self.assertIsNotNone(easel.images.get().phash)
+        self.assertFalse(Job.objects.filter(task='goods.tasks.hash_goods_image').exists())
+
+        response = self.post('Easel again', encode(photo(3)), encode(photo(1), quality=60))
+        self.assertEqual(len(self.warnings(response)), 1)
+        self.assertIn('"Easel"', self.warnings(response)[0])
+        again = Goods.objects.get(name='Easel again')
+        self.assertEqual(imagehash.duplicate_goods(again), [easel.id])
+        self.assertEqual(imagehash.duplicate_goods(easel), [again.id])
+
+    def test_backfill_command(self):
+        item = Goods.objects.create(name='Tripod', price=5)
+        images = [
+            GoodsImage.objects.create(goods=item, image=SimpleUploadedFile(f'{i}.jpg', encode(photo(i))), order=i)
+            for i in range(3)
+        ]
+        GoodsImage.objects.create(goods=item, image=SimpleUploadedFile('bad.jpg', b'not an image'), order=3)
+        self.assertEqual(Job.objects.filter(task='goods.tasks.hash_goods_image').count(), 4)
+
+        out = StringIO()
+        call_command('hash_goods_images', processes=2, batch_size=2, stdout=out)
+        self.assertIn('Hashed 3 images, 1 failed', out.getvalue())
+        for image in images:
+            image.refresh_from_db()
+            with image.image.open('rb') as fh:
+                self.assertEqual(imagehash.to_unsigned(image.phash), imagehash.phash(fh.read()))
+            self.assertEqual(imagehash.near_duplicates(imagehash.to_unsigned(image.phash)), [(image.pk, item.pk, 0)])
+
+
+class ImagingTests(TestCase):
+
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.item = Goods.objects.create(name='Easel', price=5)
+
+    def image(self, name, data, order=0):
+        return GoodsImage.objects.create(goods=self.item, image=SimpleUploadedFile(name, data), order=order)
+
+    def test_derivative_names_keep_the_extension(self):
+        self.assertEqual(imaging.derivative_name('goods_images/a.jpg', 256), 'goods_images/derivatives/a_jpg_256w.webp')
+        self.assertNotEqual(imaging.derivative_name('goods_images/a.jpg', 256),
+                            imaging.derivative_name('goods_images/a.png', 256))
+
+    def test_same_stem_images_keep_their_own_derivatives(self):
+        jpg = self.image('a.jpg', encode(photo(1, (1200, 900))))
+        png = self.image('a.png', encode(photo(2, (200, 150)), '.png'), order=1)
+        self.assertTrue(imaging.build_derivatives(jpg))
+        self.assertTrue(imaging.build_derivatives(png))
+        self.assertEqual(sorted(jpg.variants), ['1024', '256', '512'])
+        # 原图比 256 还窄时只生成一张原始宽度的
+        self.assertEqual(list(png.variants), ['200'])
+        storage = jpg.image.storage
+        for instance in (jpg, png):
+            instance.refresh_from_db()
+            self.assertTrue(imaging.is_current(instance))
+            self.assertTrue(all(storage.exists(name) for name in instance.variants.values()))
+        self.assertFalse(set(jpg.variants.values()) & set(png.variants.values()))
+
+    def test_replaced_image_is_not_current(self):
+        image = self.image('a.jpg', encode(photo(1)))
+        imaging.build_derivatives(image)
+        image.image = SimpleUploadedFile('b.jpg', encode(photo(2)))
+        image.save()
+        self.assertFalse(imaging.is_current(image))
+        self.assertFalse(imaging.is_current(GoodsImage(goods=self.item, image='goods_images/a.jpg')))
@@ -0,0 +1,81 @@
+# jobs/management/commands/run_worker.py
+"""后台任务 worker
+
+    python manage.py run_worker --processes 4
+
+主进程负责领取任务和记录结果, 任务本身在进程池里执行。
+Ctrl+C / SIGTERM 时不再领取新任务, 等正在执行的任务结束后退出。
+"""
+import os
+import signal
+import socket
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from multiprocessing import get_context
+
+from django.core.management.base import BaseCommand
+
+from jobs import queue, runner
+
+
+class Command(BaseCommand):
+    help = '执行 jobs 队列中的后台任务'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=os.cpu_count() or 2)
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--visibility-timeout', type=int, default=None)
+        parser.add_argument('--once', action='store_true', help='Exit when the queue is drained')
+
+    def handle(self, *args, **options):
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self._stop)
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        processes = options['processes']
+        self.stdout.write(f'Worker {worker} started with {processes} processes')
+
+        running = {}
+        executor = ProcessPoolExecutor(max_workers=processes, mp_context=get_context('spawn'),
+                                       initializer=runner.init_process)
+        try:
+            while not self.stopping:
+                free = processes - len(running)
+                jobs = queue.claim(worker, limit=free, visibility_timeout=options['visibility_timeout']) if free else []
+                for job in jobs:
+                    running[executor.submit(runner.execute, job.task, job.payload)] = job
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    self._finish(running.pop(future), future)
+        except KeyboardInterrupt:
+            self.stopping = True
+        finally:
+            # 还没开始的任务退回队列, 正在执行的等它结束
+            for future, job in list(running.items()):
+                if future.cancel():
+                    queue.release(job)
+                    running.pop(future)
+            for future in list(running):
+                future.exception()
+                self._finish(running.pop(future), future)
+            executor.shutdown()
+        self.stdout.write('Worker stopped')
+
+    def _stop(self, signum, frame):
+        self.stopping = True
+
+    def _finish(self, job, future):
+        exc = future.exception()
+        ok, error = (False, repr(exc)) if exc else future.result()
+        if ok:
+            queue.complete(job)
+            self.stdout.write(f'[done] {job.task} #{job.id}')
+        else:
+            queue.fail(job, error)
+            self.stderr.write(f'[failed] {job.task} #{job.id} (attempt {job.attempts}/{job.max_attempts})')
@@ -0,0 +1,132 @@
+# jobs/queue.py
+"""数据库任务队列
+
+不依赖 Redis 等外部 broker, 任务就是 jobs_job 表里的一行:
+
+    from jobs.queue import enqueue
+    enqueue('goods.tasks.build_image_derivatives', model='goods.goodsimage', pk=1)
+
+任务函数用点路径引用, 参数必须能 JSON 序列化。在事务里入队时任务行和业务数据
+一起提交, worker 不会看到还没提交的任务。
+
+worker (manage.py run_worker) 通过条件 UPDATE 领取任务, 领取后在
+locked_until 之前独占; 进程崩溃时锁到期, 任务会被其它 worker 重新领取。
+失败的任务按指数退避重试, 超过 max_attempts 后标记为 failed。
+"""
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import models, transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from jobs.models import Job
+
+# 默认配置, 可在 settings 里覆盖
+DEFAULT_VISIBILITY_TIMEOUT = 300   # 秒
+DEFAULT_RETRY_BASE_DELAY = 10      # 秒, 第 n 次失败后等待 base * 2**(n-1)
+DEFAULT_RETRY_MAX_DELAY = 3600
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _task_path(task):
+    if isinstance(task, str):
+        return task
+    return f'{task.__module__}.{task.__qualname__}'
+
+
+def enqueue(task, *, delay=0, max_attempts=5, **payload):
+    """把任务放入队列, 返回 Job
+
+    settings.JOBS_EAGER 为 True 时 (开发/测试) 在事务提交后直接在当前进程执行。
+    """
+    path = _task_path(task)
+    if _setting('JOBS_EAGER', False):
+        transaction.on_commit(lambda: import_string(path)(**payload))
+        return None
+    return Job.objects.create(
+        task=path,
+        payload=payload,
+        max_attempts=max_attempts,
+        run_at=timezone.now() + timedelta(seconds=delay),
+    )
+
+
+def _available(now):
+    """可领取的任务: 到期的 pending, 或锁已过期且还有重试次数的 running"""
+    return (
+        models.Q(status=Job.STATUS_PENDING, run_at__lte=now) |
+        models.Q(status=Job.STATUS_RUNNING, locked_until__lt=now, attempts__lt=models.F('max_attempts'))
+    )
+
+
+def claim(worker, limit=1, visibility_timeout=None):
+    """领取最多 limit 个任务, 返回已领取的 Job 列表
+
+    先读出候选 id, 再逐个用带条件的 UPDATE 抢占; 多个 worker 同时抢同一个任务时
+    只有一个 UPDATE 会命中, 所以不需要 SELECT ... FOR UPDATE。
+    """
+    timeout = visibility_timeout or _setting('JOBS_VISIBILITY_TIMEOUT', DEFAULT_VISIBILITY_TIMEOUT)
+    now = timezone.now()
+    expire_exhausted(now)
+
+    candidates = list(
+        Job.objects.filter(_available(now)).order_by('run_at', 'id').values_list('id', flat=True)[:limit * 2]
+    )
+    claimed = []
+    for job_id in candidates:
+        if len(claimed) >= limit:
+            break
+        updated = Job.objects.filter(_available(now), id=job_id).update(
+            status=Job.STATUS_RUNNING,
+            attempts=models.F('attempts') + 1,
+            locked_until=now + timedelta(seconds=timeout),
+            worker=worker,
+        )
+        if updated:
+            claimed.append(job_id)
+    return list(Job.objects.filter(id__in=claimed).order_by('run_at', 'id'))
+
+
+def expire_exhausted(now=None):
+    """锁过期且没有重试次数的任务直接标记为失败"""
+    now = now or timezone.now()
+    return Job.objects.filter(
+        status=Job.STATUS_RUNNING, locked_until__lt=now, attempts__gte=models.F('max_attempts'),
+    ).update(status=Job.STATUS_FAILED, locked_until=None, finished_at=now,
+             last_error='Visibility timeout expired on the final attempt')
+
+
+def complete(job):
+    Job.objects.filter(id=job.id, worker=job.worker).update(
+        status=Job.STATUS_DONE, locked_until=None, last_error='', finished_at=timezone.now(),
+    )
+
+
+def retry_delay(attempts):
+    """指数退避 + 抖动, 避免大量失败任务同时重试"""
+    base = _setting('JOBS_RETRY_BASE_DELAY', DEFAULT_RETRY_BASE_DELAY)
+    limit = _setting('JOBS_RETRY_MAX_DELAY', DEFAULT_RETRY_MAX_DELAY)
+    delay = min(base * 2 ** max(attempts - 1, 0), limit)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def fail(job, error):
+    """记录失败; 还有重试次数时放回队列, 否则标记为 failed"""
+    now = timezone.now()
+    if job.attempts < job.max_attempts:
+        changes = dict(status=Job.STATUS_PENDING, run_at=now + timedelta(seconds=retry_delay(job.attempts)))
+    else:
+        changes = dict(status=Job.STATUS_FAILED, finished_at=now)
+    Job.objects.filter(id=job.id, worker=job.worker).update(locked_until=None, last_error=error, **changes)
+
+
+def release(job):
+    """worker 退出时把领取了但没开始的任务还回去 (不计入重试次数)"""
+    Job.objects.filter(id=job.id, worker=job.worker, status=Job.STATUS_RUNNING).update(
+        status=Job.STATUS_PENDING, locked_until=None, attempts=models.F('attempts') - 1,
+    )
@@ -0,0 +1,36 @@
+# jobs/runner.py
+"""worker 进程池子进程里执行的函数
+
+子进程用 spawn 启动, 反序列化这些函数时会导入本模块, 所以这里在模块级别
+不能导入 models 等需要 Django 初始化之后才能用的东西。
+"""
+import os
+import signal
+import traceback
+
+
+def init_process():
+    import django
+
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'PatchProject.settings')
+    django.setup()
+    # Ctrl+C 由主进程处理, 子进程把手头的任务做完
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def execute(task, payload):
+    """执行一个任务, 返回 (是否成功, 错误信息)
+
+    异常在子进程里转成字符串, 避免不能 pickle 的异常对象拖垮进程池。
+    """
+    from django.db import close_old_connections
+    from django.utils.module_loading import import_string
+
+    close_old_connections()
+    try:
+        import_string(task)(**payload)
+        return True, ''
+    except Exception:
+        return False, traceback.format_exc()
+    finally:
+        close_old_connections()
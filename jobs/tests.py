@@ -0,0 +1,98 @@
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from jobs import queue, runner
+from jobs.models import Job
+
+CALLS = []
+
+
+def record_call(**payload):
+    """测试用的任务"""
+    CALLS.append(payload)
+
+
+def broken_task():
+    raise RuntimeError('boom')
+
+
+@override_settings(JOBS_EAGER=False, JOBS_VISIBILITY_TIMEOUT=300, JOBS_RETRY_BASE_DELAY=10, JOBS_RETRY_MAX_DELAY=60)
+class QueueTests(TestCase):
+
+    def expire(self, job):
+        """模拟 worker 崩溃: 锁已经过期"""
+        Job.objects.filter(pk=job.pk).update(locked_until=timezone.now() - timedelta(seconds=1))
+
+    def test_claim_is_exclusive(self):
+        first = queue.enqueue('jobs.tests.record_call', n=1)
+        queue.enqueue('jobs.tests.record_call', n=2, delay=60)
+        [job] = queue.claim('worker-a', limit=5)
+        self.assertEqual(job.pk, first.pk)
+        self.assertEqual((job.status, job.attempts, job.worker), (Job.STATUS_RUNNING, 1, 'worker-a'))
+        # 已领取的任务和还没到期的任务都领不到
+        self.assertEqual(queue.claim('worker-b', limit=5), [])
+
+    def test_reclaimed_after_visibility_timeout(self):
+        queue.enqueue('jobs.tests.record_call')
+        [job] = queue.claim('worker-a')
+        self.expire(job)
+        [again] = queue.claim('worker-b')
+        self.assertEqual((again.pk, again.attempts, again.worker), (job.pk, 2, 'worker-b'))
+        # 原来的 worker 之后才完成, 不能覆盖新 worker 的状态
+        queue.complete(job)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.STATUS_RUNNING)
+        queue.complete(again)
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.STATUS_DONE)
+
+    def test_failure_backs_off(self):
+        queue.enqueue('jobs.tests.broken_task')
+        [job] = queue.claim('worker-a')
+        ok, error = runner.execute(job.task, job.payload)
+        self.assertFalse(ok)
+        before = timezone.now()
+        queue.fail(job, error)
+        job.refresh_from_db()
+        self.assertEqual(job.status, Job.STATUS_PENDING)
+        self.assertIn('RuntimeError: boom', job.last_error)
+        self.assertTrue(before + timedelta(seconds=7) < job.run_at < before + timedelta(seconds=13))
+        self.assertEqual(queue.claim('worker-a'), [])
+
+        for attempts, low, high in ((1, 8, 12), (3, 32, 48), (10, 48, 72)):
+            for _ in range(20):
+                self.assertTrue(low <= queue.retry_delay(attempts) <= high, attempts)
+
+    def test_max_attempts(self):
+        queue.enqueue('jobs.tests.broken_task', max_attempts=2)
+        [job] = queue.claim('worker-a')
+        queue.fail(job, 'first')
+        Job.objects.filter(pk=job.pk).update(run_at=timezone.now())
+        [job] = queue.claim('worker-a')
+        queue.fail(job, 'second')
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.last_error), (Job.STATUS_FAILED, 2, 'second'))
+        self.assertIsNotNone(job.finished_at)
+
+        # 最后一次尝试时 worker 崩溃: 锁过期后标记为失败, 不再领取
+        queue.enqueue('jobs.tests.record_call', max_attempts=1)
+        [job] = queue.claim('worker-a')
+        self.expire(job)
+        self.assertEqual(queue.claim('worker-b'), [])
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.STATUS_FAILED)
+
+    def test_release_does_not_count_an_attempt(self):
+        queue.enqueue('jobs.tests.record_call')
+        [job] = queue.claim('worker-a')
+        queue.release(job)
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts, job.locked_until), (Job.STATUS_PENDING, 0, None))
+
+    @override_settings(JOBS_EAGER=True)
+    def test_eager_runs_after_commit(self):
+        CALLS.clear()
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertIsNone(queue.enqueue('jobs.tests.record_call', n=1))
+            self.assertEqual(CALLS, [])
+        self.assertEqual(CALLS, [{'n': 1}])
+        self.assertFalse(Job.objects.exists())
@@ -0,0 +1,150 @@
+# marketplace/async_views.py
+"""读多写少页面的异步版本, ASGI 部署时使用 (settings.ASYNC_VIEWS = True)
+
+在 ASGI 下同步视图从开始到响应发送完都占着一个线程; 这里的视图在事件循环里运行,
+用 Django 的异步 ORM 查询, 互不依赖的查询同时进行: 商店页的一页商品和分面计数,
+详情页的商品、相关商品和收藏状态。
+
+异步 ORM 的调用都回到请求自己的同步线程里排队执行, 所以要和它同时进行的查询用
+concurrently() 放到线程池里, 用那个线程自己的数据库连接 (按 CONN_MAX_AGE 关闭)。
+读 session、上下文处理器和模板渲染仍是同步代码, 在请求线程里执行;
+depends_on() 只读写缓存, 直接调用。
+页面和 marketplace/views.py 的同步版本一样; WSGI (runserver) 下继续用同步版本,
+那里每个异步视图都要单独起一个事件循环, 反而更慢。
+"""
+import asyncio
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.decorators import login_required
+from django.db import close_old_connections
+from django.http import Http404
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
+
+from database.replicas import replica_reads
+from goods import querylog, search, similarity
+from goods.models import Goods, Favorite
+from marketplace import caching
+from marketplace.pagination import KeysetPaginator
+from marketplace.views import (
+    SHOP_ORDERINGS, SHOP_PAGE_PARAMS, SHOP_PAGE_SIZE,
+    _facet_table, _item_validators, _search_page, _shop_context, _shop_params, _shop_queryset,
+)
+
+
+async def concurrently(func, *args):
+    """在线程池里执行同步的查询函数, 可以和请求线程里的异步 ORM 查询同时进行"""
+    def run():
+        try:
+            return func(*args)
+        finally:
+            close_old_connections()
+    return await sync_to_async(run, thread_sensitive=False)()
+
+
+async def _nothing():
+    return []
+
+
+async def _user(request):
+    user = await request.auser()
+    # 模板和上下文处理器里的 request.user 不再查一次库
+    request.user = user
+    return user
+
+
+async def _render(request, template_name, context):
+    return await sync_to_async(render)(request, template_name, context)
+
+
+def condition(validators):
+    """异步视图的 @condition; validators(request, ...) 是协程, 返回 (ETag, Last-Modified)
+
+    Django 的 condition 在事件循环里直接调用 etag_func, 不能在里面查库。
+    """
+    def decorator(view):
+        @wraps(view)
+        async def wrapped(request, *args, **kwargs):
+            etag, last_modified = await validators(request, *args, **kwargs)
+            timestamp = int(last_modified.timestamp()) if last_modified else None
+            response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+            if response is None:
+                response = await view(request, *args, **kwargs)
+            if request.method in ('GET', 'HEAD'):
+                if timestamp and not response.has_header('Last-Modified'):
+                    response.headers['Last-Modified'] = http_date(timestamp)
+                if etag:
+                    response.headers.setdefault('ETag', etag)
+            return response
+        return wrapped
+    return decorator
+
+
+@replica_reads
+@querylog.logs_searches
+@caching.anonymous_page('shop', params=SHOP_PAGE_PARAMS)
+async def shop(request):
+    """商品列表页: 一页商品、分面计数和热门搜索同时查询"""
+    params = _shop_params(request)
+    if params['search'] and search.is_available():
+        # 全文搜索是原生 SQL, 没有异步版本
+        page = concurrently(_search_page, params['search'], params['major'], params['category'],
+                            params['after'], params['before'])
+    else:
+        paginator = KeysetPaginator(SHOP_ORDERINGS[params['sort']], per_page=SHOP_PAGE_SIZE)
+        page = paginator.apaginate(_shop_queryset(params), after=params['after'], before=params['before'])
+    popular = concurrently(querylog.popular) if not params['search'] else _nothing()
+    page, facet_table, popular = await asyncio.gather(page, concurrently(_facet_table, params['search']), popular)
+
+    caching.depends_on(request, caching.CATALOGUE, *(caching.item(goods.id) for goods in page.items))
+    return await _render(request, 'marketplace/shop.html', _shop_context(params, page, facet_table, popular))
+
+
+async def _item_etag(request, item_id):
+    await _user(request)
+    return await sync_to_async(_item_validators)(request, item_id)
+
+
+@replica_reads
+@caching.anonymous_page('item_detail')
+@condition(_item_etag)
+async def item_detail(request, item_id):
+    """商品详情页: 商品、相关商品和收藏状态同时查询"""
+    user = await _user(request)
+    try:
+        item, related_items, is_favorited = await asyncio.gather(
+            Goods.objects.prefetch_related('images', 'outcomes').aget(id=item_id),
+            concurrently(similarity.precomputed, item_id),
+            _is_favorited(user, item_id),
+        )
+    except Goods.DoesNotExist:
+        raise Http404('No Goods matches the given query.')
+    if not related_items:
+        related_items = await concurrently(similarity.latest_in_category, item)
+
+    caching.depends_on(request, caching.item(item.id), *(caching.item(related.id) for related in related_items))
+    context = {
+        'item': item,
+        'related_items': related_items,
+        'is_favorited': is_favorited,
+    }
+    return await _render(request, 'marketplace/item_detail.html', context)
+
+
+async def _is_favorited(user, item_id):
+    if not user.is_authenticated:
+        return False
+    return await Favorite.objects.filter(user=user, item_id=item_id).aexists()
+
+
+@login_required
+async def favorites_list(request):
+    """我的收藏列表"""
+    user = await _user(request)
+    favorites = [
+        favorite async for favorite in
+        Favorite.objects.filter(user=user).select_related('item').prefetch_related('item__images')
+    ]
+    return await _render(request, 'marketplace/favorites.html', {'favorites': favorites})
@@ -0,0 +1,189 @@
+# marketplace/caching.py
+"""匿名访问的整页缓存
+
+商店列表和商品详情的大部分流量来自未登录用户, 这些页面对所有人都一样。
+@anonymous_page 把渲染好的页面存进缓存, 缓存键由视图名和规范化后的查询参数组成
+(参数排序、去掉空值和无关参数)。
+
+失效是按依赖精确进行的: 视图渲染时用 depends_on() 声明页面用到了哪些商品
+(以及是否依赖整个目录, 例如列表和分面计数), 每个依赖在缓存里有一个版本号,
+商品或其图片变化时由 marketplace/signals.py 换成新的版本号。读取缓存时用一次
+get_many 比较版本号, 不需要查数据库。页面另有 PAGE_CACHE_TIMEOUT 的有效期,
+用来兜底没有声明的依赖 (例如后台任务更新的相关商品)。
+
+stale-while-revalidate: 页面超过 PAGE_CACHE_TIMEOUT 或依赖变化后, 只有抢到锁的
+那个请求重新渲染, 其它并发请求在 PAGE_CACHE_STALE 时间内先拿到旧页面,
+避免缓存失效瞬间大量请求同时打到数据库。
+
+视图的 @condition 放在 @anonymous_page 里面: 命中缓存时不用为 ETag 查库,
+页面和渲染时算出的 ETag / Last-Modified 一起缓存, 条件请求直接用它们回答 304。
+
+模板/代码改动导致页面结构变化时, 调整 settings.CACHES 的 VERSION 即可让所有键失效。
+只用到 get/set/add/get_many/set_many/delete, 本地内存和文件缓存后端都能用。
+"""
+import hashlib
+import time
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe
+
+# 整个目录 (新增/删除商品、分面计数) 的依赖
+CATALOGUE = 'catalogue'
+LOCK_TIMEOUT = 30   # 秒, 重新渲染的锁
+# 和页面一起缓存的响应头 (视图里的 @condition 算出来的)
+VALIDATORS = ('ETag', 'Last-Modified')
+
+
+def item(goods_id):
+    return f'item:{goods_id}'
+
+
+def _version_key(dependency):
+    return f'page-dep:{dependency}'
+
+
+def _token():
+    return time.time_ns()
+
+
+def invalidate(*dependencies):
+    """让依赖这些对象的页面失效 (换新版本号, 旧条目在下次读取时被判定为过期)"""
+    if dependencies:
+        token = _token()
+        cache.set_many({_version_key(dependency): token for dependency in dependencies}, None)
+
+
+def depends_on(request, *dependencies):
+    """在视图里声明当前页面的依赖, 查完数据后马上调用
+
+    版本号在这里就记下来: 如果渲染期间有写入, 存下的是旧版本号, 下次读取就会判定过期。
+    """
+    if not hasattr(request, '_page_versions'):
+        request._page_versions = {}
+    request._page_versions.update(_versions(set(dependencies) - request._page_versions.keys()))
+
+
+def _versions(dependencies):
+    """当前版本号; 还没有版本号的依赖补上一个 (add 不会覆盖并发写入的新版本)"""
+    keys = {_version_key(dependency): dependency for dependency in dependencies}
+    found = cache.get_many(keys)
+    for key in keys.keys() - found.keys():
+        cache.add(key, _token(), None)
+        found[key] = cache.get(key)
+    return {keys[key]: value for key, value in found.items()}
+
+
+def page_key(name, request, params, kwargs):
+    """视图名 + URL 参数 + 规范化的查询参数"""
+    query = sorted(
+        (param, value.strip()) for param in params
+        for value in request.GET.getlist(param)[:1] if value.strip()
+    )
+    raw = repr((sorted(kwargs.items()), query))
+    return f'page:{name}:{hashlib.md5(raw.encode()).hexdigest()}'
+
+
+def _cacheable(request):
+    if request.method not in ('GET', 'HEAD') or request.user.is_authenticated:
+        return False
+    # 页面里会显示一次性的提示消息, 不能缓存也不能用缓存顶替
+    return not len(messages.get_messages(request))
+
+
+def _is_fresh(entry, now):
+    if now - entry['created'] >= settings.PAGE_CACHE_TIMEOUT:
+        return False
+    return _versions(entry['versions']) == entry['versions']
+
+
+def _from_entry(request, entry, status):
+    """缓存的页面; 带着渲染时的 ETag / Last-Modified, 浏览器的条件请求直接在这里回答 304"""
+    response = HttpResponse(entry['content'], content_type=entry['content_type'])
+    for header, value in entry.get('validators', {}).items():
+        response[header] = value
+    response['X-Page-Cache'] = status
+    return get_conditional_response(
+        request, etag=response.get('ETag'),
+        last_modified=parse_http_date_safe(response.get('Last-Modified', '')), response=response,
+    )
+
+
+def _lookup(request, name, params, kwargs):
+    """(可以直接返回的缓存页面, 缓存键, 旧条目, 当前时间); 不能缓存的请求缓存键是 None"""
+    if not _cacheable(request):
+        return None, None, None, None
+    key = page_key(name, request, params, kwargs)
+    entry = cache.get(key)
+    now = time.time()
+    if entry is not None:
+        if _is_fresh(entry, now):
+            return _from_entry(request, entry, 'hit'), key, entry, now
+        # 已过期: 没抢到锁的请求先返回旧页面
+        if not cache.add(f'{key}:lock', 1, LOCK_TIMEOUT):
+            return _from_entry(request, entry, 'stale'), key, entry, now
+    return None, key, entry, now
+
+
+def _store(request, key, now, response):
+    versions = getattr(request, '_page_versions', None)
+    if response.status_code == 200 and not response.streaming and versions:
+        cache.set(key, {
+            'content': response.content,
+            'content_type': response['Content-Type'],
+            'validators': {header: response[header] for header in VALIDATORS if response.has_header(header)},
+            'created': now,
+            'versions': versions,
+        }, settings.PAGE_CACHE_TIMEOUT + settings.PAGE_CACHE_STALE)
+    response['X-Page-Cache'] = 'miss'
+
+
+def _release(key, entry):
+    if entry is not None:
+        cache.delete(f'{key}:lock')
+
+
+def anonymous_page(name, params=()):
+    """为未登录用户缓存整页; params 是参与缓存键的查询参数, 其它参数被忽略
+
+    也可以用在异步视图上 (marketplace/async_views.py)。
+    """
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapped_async(request, *args, **kwargs):
+                # 先异步取出用户, 之后同步代码里的 request.user 不再查库
+                request.user = await request.auser()
+                cached, key, entry, now = await sync_to_async(_lookup)(request, name, params, kwargs)
+                if cached is not None:
+                    return cached
+                if key is None:
+                    return await view(request, *args, **kwargs)
+                try:
+                    response = await view(request, *args, **kwargs)
+                    await sync_to_async(_store)(request, key, now, response)
+                    return response
+                finally:
+                    await sync_to_async(_release)(key, entry)
+            return wrapped_async
+
+        @wraps(view)
+        def wrapped(request, *args, **kwargs):
+            cached, key, entry, now = _lookup(request, name, params, kwargs)
+            if cached is not None:
+                return cached
+            if key is None:
+                return view(request, *args, **kwargs)
+            try:
+                response = view(request, *args, **kwargs)
+                _store(request, key, now, response)
+                return response
+            finally:
+                _release(key, entry)
+        return wrapped
+    return decorator
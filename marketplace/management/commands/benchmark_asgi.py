@@ -0,0 +1,227 @@
+# marketplace/management/commands/benchmark_asgi.py
+"""ASGI 下同步视图和异步视图 (settings.ASYNC_VIEWS) 的并发吞吐量对比
+
+在临时测试库里用 seed_marketplace 生成数据, 然后在进程内直接调用 Django 的 ASGI
+handler (不经过网络和服务器), 分别用同步和异步视图, 以不同的并发数请求各个页面,
+记录每秒请求数、p50/p95 延迟和同时存在的最多线程数:
+
+    python manage.py benchmark_asgi --items 10000 --concurrency 1,16,64 --requests 400
+
+页面用登录用户请求, 绕过匿名整页缓存, 测的是视图本身。SQLite 的测试库放在临时文件里
+(而不是内存), 各个线程的连接和线上一样各自读文件。不会碰正式数据库和 media 目录。
+"""
+import asyncio
+import importlib
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import clear_url_caches
+
+from goods.models import Goods, Favorite
+
+# (名称, 根据数据生成 URL 的函数)
+SCENARIOS = [
+    ('shop', lambda state: '/shop/'),
+    ('shop_filtered', lambda state: f"/shop/?major={state['major']}"),
+    ('item_detail', lambda state: f"/item/{state['rng'].choice(state['item_ids'])}/"),
+    ('favorites_list', lambda state: '/favorites/'),
+    ('api_goods_list', lambda state: '/api/goods/'),
+    ('api_goods_detail', lambda state: f"/api/goods/{state['rng'].choice(state['item_ids'])}/"),
+]
+
+URLCONFS = ('marketplace.urls', 'api.urls')
+
+
+def _reload_urls():
+    for name in (*URLCONFS, settings.ROOT_URLCONF):
+        importlib.reload(importlib.import_module(name))
+    clear_url_caches()
+
+
+@contextmanager
+def async_views(enabled):
+    """临时切换 settings.ASYNC_VIEWS; 视图是在导入 URLconf 时选定的, 所以前后都要重新加载"""
+    try:
+        with override_settings(ASYNC_VIEWS=enabled):
+            _reload_urls()
+            yield
+    finally:
+        _reload_urls()
+
+
+class Recorder:
+    """记录 send() 收到的响应"""
+
+    def __init__(self):
+        self.status = None
+        self.done = False
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif message['type'] == 'http.response.body' and not message.get('more_body'):
+            self.done = True
+
+
+async def request(application, url, cookie):
+    """不经过网络, 直接用 ASGI 协议请求一次, 返回状态码"""
+    path, _, query = url.partition('?')
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1',
+        'method': 'GET', 'scheme': 'http', 'path': path, 'raw_path': path.encode(),
+        'query_string': query.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver'), (b'cookie', cookie.encode())],
+        'client': ('127.0.0.1', 50000), 'server': ('testserver', 80),
+    }
+    received = False
+
+    async def receive():
+        nonlocal received
+        if not received:
+            received = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        # 客户端不断开: 和真实服务器一样一直等待
+        await asyncio.Event().wait()
+
+    recorder = Recorder()
+    await application(scope, receive, recorder.send)
+    if not recorder.done:
+        raise CommandError(f'{url}: response was not completed')
+    return recorder.status
+
+
+async def load(application, urls, cookie, concurrency):
+    """concurrency 个客户端依次发完 urls; 返回 (耗时秒, 每个请求的延迟毫秒, 最多线程数)"""
+    queue = list(reversed(urls))
+    latencies = []
+    peak_threads = threading.active_count()
+
+    async def client():
+        nonlocal peak_threads
+        while queue:
+            url = queue.pop()
+            started = time.perf_counter()
+            status = await request(application, url, cookie)
+            latencies.append((time.perf_counter() - started) * 1000)
+            peak_threads = max(peak_threads, threading.active_count())
+            if status != 200:
+                raise CommandError(f'{url}: {status}')
+
+    started = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return time.perf_counter() - started, latencies, peak_threads
+
+
+class Command(BaseCommand):
+    help = 'Compare throughput of sync and async views under concurrent ASGI load'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=10000)
+        parser.add_argument('--concurrency', default='1,16,64', help='Comma-separated client counts')
+        parser.add_argument('--requests', type=int, default=400, help='Requests per scenario and client count')
+        parser.add_argument('--scenarios', help='Comma-separated subset of: ' + ', '.join(n for n, _ in SCENARIOS))
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+
+    def handle(self, *args, **options):
+        try:
+            levels = sorted({int(level) for level in options['concurrency'].split(',')})
+        except ValueError:
+            raise CommandError('--concurrency must be a comma-separated list of integers.')
+        scenarios = SCENARIOS
+        if options['scenarios']:
+            wanted = set(options['scenarios'].split(','))
+            unknown = wanted - {name for name, _ in SCENARIOS}
+            if unknown:
+                raise CommandError(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+            scenarios = [scenario for scenario in SCENARIOS if scenario[0] in wanted]
+
+        test_settings = connection.settings_dict['TEST']
+        old_test_name = test_settings.get('NAME')
+        with tempfile.TemporaryDirectory() as tmp, override_settings(
+            DEBUG=False, MEDIA_ROOT=os.path.join(tmp, 'media'),
+            ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+        ):
+            if connection.vendor == 'sqlite':
+                test_settings['NAME'] = os.path.join(tmp, 'bench.sqlite3')
+            old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            try:
+                self._seed(options['items'], options['seed'])
+                results = self._run(scenarios, levels, options)
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                test_settings['NAME'] = old_test_name
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'items': options['items'], 'requests': options['requests'], 'results': results}, fh,
+                          indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+    def _seed(self, size, seed):
+        self.stdout.write(f'Seeding {size} items...')
+        call_command('seed_marketplace', goods=size, users=max(size // 50, 10), image_pool=4,
+                     seed=seed, prefix='asgi', stdout=StringIO())
+
+    def _state(self, seed):
+        rng = random.Random(seed)
+        ids = list(Goods.objects.values_list('id', flat=True))
+        fan = Favorite.objects.values('user').annotate(n=Count('id')).order_by('-n').first()
+        return {
+            'rng': rng,
+            'item_ids': rng.sample(ids, min(len(ids), 200)),
+            'major': Goods.objects.exclude(major='').values_list('major', flat=True).first(),
+            'user_id': fan['user'] if fan else Goods.objects.values_list('seller_id', flat=True).first(),
+        }
+
+    def _run(self, scenarios, levels, options):
+        from django.contrib.auth.models import User
+
+        state = self._state(options['seed'])
+        client = Client()
+        client.force_login(User.objects.get(pk=state['user_id']))
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        # 测试库连接在主线程里; 事件循环所在的线程和线程池各自打开自己的连接
+        connection.close()
+
+        self.stdout.write(f'{"scenario":<18}{"clients":>8}{"sync req/s":>12}{"async req/s":>13}'
+                          f'{"sync p95":>10}{"async p95":>11}{"threads":>13}')
+        results = {}
+        for name, url_for in scenarios:
+            results[name] = {}
+            for level in levels:
+                urls = [url_for(state) for _ in range(options['requests'])]
+                row = {}
+                for mode in ('sync', 'async'):
+                    with async_views(mode == 'async'):
+                        application = ASGIHandler()
+                        # 预热: 模板、URL 解析和各线程的数据库连接
+                        asyncio.run(load(application, urls[:level * 2], cookie, level))
+                        elapsed, latencies, threads = asyncio.run(load(application, urls, cookie, level))
+                    row[mode] = {
+                        'req_per_s': round(len(urls) / elapsed, 1),
+                        'p50_ms': round(statistics.median(latencies), 2),
+                        'p95_ms': round(sorted(latencies)[int(len(latencies) * 0.95) - 1], 2),
+                        'peak_threads': threads,
+                    }
+                results[name][str(level)] = row
+                self.stdout.write(
+                    f"{name:<18}{level:>8}{row['sync']['req_per_s']:>12.1f}{row['async']['req_per_s']:>13.1f}"
+                    f"{row['sync']['p95_ms']:>10.1f}{row['async']['p95_ms']:>11.1f}"
+                    f"{row['sync']['peak_threads']:>6} / {row['async']['peak_threads']:<4}"
+                )
+        return results
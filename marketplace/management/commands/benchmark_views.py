@@ -0,0 +1,237 @@
+# marketplace/management/commands/benchmark_views.py
+"""页面和 API 的端到端延迟基准测试
+
+在临时测试库里用 seed_marketplace 依次生成几种规模的数据, 用 Django test client
+请求各个热点页面, 记录 p50/p95/p99 延迟 (毫秒)、SQL 查询次数和峰值内存:
+
+    python manage.py benchmark_views --sizes 1000,10000 --output bench.json
+    python manage.py benchmark_views --baseline bench.json --threshold 0.2
+
+指定 --baseline 时和保存的结果对比, 有回退 (延迟/内存超过阈值, 或查询次数变多)
+时命令以非零状态退出。不会碰正式数据库和 media 目录。
+
+有匿名整页缓存的页面 (响应带 X-Page-Cache) 每次请求前先清空缓存, 测的是完整渲染;
+命中缓存的数字另记为 <场景>_cached。
+"""
+import json
+import platform
+import random
+import statistics
+import tempfile
+import time
+import tracemalloc
+from io import StringIO
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from goods.models import Goods, Favorite
+
+
+def _shop_filtered(state):
+    return f"/shop/?major={state['major']}"
+
+
+# (名称, 是否需要登录, 根据数据生成 URL 的函数)
+SCENARIOS = [
+    ('shop', False, lambda state: '/shop/'),
+    ('shop_filtered', False, _shop_filtered),
+    ('shop_search', False, lambda state: '/shop/?search=watercolor'),
+    ('item_detail', False, lambda state: f"/item/{state['rng'].choice(state['item_ids'])}/"),
+    ('message_seller', True, lambda state: f"/item/{state['rng'].choice(state['others_item_ids'])}/message/"),
+    ('favorites_list', True, lambda state: '/favorites/'),
+    ('inbox', True, lambda state: '/inbox/?box=buying'),
+    ('api_goods_list', False, lambda state: '/api/goods/'),
+    ('api_goods_fields', False, lambda state: '/api/goods/?fields=id,name,price'),
+]
+
+# 查询次数是确定的, 内存和延迟有抖动, 增长小于这些值时不算回退 (亚毫秒级的页面相对变化很大)
+MEMORY_NOISE_KIB = 64
+LATENCY_NOISE_MS = 1.0
+
+
+def _percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+def compare(results, baseline, threshold):
+    """和基准结果对比, 返回回退说明的列表 (空列表表示没有回退)"""
+    regressions = []
+    for size, scenarios in results.items():
+        for name, current in scenarios.items():
+            previous = baseline.get(size, {}).get(name)
+            if previous is None:
+                continue
+            label = f'{name} @ {size} items'
+            for metric in ('p50_ms', 'p95_ms'):
+                slower = current[metric] - previous[metric]
+                if slower > LATENCY_NOISE_MS and current[metric] > previous[metric] * (1 + threshold):
+                    regressions.append(f'{label}: {metric} {previous[metric]:.2f} -> {current[metric]:.2f}')
+            if current['queries'] > previous['queries']:
+                regressions.append(f"{label}: queries {previous['queries']} -> {current['queries']}")
+            grown = current['peak_kib'] - previous['peak_kib']
+            if grown > MEMORY_NOISE_KIB and current['peak_kib'] > previous['peak_kib'] * (1 + threshold):
+                regressions.append(f"{label}: peak memory {previous['peak_kib']} -> {current['peak_kib']} KiB")
+    return regressions
+
+
+class Command(BaseCommand):
+    help = 'Benchmark marketplace pages and API endpoints against seeded datasets'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000', help='Comma-separated item counts')
+        parser.add_argument('--repeat', type=int, default=30)
+        parser.add_argument('--warmup', type=int, default=3)
+        parser.add_argument('--seed', type=int, default=42)
+        parser.add_argument('--output', help='Write results as JSON to this file')
+        parser.add_argument('--baseline', help='Compare with a JSON file written by --output')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative slowdown before a result counts as a regression')
+
+    def handle(self, *args, **options):
+        try:
+            sizes = sorted({int(size) for size in options['sizes'].split(',')})
+        except ValueError:
+            raise CommandError('--sizes must be a comma-separated list of integers.')
+        baseline = None
+        if options['baseline']:
+            with open(options['baseline']) as fh:
+                baseline = json.load(fh)['results']
+
+        results = {}
+        old_name = connection.creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+        try:
+            # DEBUG=False 更接近线上; 生成的图片写到临时目录
+            with tempfile.TemporaryDirectory() as media_root, override_settings(
+                DEBUG=False, MEDIA_ROOT=media_root, ALLOWED_HOSTS=[*settings.ALLOWED_HOSTS, 'testserver'],
+            ):
+                for size in sizes:
+                    self._seed(size, options['seed'])
+                    results[str(size)] = self._run(size, options)
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({'meta': self._meta(options), 'results': results}, fh, indent=2)
+            self.stdout.write(f"Results written to {options['output']}")
+
+        if baseline is not None:
+            regressions = compare(results, baseline, options['threshold'])
+            if regressions:
+                raise CommandError('Performance regressions:\n  ' + '\n  '.join(regressions))
+            self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def _meta(self, options):
+        return {
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'database': connection.vendor,
+            'repeat': options['repeat'],
+            'seed': options['seed'],
+        }
+
+    def _seed(self, size, seed):
+        """在已有数据上补足到 size 个商品"""
+        missing = size - Goods.objects.count()
+        if missing <= 0:
+            return
+        self.stdout.write(f'Seeding {missing} items...')
+        call_command('seed_marketplace', goods=missing, users=max(missing // 50, 10), image_pool=4,
+                     seed=seed + size, prefix=f'bench{size}', stdout=StringIO())
+
+    def _state(self, seed):
+        rng = random.Random(seed)
+        ids = list(Goods.objects.values_list('id', flat=True))
+        fan = Favorite.objects.values('user').annotate(n=Count('id')).order_by('-n').first()
+        user_id = fan['user'] if fan else Goods.objects.values_list('seller_id', flat=True).first()
+        # 卖家打开自己商品的留言页会被重定向到收件箱, 只从别人的商品里选
+        others = list(Goods.objects.exclude(seller_id=user_id).values_list('id', flat=True))
+        return {
+            'rng': rng,
+            'item_ids': rng.sample(ids, min(len(ids), 200)),
+            'others_item_ids': rng.sample(others, min(len(others), 200)),
+            'major': Goods.objects.exclude(major='').values_list('major', flat=True).first(),
+            'user_id': user_id,
+        }
+
+    def _run(self, size, options):
+        from django.contrib.auth.models import User
+
+        state = self._state(options['seed'])
+        anonymous = Client()
+        member = Client()
+        member.force_login(User.objects.get(pk=state['user_id']))
+
+        self.stdout.write(f'\n{size} items')
+        self.stdout.write(f'{"scenario":<20}{"p50":>9}{"p95":>9}{"p99":>9}{"queries":>9}{"peak KiB":>10}')
+        results = {}
+        for name, login, url_for in SCENARIOS:
+            client = member if login else anonymous
+
+            def request(url=None):
+                response = client.get(url or url_for(state))
+                if response.status_code != 200:
+                    raise CommandError(f'{name}: {response.status_code} from {response.request["PATH_INFO"]}')
+                # 流式响应要读完才算结束
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                return response
+
+            # 带整页缓存的页面: 主结果每次先清空缓存 (测渲染本身);
+            # 命中缓存的数字单独记为 <name>_cached, 固定一个 URL 才能每次都命中
+            page_cached = 'X-Page-Cache' in request()
+            results[name] = self._measure(request, options, before=cache.clear if page_cached else None)
+            self._report(name, results[name])
+            if page_cached:
+                url = url_for(state)
+                results[f'{name}_cached'] = self._measure(lambda: request(url), options)
+                self._report(f'{name}_cached', results[f'{name}_cached'])
+        return results
+
+    def _measure(self, request, options, before=None):
+        """before 在每个请求之前调用, 不计入延迟、查询次数和内存"""
+        def prepare():
+            if before is not None:
+                before()
+
+        def timed():
+            prepare()
+            started = time.perf_counter()
+            request()
+            return (time.perf_counter() - started) * 1000
+
+        for _ in range(options['warmup']):
+            timed()
+        samples = [timed() for _ in range(options['repeat'])]
+        # captured_queries 是从 queries_log 里现取的, 下一个请求开始时日志会被清空, 所以要马上计数
+        prepare()
+        with CaptureQueriesContext(connection) as ctx:
+            request()
+        queries = len(ctx)
+        prepare()
+        tracemalloc.start()
+        request()
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            'p50_ms': round(statistics.median(samples), 3),
+            'p95_ms': round(_percentile(samples, 0.95), 3),
+            'p99_ms': round(_percentile(samples, 0.99), 3),
+            'queries': queries,
+            'peak_kib': peak // 1024,
+        }
+
+    def _report(self, name, row):
+        self.stdout.write(
+            f"{name:<20}{row['p50_ms']:>9.2f}{row['p95_ms']:>9.2f}{row['p99_ms']:>9.2f}"
+            f"{row['queries']:>9}{row['peak_kib']:>10}"
+        )
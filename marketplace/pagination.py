@@ -0,0 +1,153 @@
+# marketplace/pagination.py
+"""游标(keyset)分页
+
+按排序键 (例如 created_at, id) 翻页, 游标里只保存上一页边界行的键值。
+每一页都是 "WHERE 键 < 游标 ORDER BY 键 LIMIT n", 不用 OFFSET, 也不做 COUNT,
+所以第 1000 页和第 1 页的开销相同。
+"""
+import base64
+import datetime
+import json
+
+from django.db import models
+
+
+def encode_cursor(values):
+    """把一组键值编码成 URL 安全的游标字符串"""
+    raw = [v.isoformat() if isinstance(v, (datetime.date, datetime.datetime)) else v for v in values]
+    return base64.urlsafe_b64encode(json.dumps(raw, separators=(',', ':')).encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """解码游标, 格式不对时抛出 ValueError"""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode()))
+    except (TypeError, ValueError, UnicodeError) as exc:
+        raise ValueError('invalid cursor') from exc
+    if not isinstance(values, list):
+        raise ValueError('invalid cursor')
+    return values
+
+
+class KeysetPage:
+    """一页结果 + 前后页游标"""
+
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.items = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    @property
+    def has_next(self):
+        return self.next_cursor is not None
+
+    @property
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+
+def page_from_rows(rows, key, per_page, backwards=False, has_cursor=False):
+    """把多取了一行 (per_page + 1) 的结果整理成 KeysetPage
+
+    rows 必须已按"查询方向"排好序; backwards=True 表示是往前翻页的反向查询。
+    """
+    rows = list(rows)
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if backwards:
+        rows.reverse()
+
+    if not rows:
+        return KeysetPage([])
+
+    if backwards:
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, has_cursor
+
+    return KeysetPage(
+        rows,
+        next_cursor=encode_cursor(key(rows[-1])) if has_next else None,
+        previous_cursor=encode_cursor(key(rows[0])) if has_previous else None,
+    )
+
+
+class KeysetPaginator:
+    """对 QuerySet 做游标分页
+
+    ordering 和 order_by() 的写法一样, 例如 ('-created_at', '-id');
+    最后一个字段必须唯一 (通常是 id), 这样游标才能定位到唯一的行。
+    """
+
+    def __init__(self, ordering, per_page=24):
+        self.ordering = tuple(ordering)
+        self.per_page = per_page
+        self.fields = [name.lstrip('-') for name in self.ordering]
+
+    def key(self, obj):
+        return [getattr(obj, name) for name in self.fields]
+
+    def _parse(self, model, token):
+        values = decode_cursor(token)
+        if len(values) != len(self.fields):
+            raise ValueError('invalid cursor')
+        try:
+            return [model._meta.get_field(name).to_python(value)
+                    for name, value in zip(self.fields, values)]
+        except Exception as exc:  # ValidationError 等
+            raise ValueError('invalid cursor') from exc
+
+    def _after(self, ordering, values):
+        """构造 "排在游标之后" 的条件
+
+        (a, b) 在 (x, y) 之后  <=>  a <= x AND (a < x OR b 在 y 之后)
+        首列写成范围条件, 这样索引可以直接定位起点。
+        """
+        name = ordering[0]
+        field = name.lstrip('-')
+        descending = name.startswith('-')
+        value = values[0]
+        strict = models.Q(**{f'{field}__{"lt" if descending else "gt"}': value})
+        if len(ordering) == 1:
+            return strict
+        bound = models.Q(**{f'{field}__{"lte" if descending else "gte"}': value})
+        return bound & (strict | self._after(ordering[1:], values[1:]))
+
+    @staticmethod
+    def _reverse(ordering):
+        return tuple(name[1:] if name.startswith('-') else f'-{name}' for name in ordering)
+
+    def _query(self, queryset, after, before):
+        """(要取的行, page_from_rows 的参数)"""
+        model = queryset.model
+        try:
+            after_values = self._parse(model, after) if after else None
+            before_values = self._parse(model, before) if before else None
+        except ValueError:
+            after_values = before_values = None
+
+        if after_values is not None:
+            rows = queryset.filter(self._after(self.ordering, after_values)).order_by(*self.ordering)
+            return rows[:self.per_page + 1], {'has_cursor': True}
+        if before_values is not None:
+            reverse = self._reverse(self.ordering)
+            rows = queryset.filter(self._after(reverse, before_values)).order_by(*reverse)
+            return rows[:self.per_page + 1], {'backwards': True}
+        return queryset.order_by(*self.ordering)[:self.per_page + 1], {}
+
+    def paginate(self, queryset, after=None, before=None):
+        """after / before 是游标字符串, 无效游标按第一页处理"""
+        rows, options = self._query(queryset, after, before)
+        return page_from_rows(rows, self.key, self.per_page, **options)
+
+    async def apaginate(self, queryset, after=None, before=None):
+        """paginate() 的异步版本"""
+        rows, options = self._query(queryset, after, before)
+        return page_from_rows([row async for row in rows], self.key, self.per_page, **options)
@@ -0,0 +1,296 @@
+# marketplace/realtime.py
+"""对话消息的实时推送 (Server-Sent Events, 不支持时退回长轮询)
+
+在 ASGI 服务器下运行 (不需要 Redis 之类的消息代理):
+
+    uvicorn PatchProject.asgi:application
+
+每个连接只是一个挂起的协程, 在 Hub 里登记一个 asyncio.Event; 空闲连接不占线程也不查库。
+新消息提交后 (marketplace/signals.py) 调用 hub.notify(对话 id), 唤醒等待这个对话的连接,
+各连接再按 id 查出自己还没收到的消息。唤醒只是通知, 消息本身总是从数据库读, 所以断线重连
+(EventSource 自动带上 Last-Event-ID) 不会丢消息; 每隔 HEARTBEAT 秒没有唤醒也会查一次,
+兜底其它进程写入的消息 (Hub 只在进程内广播)。notify 可以从任意线程调用。
+
+Django 的 ASGI handler 给每个请求一个专用线程执行同步代码 (中间件、ORM), 直到响应发送完才释放,
+长连接会一直占着它。所以 PatchProject/asgi.py 用 RealtimeRouter 在 Django 之前接管推送的两个 URL:
+从 session cookie 认证, 查库都在 asgiref 共用的一个线程里执行。runserver (WSGI) 下同样的 URL
+由下面的 Django 视图处理, 功能一样, 只是每个连接占一个线程。
+"""
+import asyncio
+import json
+import re
+import threading
+from collections import defaultdict
+from importlib import import_module
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user
+from django.contrib.auth.decorators import login_required
+from django.http import Http404, HttpRequest, JsonResponse, QueryDict, StreamingHttpResponse
+from django.http.cookie import parse_cookie
+
+from goods import conversations
+
+# 秒: 没有新消息时多久发一次心跳 (同时查一次库)
+HEARTBEAT = 15
+# 秒: 一条 SSE 连接最长保持多久, 之后由浏览器按 Last-Event-ID 重连
+STREAM_MAX_AGE = 300
+# 秒: 长轮询最多等待多久
+POLL_TIMEOUT = 25
+# 每次最多推送的消息数
+BATCH_SIZE = 100
+# 毫秒: 告诉 EventSource 断线后多久重连
+RETRY_MS = 3000
+
+# 和 marketplace/urls.py 里的 conversation_stream / conversation_poll 一致
+ROUTE = re.compile(r'^/inbox/(?P<conversation_id>\d+)/(?P<kind>stream|poll)/$')
+
+
+class Waiter:
+    """一个连接在 Hub 里的登记, 绑定到创建它的事件循环"""
+
+    __slots__ = ('loop', 'event')
+
+    def __init__(self):
+        self.loop = asyncio.get_running_loop()
+        self.event = asyncio.Event()
+
+    def wake(self):
+        try:
+            self.loop.call_soon_threadsafe(self.event.set)
+        except RuntimeError:
+            # 事件循环已经关闭 (连接刚断开)
+            pass
+
+    async def wait(self, timeout):
+        """等到被唤醒 (返回 True) 或超时 (返回 False)"""
+        try:
+            await asyncio.wait_for(self.event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            self.event.clear()
+
+
+class Hub:
+    """进程内的订阅表: key -> 等待中的连接"""
+
+    def __init__(self):
+        self._waiters = defaultdict(set)
+        self._lock = threading.Lock()
+
+    def subscribe(self, key):
+        waiter = Waiter()
+        with self._lock:
+            self._waiters[key].add(waiter)
+        return waiter
+
+    def unsubscribe(self, key, waiter):
+        with self._lock:
+            waiters = self._waiters.get(key)
+            if waiters is not None:
+                waiters.discard(waiter)
+                if not waiters:
+                    del self._waiters[key]
+
+    def notify(self, key):
+        with self._lock:
+            waiters = list(self._waiters.get(key, ()))
+        for waiter in waiters:
+            waiter.wake()
+
+    def connections(self, key=None):
+        with self._lock:
+            if key is not None:
+                return len(self._waiters.get(key, ()))
+            return sum(len(waiters) for waiters in self._waiters.values())
+
+
+hub = Hub()
+
+
+def _payload(message, seller_id):
+    return {
+        'id': message.id,
+        'sender': message.sender.username,
+        'from_seller': message.sender_id == seller_id,
+        'content': message.content,
+        'created_at': message.created_at.isoformat(),
+    }
+
+
+@sync_to_async
+def _load_conversation(user, conversation_id):
+    """只有对话双方能订阅; 不是参与者时返回 None"""
+    if not user.is_authenticated:
+        return None
+    return conversations.for_user(user).filter(id=conversation_id).first()
+
+
+@sync_to_async
+def _messages_after(conversation, user, after_id):
+    """after_id 之后的消息; 其中有对方发来的就顺便标记为已读 (页面开着就算读过了)"""
+    batch = list(
+        conversations.thread(conversation).filter(id__gt=after_id).order_by('id')[:BATCH_SIZE]
+    )
+    if any(message.sender_id != user.pk for message in batch):
+        field = conversation.unread_field(user)
+        conversation.refresh_from_db(fields=[field])
+        conversations.mark_read(conversation, user)
+    return [_payload(message, conversation.seller_id) for message in batch]
+
+
+def _after_id(headers, query):
+    raw = headers.get('last-event-id') or query.get('after') or 0
+    try:
+        return max(int(raw), 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _event(payload):
+    return f"id: {payload['id']}\nevent: message\ndata: {json.dumps(payload)}\n\n"
+
+
+async def stream_events(conversation, user, after_id):
+    """SSE 事件: 先补发 after_id 之后的消息, 然后推送新消息, 空闲时发心跳"""
+    waiter = hub.subscribe(conversation.id)
+    try:
+        yield f'retry: {RETRY_MS}\n\n'
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + STREAM_MAX_AGE
+        while True:
+            batch = await _messages_after(conversation, user, after_id)
+            for payload in batch:
+                yield _event(payload)
+            if batch:
+                after_id = batch[-1]['id']
+                if len(batch) == BATCH_SIZE:
+                    continue
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return
+            if not await waiter.wait(min(HEARTBEAT, remaining)):
+                # 注释行, 让代理和浏览器知道连接还活着
+                yield ': ping\n\n'
+    finally:
+        hub.unsubscribe(conversation.id, waiter)
+
+
+async def poll_messages(conversation, user, after_id):
+    """长轮询: 有 after_id 之后的消息就马上返回, 否则最多等 POLL_TIMEOUT 秒"""
+    waiter = hub.subscribe(conversation.id)
+    try:
+        batch = await _messages_after(conversation, user, after_id)
+        if not batch and await waiter.wait(POLL_TIMEOUT):
+            batch = await _messages_after(conversation, user, after_id)
+        return batch
+    finally:
+        hub.unsubscribe(conversation.id, waiter)
+
+
+STREAM_HEADERS = {
+    'Content-Type': 'text/event-stream',
+    'Cache-Control': 'no-cache',
+    # nginx 不要缓冲这个响应
+    'X-Accel-Buffering': 'no',
+}
+
+
+# Django 视图 (runserver / WSGI, 以及测试)
+
+async def _conversation_or_404(request, conversation_id):
+    conversation = await _load_conversation(await request.auser(), conversation_id)
+    if conversation is None:
+        raise Http404('No conversation matches the given query.')
+    return conversation
+
+
+@login_required
+async def conversation_stream(request, conversation_id):
+    conversation = await _conversation_or_404(request, conversation_id)
+    events = stream_events(conversation, await request.auser(), _after_id(request.headers, request.GET))
+    return StreamingHttpResponse(events, headers=STREAM_HEADERS)
+
+
+@login_required
+async def conversation_poll(request, conversation_id):
+    conversation = await _conversation_or_404(request, conversation_id)
+    batch = await poll_messages(conversation, await request.auser(), _after_id(request.headers, request.GET))
+    return JsonResponse({'messages': batch}, headers={'Cache-Control': 'no-cache'})
+
+
+# ASGI 路由 (见 PatchProject/asgi.py)
+
+@sync_to_async
+def _session_user(cookies):
+    """按 session cookie 取出登录用户, 和 AuthenticationMiddleware 的结果一致"""
+    request = HttpRequest()
+    engine = import_module(settings.SESSION_ENGINE)
+    request.session = engine.SessionStore(cookies.get(settings.SESSION_COOKIE_NAME))
+    return get_user(request)
+
+
+class RealtimeRouter:
+    """在 Django 之前处理推送的长连接, 其它请求原样交给 Django"""
+
+    def __init__(self, application):
+        self.application = application
+
+    async def __call__(self, scope, receive, send):
+        match = ROUTE.match(scope.get('path', '')) if scope['type'] == 'http' else None
+        if match is None or scope['method'] != 'GET':
+            return await self.application(scope, receive, send)
+
+        headers = {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope['headers']}
+        user = await _session_user(parse_cookie(headers.get('cookie', '')))
+        conversation = await _load_conversation(user, int(match['conversation_id']))
+        if conversation is None:
+            # 未登录 403; 登录了但不是对话双方时 404, 不透露对话是否存在
+            status, body = (404, b'Not found') if user.is_authenticated else (403, b'Forbidden')
+            return await self._send(send, status, {'Content-Type': 'text/plain'}, body)
+
+        after_id = _after_id(headers, QueryDict(scope.get('query_string', b'').decode('latin-1')))
+        if match['kind'] == 'poll':
+            batch = await self._until_disconnect(receive, poll_messages(conversation, user, after_id))
+            if batch is not None:
+                await self._send(send, 200, {'Content-Type': 'application/json', 'Cache-Control': 'no-cache'},
+                                 json.dumps({'messages': batch}).encode())
+            return
+        await self._until_disconnect(receive, self._stream(send, stream_events(conversation, user, after_id)))
+
+    @staticmethod
+    async def _start(send, status, headers):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()],
+        })
+
+    async def _send(self, send, status, headers, body):
+        await self._start(send, status, headers)
+        await send({'type': 'http.response.body', 'body': body})
+
+    async def _stream(self, send, events):
+        await self._start(send, 200, STREAM_HEADERS)
+        async for chunk in events:
+            await send({'type': 'http.response.body', 'body': chunk.encode(), 'more_body': True})
+        await send({'type': 'http.response.body', 'body': b''})
+
+    @staticmethod
+    async def _until_disconnect(receive, coroutine):
+        """运行 coroutine, 客户端断开时取消它; 返回它的结果 (断开时为 None)"""
+        async def disconnected():
+            while (await receive())['type'] != 'http.disconnect':
+                pass
+
+        task = asyncio.ensure_future(coroutine)
+        watcher = asyncio.ensure_future(disconnected())
+        try:
+            await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+        finally:
+            for pending in (task, watcher):
+                pending.cancel()
+        return task.result() if task.done() and not task.cancelled() else None
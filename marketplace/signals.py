@@ -0,0 +1,47 @@
+# marketplace/signals.py
+"""商品变化时让匿名页面缓存失效 (见 marketplace/caching.py); 新消息提交后通知实时推送 (realtime.py)"""
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from goods.models import Goods, Message
+from goods.signals import goods_bulk_saved, goods_touched
+from marketplace import caching, realtime
+from marketplace.views import SHOP_ORDERINGS
+
+# 商店列表排序用到的字段
+SHOP_ORDER_FIELDS = {field.lstrip('-') for ordering in SHOP_ORDERINGS.values() for field in ordering}
+
+
+def _invalidate_on_commit(*dependencies):
+    # 提交之后再换版本号, 否则并发请求可能在提交前把旧数据重新写进缓存
+    transaction.on_commit(lambda: caching.invalidate(*dependencies))
+
+
+@receiver(post_save, sender=Goods)
+@receiver(post_delete, sender=Goods)
+def invalidate_goods_pages(sender, instance, raw=False, **kwargs):
+    if not raw:
+        _invalidate_on_commit(caching.CATALOGUE, caching.item(instance.pk))
+
+
+@receiver(goods_bulk_saved, sender=Goods)
+def invalidate_bulk_saved_pages(sender, instances, **kwargs):
+    _invalidate_on_commit(caching.CATALOGUE, *(caching.item(instance.pk) for instance in instances))
+
+
+@receiver(goods_touched, sender=Goods)
+def invalidate_touched_pages(sender, goods_id, fields=(), **kwargs):
+    # GoodsImage / OutcomeImage 的保存和删除、缩略图生成都会 touch 所属商品;
+    # 顺带改了商店列表的排序字段 (收藏数) 时, 列表页的顺序也变了
+    if SHOP_ORDER_FIELDS.intersection(fields):
+        _invalidate_on_commit(caching.CATALOGUE, caching.item(goods_id))
+    else:
+        _invalidate_on_commit(caching.item(goods_id))
+
+
+@receiver(post_save, sender=Message)
+def notify_message_listeners(sender, instance, created=False, raw=False, **kwargs):
+    if created and not raw and instance.conversation_id:
+        conversation_id = instance.conversation_id
+        transaction.on_commit(lambda: realtime.hub.notify(conversation_id))
@@ -1,3 +1,514 @@
-from django.test import TestCase
+import asyncio
+import base64
+import json
+import re
+import threading
+from datetime import timedelta
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import F
+from django.test import RequestFactory, SimpleTestCase, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from goods import conversations
+from goods.models import Goods, GoodsImage, OutcomeImage, Conversation, Favorite, Message, SearchQuery
+from marketplace import caching, realtime
+from marketplace.management.commands.benchmark_asgi import async_views
+from marketplace.management.commands.benchmark_views import compare
+from marketplace.pagination import KeysetPaginator, decode_cursor, encode_cursor
+from marketplace.views import SHOP_PAGE_SIZE
+
+
+class QueryCountTests(TestCase):
+    """页面查询次数不能随商品数量增长 (N+1 检查)"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seller', password='pass12345')
+
+    def make_items(self, count):
+        items = []
+        for _ in range(count):
+            item = Goods.objects.create(
+                name='Watercolor Set', price=10, seller=self.user,
+                major='design', category='paints',
+            )
+            # 只写路径, 不需要真实文件
+            GoodsImage.objects.create(goods=item, image='goods_images/a.jpg', order=0)
+            GoodsImage.objects.create(goods=item, image='goods_images/b.jpg', order=1)
+            OutcomeImage.objects.create(goods=item, image='outcome_images/a.jpg', order=0)
+            Favorite.objects.create(user=self.user, item=item)
+            items.append(item)
+        return items
+
+    def count_queries(self, url):
+        # 每次都从空缓存开始, 两次测量才可比
+        cache.clear()
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(ctx)
+
+    def assertConstantQueries(self, url_func):
+        """分别在 2 个和 6 个商品下渲染页面, 查询次数必须相同"""
+        self.make_items(2)
+        small = self.count_queries(url_func())
+        self.make_items(4)
+        large = self.count_queries(url_func())
+        self.assertEqual(small, large, f'{url_func()} issues more queries as items grow')
+
+    def test_shop(self):
+        self.assertConstantQueries(lambda: reverse('marketplace:shop'))
+
+    def test_my_account(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries(lambda: reverse('marketplace:my_account'))
+
+    def test_favorites(self):
+        self.client.force_login(self.user)
+        self.assertConstantQueries(lambda: reverse('marketplace:favorites'))
+
+    def test_item_detail(self):
+        first = self.make_items(2)[0]
+        url = reverse('marketplace:item_detail', args=[first.id])
+        small = self.count_queries(url)
+        # 相关商品和图片增多后查询次数不变
+        self.make_items(3)
+        GoodsImage.objects.create(goods=first, image='goods_images/c.jpg', order=2)
+        OutcomeImage.objects.create(goods=first, image='outcome_images/b.jpg', order=1)
+        self.assertEqual(small, self.count_queries(url))
+
+
+class BenchmarkCompareTests(SimpleTestCase):
+    """benchmark_views 的基准对比"""
+
+    def result(self, p50=10.0, p95=12.0, queries=3, peak=500):
+        return {'1000': {'shop': {'p50_ms': p50, 'p95_ms': p95, 'p99_ms': p95, 'queries': queries, 'peak_kib': peak}}}
+
+    def test_within_threshold(self):
+        self.assertEqual(compare(self.result(p50=11.5, p95=14.0, peak=550), self.result(), 0.2), [])
+
+    def test_regressions(self):
+        regressions = compare(self.result(p95=20.0, queries=4, peak=2000), self.result(), 0.2)
+        self.assertEqual(len(regressions), 3)
+        self.assertIn('queries 3 -> 4', regressions[1])
+
+    def test_sub_millisecond_noise_is_ignored(self):
+        self.assertEqual(compare(self.result(p50=0.66, p95=0.9), self.result(p50=0.46, p95=0.5), 0.2), [])
+        self.assertEqual(len(compare(self.result(p50=2.0, p95=2.5), self.result(p50=0.46, p95=0.5), 0.2)), 2)
+
+    def test_new_scenarios_are_ignored(self):
+        self.assertEqual(compare(self.result(), {}, 0.2), [])
+
+
+class PageCacheTests(TestCase):
+    """匿名整页缓存的命中和失效"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('seller', password='pass12345')
+
+    def setUp(self):
+        cache.clear()
+        self.item = Goods.objects.create(name='Gouache', price=8, seller=self.user, major='design', category='paints')
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_shop_hit_skips_database(self):
+        url = reverse('marketplace:shop') + '?major=design'
+        self.assertEqual(self.get(url)['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            response = self.get(url + '&utm_source=mail')
+        self.assertEqual(response['X-Page-Cache'], 'hit')
+        self.assertContains(response, 'Gouache')
+
+    def test_goods_change_invalidates(self):
+        url = reverse('marketplace:shop')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Goods.objects.create(name='Palette', price=3, seller=self.user)
+        response = self.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'Palette')
+
+    def test_image_change_invalidates_item_page(self):
+        url = reverse('marketplace:item_detail', args=[self.item.id])
+        self.get(url)
+        self.assertEqual(self.get(url)['X-Page-Cache'], 'hit')
+        with self.captureOnCommitCallbacks(execute=True):
+            GoodsImage.objects.create(goods=self.item, image='goods_images/new.jpg')
+        response = self.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertContains(response, 'goods_images/new.jpg')
+
+    def test_favorite_count_change_invalidates_popular_shop(self):
+        Goods.objects.bulk_create(Goods(name=f'Brush {i}', price=3, seller=self.user) for i in range(SHOP_PAGE_SIZE))
+        url = reverse('marketplace:shop') + '?sort=popular'
+        # self.item 的 id 最小, 不在第一页上
+        self.assertNotIn(self.item, self.get(url).context['items'])
+        self.assertEqual(self.get(url)['X-Page-Cache'], 'hit')
+        with self.captureOnCommitCallbacks(execute=True):
+            Goods.touch(self.item.id, favorite_count=F('favorite_count') + 1)
+        response = self.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        self.assertEqual(response.context['items'][0], self.item)
+
+    def test_stale_page_served_while_another_request_revalidates(self):
+        url = reverse('marketplace:shop')
+        self.get(url)
+        with self.captureOnCommitCallbacks(execute=True):
+            Goods.objects.filter(pk=self.item.pk).get().save()
+        # 模拟另一个请求正在重新渲染
+        key = caching.page_key('shop', RequestFactory().get(url), (), {})
+        cache.add(f'{key}:lock', 1)
+        self.assertEqual(self.get(url)['X-Page-Cache'], 'stale')
+
+    def test_logged_in_users_bypass_cache(self):
+        self.client.force_login(self.user)
+        self.assertFalse(self.get(reverse('marketplace:shop')).has_header('X-Page-Cache'))
+
+    def test_hit_answers_conditional_requests_without_queries(self):
+        url = reverse('marketplace:item_detail', args=[self.item.id])
+        response = self.get(url)
+        self.assertEqual(response['X-Page-Cache'], 'miss')
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url, headers={'if-none-match': response['ETag']}).status_code, 304)
+            self.assertEqual(self.get(url)['ETag'], response['ETag'])
+            modified = self.client.get(url, headers={'if-modified-since': response['Last-Modified']})
+            self.assertEqual(modified.status_code, 304)
+
+    def test_related_item_change_changes_etag(self):
+        related = Goods.objects.create(name='Palette', price=3, seller=self.user, major='design', category='paints')
+        url = reverse('marketplace:item_detail', args=[self.item.id])
+        etag = self.get(url)['ETag']
+        related.name = 'Palette knife'
+        with self.captureOnCommitCallbacks(execute=True):
+            related.save()
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertContains(response, 'Palette knife')
+
+
+class AsyncViewTests(TransactionTestCase):
+    """ASGI 用的异步视图和同步视图输出一样
+
+    异步视图的部分查询在线程池里用别的数据库连接执行, 看不到 TestCase 未提交的数据。
+    """
+
+    # 每次渲染的 CSRF 令牌都不同 (表单和可浏览 API 的脚本里)
+    CSRF_TOKEN = re.compile(r'(name="csrfmiddlewaretoken" value=|"csrfToken": )"[^"]*"')
+
+    def setUp(self):
+        self.user = User.objects.create_user('seller', password='pass12345')
+        self.item = Goods.objects.create(name='Gouache', price=8, seller=self.user, major='design', category='paints')
+        self.other = Goods.objects.create(name='Gouache Set', price=12, seller=self.user, major='design',
+                                          category='paints')
+        GoodsImage.objects.create(goods=self.item, image='goods_images/a.jpg', order=0)
+        Favorite.objects.create(user=self.user, item=self.other)
+        SearchQuery.objects.create(query='gouache', count=3, last_searched_at=timezone.now())
+
+    def assertSameResponse(self, url, **headers):
+        responses = []
+        for enabled in (False, True):
+            cache.clear()
+            with async_views(enabled):
+                responses.append(self.client.get(url, headers=headers))
+        sync, asynchronous = responses
+        self.assertEqual(sync.status_code, asynchronous.status_code, url)
+        for header in ('Content-Type', 'ETag', 'Last-Modified', 'Location'):
+            self.assertEqual(sync.get(header), asynchronous.get(header), f'{url}: {header}')
+        self.assertEqual(self.body(sync), self.body(asynchronous), url)
+        return asynchronous
+
+    def body(self, response):
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        return self.CSRF_TOKEN.sub('', content.decode())
+
+    def test_pages_match_sync_views(self):
+        shop = reverse('marketplace:shop')
+        for url in (shop, f'{shop}?major=design', f'{shop}?sort=popular', f'{shop}?search=set',
+                    reverse('marketplace:item_detail', args=[self.item.id]),
+                    reverse('marketplace:item_detail', args=[0]), reverse('marketplace:favorites')):
+            self.assertSameResponse(url)
+        self.client.force_login(self.user)
+        for url in (reverse('marketplace:favorites'), reverse('marketplace:item_detail', args=[self.other.id])):
+            self.assertSameResponse(url)
+
+    def test_api_matches_drf_views(self):
+        for url in ('/api/goods/', '/api/goods/?page_size=1', '/api/goods/?fields=id,name', '/api/goods/?fields=x',
+                    '/api/goods/?format=ndjson', f'/api/goods/{self.item.id}/', '/api/goods/0/'):
+            self.assertSameResponse(url)
+        self.assertSameResponse(f'/api/goods/{self.item.id}/', accept='text/html')
+        # 凭据错误时 DRF 拒绝请求, 异步视图把带 Authorization 头的请求交给 DRF
+        self.assertEqual(self.assertSameResponse('/api/goods/', authorization='Basic Zm9vOmJhcg==').status_code, 403)
+
+    def test_conditional_requests(self):
+        url = reverse('marketplace:item_detail', args=[self.item.id])
+        with async_views(True):
+            etag = self.client.get(url)['ETag']
+            self.assertEqual(self.client.get(url, headers={'if-none-match': etag}).status_code, 304)
+            etag = self.client.get('/api/goods/')['ETag']
+            self.assertEqual(self.client.get('/api/goods/', headers={'if-none-match': etag}).status_code, 304)
+
+
+class FavoriteCountTests(TestCase):
+    """收藏计数和 "最多收藏" 排序"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user('buyer', password='pass12345')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.item = Goods.objects.create(name='Gouache', price=8)
+
+    def toggle(self):
+        self.client.post(reverse('marketplace:toggle_favorite', args=[self.item.id]))
+        self.item.refresh_from_db()
+        return self.item.favorite_count
+
+    def test_toggle_updates_count_and_item_page(self):
+        updated_at = self.item.updated_at
+        self.assertEqual(self.toggle(), 1)
+        # 计数显示在详情页上, 所以也算一次修改 (ETag 和页面缓存跟着变)
+        self.assertGreater(self.item.updated_at, updated_at)
+        self.assertEqual(self.toggle(), 0)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_shop_most_favorited(self):
+        popular = self.item
+        Goods.objects.create(name='Palette', price=3)
+        self.toggle()
+        response = self.client.get(reverse('marketplace:shop') + '?sort=popular')
+        self.assertEqual(response.context['items'][0], popular)
+        self.assertEqual(response.context['sort'], 'popular')
+        # 不认识的排序方式按默认 (最新) 处理
+        response = self.client.get(reverse('marketplace:shop') + '?sort=price')
+        self.assertEqual(response.context['items'][0].name, 'Palette')
+
+    def test_reconcile_command(self):
+        Favorite.objects.create(user=self.user, item=self.item)
+        Goods.objects.create(name='Easel', price=30)
+        Goods.objects.filter(name='Easel').update(favorite_count=5)
+        url = reverse('marketplace:item_detail', args=[self.item.id])
+        etag = self.client.get(url)['ETag']
+        out = StringIO()
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_favorite_counts', stdout=out)
+        # 详情页显示收藏数, 修正后 ETag 要变, 旧的 ETag 不能再得到 304
+        response = self.client.get(url, headers={'if-none-match': etag})
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertIn('Fixed 2 drifted counts', out.getvalue())
+        self.assertEqual(
+            dict(Goods.objects.values_list('name', 'favorite_count')), {'Gouache': 1, 'Easel': 0},
+        )
+
+
+class ConversationTests(TestCase):
+    """对话、收件箱和未读计数"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass12345')
+        cls.buyer = User.objects.create_user('buyer', password='pass12345')
+        cls.item = Goods.objects.create(name='Gouache', price=8, seller=cls.seller)
+
+    def send(self, user, url, content):
+        self.client.force_login(user)
+        self.client.post(url, {'content': content})
+
+    def test_thread_counters_and_mark_read(self):
+        self.send(self.buyer, reverse('marketplace:message_seller', args=[self.item.id]), 'Is this still available?')
+        self.send(self.buyer, reverse('marketplace:message_seller', args=[self.item.id]), 'I can pay with Venmo.')
+        conversation = Conversation.objects.get()
+        self.assertEqual((conversation.seller_id, conversation.message_count, conversation.seller_unread), (self.seller.id, 2, 2))
+        self.assertEqual(conversation.last_message_preview, 'I can pay with Venmo.')
+
+        # 卖家打开对话: 买家的消息变为已读, 回复算作买家的未读
+        self.send(self.seller, reverse('marketplace:conversation', args=[conversation.id]), 'Yes!')
+        response = self.client.get(reverse('marketplace:conversation', args=[conversation.id]))
+        self.assertEqual([msg.content for msg in response.context['item_messages']],
+                         ['Is this still available?', 'I can pay with Venmo.', 'Yes!'])
+        conversation.refresh_from_db()
+        self.assertEqual((conversation.seller_unread, conversation.buyer_unread), (0, 1))
+        self.assertFalse(Message.objects.filter(sender=self.buyer, is_read=False).exists())
+
+    def test_inbox_reads_only_conversations(self):
+        other = User.objects.create_user('other', password='pass12345')
+        for buyer in (self.buyer, other):
+            self.send(buyer, reverse('marketplace:message_seller', args=[self.item.id]), f'Hi from {buyer}')
+        self.client.force_login(self.seller)
+        with CaptureQueriesContext(connection) as ctx:
+            response = self.client.get(reverse('marketplace:inbox'))
+        self.assertFalse([query for query in ctx.captured_queries if 'goods_message' in query['sql']])
+        self.assertEqual([c.buyer for c in response.context['conversations']], [other, self.buyer])
+        self.assertEqual(response.context['unread_counts'], {'selling': 2, 'buying': 0})
+
+        self.client.post(reverse('marketplace:inbox_mark_read'), {'box': 'selling'})
+        self.assertFalse(Conversation.objects.filter(seller_unread__gt=0).exists())
+        self.assertFalse(Message.objects.filter(is_read=False).exists())
+
+    def test_strangers_cannot_open_a_conversation(self):
+        self.send(self.buyer, reverse('marketplace:message_seller', args=[self.item.id]), 'Hello')
+        self.client.force_login(User.objects.create_user('stranger', password='pass12345'))
+        response = self.client.get(reverse('marketplace:conversation', args=[Conversation.objects.get().id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class RealtimeTests(TestCase):
+    """消息推送: 进程内广播和 SSE / 长轮询接口"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.seller = User.objects.create_user('seller', password='pass12345')
+        cls.buyer = User.objects.create_user('buyer', password='pass12345')
+        item = Goods.objects.create(name='Gouache', price=8, seller=cls.seller)
+        cls.conversation = conversations.start(item, cls.buyer)
+        cls.message = conversations.send(cls.conversation, cls.buyer, 'Is this still available?')
+
+    async def test_hub_wakes_waiters_from_other_threads(self):
+        waiter = realtime.hub.subscribe('test')
+        idle = realtime.hub.subscribe('other')
+        try:
+            threading.Timer(0.05, realtime.hub.notify, args=['test']).start()
+            self.assertTrue(await waiter.wait(5))
+            self.assertFalse(await idle.wait(0.05))
+        finally:
+            realtime.hub.unsubscribe('test', waiter)
+            realtime.hub.unsubscribe('other', idle)
+        self.assertEqual(realtime.hub.connections(), 0)
+
+    async def test_poll_returns_missed_messages_and_marks_them_read(self):
+        await self.async_client.aforce_login(self.seller)
+        response = await self.async_client.get(
+            reverse('marketplace:conversation_poll', args=[self.conversation.id]), {'after': 0},
+        )
+        self.assertEqual([msg['content'] for msg in response.json()['messages']], ['Is this still available?'])
+        await self.conversation.arefresh_from_db()
+        self.assertEqual(self.conversation.seller_unread, 0)
+
+    async def test_stream_sends_backlog_as_events(self):
+        await self.async_client.aforce_login(self.buyer)
+        response = await self.async_client.get(reverse('marketplace:conversation_stream', args=[self.conversation.id]))
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        chunks = aiter(response.streaming_content)
+        self.assertEqual(await anext(chunks), b'retry: 3000\n\n')
+        self.assertTrue((await anext(chunks)).startswith(f'id: {self.message.id}\nevent: message\n'.encode()))
+        await chunks.aclose()
+
+    async def call_router(self, path, cookie=''):
+        sent, passed = [], []
+
+        async def receive():
+            # 和真实服务器一样, 客户端不断开时 receive() 一直阻塞
+            await asyncio.Event().wait()
+
+        async def send(message):
+            sent.append(message)
+
+        async def django_app(scope, receive, send):
+            passed.append(scope['path'])
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'after=0',
+                 'headers': [(b'cookie', cookie.encode())]}
+        await realtime.RealtimeRouter(django_app)(scope, receive, send)
+        return sent, passed
+
+    async def test_router_serves_poll_outside_django(self):
+        await self.async_client.aforce_login(self.seller)
+        cookie = f'sessionid={self.async_client.cookies["sessionid"].value}'
+        path = reverse('marketplace:conversation_poll', args=[self.conversation.id])
+        sent, passed = await self.call_router(path, cookie)
+        self.assertEqual((sent[0]['status'], passed), (200, []))
+        self.assertEqual(json.loads(sent[1]['body'])['messages'][0]['id'], self.message.id)
+
+        sent, _ = await self.call_router(path)
+        self.assertEqual((sent[0]['status'], sent[1]['body']), (403, b'Forbidden'))
+        stranger = await User.objects.acreate(username='stranger')
+        await self.async_client.aforce_login(stranger)
+        sent, _ = await self.call_router(path, f'sessionid={self.async_client.cookies["sessionid"].value}')
+        self.assertEqual((sent[0]['status'], sent[1]['body']), (404, b'Not found'))
+        _, passed = await self.call_router(reverse('marketplace:inbox'), cookie)
+        self.assertEqual(passed, [reverse('marketplace:inbox')])
+
+    async def test_strangers_cannot_subscribe(self):
+        stranger = await User.objects.acreate(username='stranger')
+        await self.async_client.aforce_login(stranger)
+        response = await self.async_client.get(reverse('marketplace:conversation_poll', args=[self.conversation.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class KeysetPaginationTests(TestCase):
+    """游标分页: 前后翻页、排序键相同时按 id 区分、无效游标"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ids = [Goods.objects.create(name=f'Item {i}', price=i).id for i in range(7)]
+        # 前 4 个商品的 created_at 相同, 只能靠 id 排序
+        moment = timezone.now()
+        Goods.objects.filter(id__in=cls.ids[:4]).update(created_at=moment)
+        Goods.objects.filter(id__in=cls.ids[4:]).update(created_at=moment + timedelta(minutes=1))
+
+    def setUp(self):
+        self.paginator = KeysetPaginator(('-created_at', '-id'), per_page=3)
+        # 期望的顺序: 后创建的在前, created_at 相同的 id 大的在前
+        self.expected = self.ids[4:][::-1] + self.ids[:4][::-1]
+
+    def ids_of(self, page):
+        return [goods.id for goods in page]
+
+    def test_forward_and_backward(self):
+        queryset = Goods.objects.all()
+        first = self.paginator.paginate(queryset)
+        self.assertEqual(self.ids_of(first), self.expected[:3])
+        self.assertFalse(first.has_previous)
+        second = self.paginator.paginate(queryset, after=first.next_cursor)
+        self.assertEqual(self.ids_of(second), self.expected[3:6])
+        third = self.paginator.paginate(queryset, after=second.next_cursor)
+        self.assertEqual(self.ids_of(third), self.expected[6:])
+        self.assertFalse(third.has_next)
+
+        back = self.paginator.paginate(queryset, before=third.previous_cursor)
+        self.assertEqual(self.ids_of(back), self.expected[3:6])
+        self.assertTrue(back.has_next)
+        back = self.paginator.paginate(queryset, before=back.previous_cursor)
+        self.assertEqual(self.ids_of(back), self.expected[:3])
+        self.assertFalse(back.has_previous)
+
+    def test_ties_on_sort_key(self):
+        # 游标落在 created_at 相同的一组中间, 剩下的行既不重复也不遗漏
+        paginator = KeysetPaginator(('-created_at', '-id'), per_page=5)
+        first = paginator.paginate(Goods.objects.all())
+        rest = paginator.paginate(Goods.objects.all(), after=first.next_cursor)
+        self.assertEqual(self.ids_of(first) + self.ids_of(rest), self.expected)
+
+    def test_cursor_round_trip(self):
+        moment = timezone.now()
+        self.assertEqual(decode_cursor(encode_cursor([moment, 5])), [moment.isoformat(), 5])
+
+    def test_invalid_cursors_fall_back_to_first_page(self):
+        valid = self.paginator.paginate(Goods.objects.all()).next_cursor
+        not_a_list = base64.urlsafe_b64encode(b'{"a":1}').decode()
+        tampered = [
+            'not base64!', not_a_list, encode_cursor([1]), encode_cursor(['x', 'y']),
+            encode_cursor(['2026-01-01T00:00:00+00:00', 'abc']), valid[:-2],
+        ]
+        for token in tampered:
+            for direction in ('after', 'before'):
+                page = self.paginator.paginate(Goods.objects.all(), **{direction: token})
+                self.assertEqual(self.ids_of(page), self.expected[:3], f'{direction}={token!r}')
+        for token in ('%%%', not_a_list):
+            with self.assertRaises(ValueError):
+                decode_cursor(token)
@@ -1,13 +1,18 @@
 # marketplace/urls.py
+from django.conf import settings
 from django.urls import path
-from . import views
+from . import async_views, realtime, views
+
+# 读多写少的页面: ASGI 部署时用异步版本
+pages = async_views if settings.ASYNC_VIEWS else views
 
 app_name = 'marketplace'
 
 urlpatterns = [
     path('', views.home, name='home'),
-    path('shop/', views.shop, name='shop'),
-    path('item/<int:item_id>/', views.item_detail, name='item_detail'),
+    path('shop/', pages.shop, name='shop'),
+    path('shop/suggest/', views.search_suggestions, name='shop_suggest'),
+    path('item/<int:item_id>/', pages.item_detail, name='item_detail'),
     path('register/', views.register, name='register'),
     path('login/', views.user_login, name='login'),
     path('logout/', views.user_logout, name='logout'),
@@ -17,7 +22,14 @@ urlpatterns = [
     path('item/<int:item_id>/delete/', views.delete_item, name='delete_item'),
     path('item/<int:item_id>/message/', views.message_seller, name='message_seller'),
     path('item/<int:item_id>/favorite/', views.toggle_favorite, name='toggle_favorite'),
-    path('favorites/', views.favorites_list, name='favorites'),
+    path('favorites/', pages.favorites_list, name='favorites'),
+    # 收件箱
+    path('inbox/', views.inbox, name='inbox'),
+    path('inbox/read/', views.inbox_mark_read, name='inbox_mark_read'),
+    path('inbox/<int:conversation_id>/', views.conversation_detail, name='conversation'),
+    # 新消息推送 (ASGI): SSE, 不支持时用长轮询
+    path('inbox/<int:conversation_id>/stream/', realtime.conversation_stream, name='conversation_stream'),
+    path('inbox/<int:conversation_id>/poll/', realtime.conversation_poll, name='conversation_poll'),
     # 支付流程
     path('checkout/<int:item_id>/', views.checkout, name='checkout'),
 ]
\ No newline at end of file
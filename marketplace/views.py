@@ -1,13 +1,41 @@
 # marketplace/views.py
 from django.shortcuts import render, redirect, get_object_or_404
+from django.urls import reverse
 from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib.auth.forms import UserCreationForm, AuthenticationForm
 from django.contrib import messages
-from django.db import models
-from goods.models import Goods, Message, Favorite, GoodsImage, OutcomeImage
+from django.http import JsonResponse
+from django.utils.cache import patch_cache_control
+from django.db import models, transaction
+from django.db.models import Exists, F, OuterRef, Value
+from django.views.decorators.http import condition
+from database.replicas import replica_reads
+from database.transactions import retry_on_locked
+from goods import conversations, facets, imagehash, querylog, search, similarity, suggest
+from goods.models import Goods, Conversation, Favorite, GoodsImage, OutcomeImage
+from marketplace import caching
+from marketplace.pagination import KeysetPaginator, decode_cursor, page_from_rows
+import hashlib
 import random
 
+# 商品列表每页数量 (3列网格)
+SHOP_PAGE_SIZE = 24
+
+# 搜索框输入提示的默认条数 / ?limit= 上限
+SUGGEST_LIMIT = 8
+SUGGEST_MAX_LIMIT = 20
+
+# 收件箱每页对话数 / 对话页每页消息数
+INBOX_PAGE_SIZE = 20
+THREAD_PAGE_SIZE = 50
+
+# 商店排序方式: ?sort= 的值 -> 游标分页的排序字段 (都有对应的索引)
+SHOP_ORDERINGS = {
+    '': ('-created_at', '-id'),
+    'popular': ('-favorite_count', '-id'),
+}
+
 
 def home(request):
     """首页视图"""
@@ -16,32 +44,56 @@ def home(request):
 
 # 在 marketplace/views.py 的 shop 函数中修改
 
+SHOP_PAGE_PARAMS = ('search', 'major', 'category', 'sort', 'after', 'before')
+
+
+@replica_reads
+@querylog.logs_searches
+@caching.anonymous_page('shop', params=SHOP_PAGE_PARAMS)
 def shop(request):
     """商品列表页视图 + 搜索筛选"""
-    items = Goods.objects.all()
-
-    # 搜索功能
-    search_query = request.GET.get('search', '')
-    if search_query:
-        items = items.filter(
-            models.Q(name__icontains=search_query) |
-            models.Q(description__icontains=search_query) |
-            models.Q(professor__icontains=search_query) |
-            models.Q(course_code__icontains=search_query)
-        )
-
-    # 筛选功能
-    major_filter = request.GET.get('major', '')
-    category_filter = request.GET.get('category', '')
+    params = _shop_params(request)
+    if params['search'] and search.is_available():
+        # 搜索功能: 全文索引, 按相关度排序 (忽略 sort)
+        page = _search_page(params['search'], params['major'], params['category'], params['after'], params['before'])
+    else:
+        # 游标分页: 默认按 (created_at, id) 倒序, 不用 OFFSET 和 COUNT
+        paginator = KeysetPaginator(SHOP_ORDERINGS[params['sort']], per_page=SHOP_PAGE_SIZE)
+        page = paginator.paginate(_shop_queryset(params), after=params['after'], before=params['before'])
 
-    if major_filter:
-        items = items.filter(major=major_filter)
-    if category_filter:
-        items = items.filter(category=category_filter)
+    caching.depends_on(request, caching.CATALOGUE, *(caching.item(goods.id) for goods in page.items))
+    popular = querylog.popular() if not params['search'] else []
+    context = _shop_context(params, page, _facet_table(params['search']), popular)
+    return render(request, 'marketplace/shop.html', context)
+
+
+def _shop_params(request):
+    params = {name: request.GET.get(name, '') for name in SHOP_PAGE_PARAMS}
+    if params['sort'] not in SHOP_ORDERINGS:
+        params['sort'] = ''
+    return params
+
+
+def _shop_queryset(params):
+    """不用全文索引时的商品列表 (筛选 + 不支持全文索引的数据库上的搜索)"""
+    # 预取图片, 每张卡片取主图不再单独查询
+    items = Goods.objects.prefetch_related('images')
+    if params['search']:
+        items = items.filter(_icontains(params['search']))
+    if params['major']:
+        items = items.filter(major=params['major'])
+    if params['category']:
+        items = items.filter(category=params['category'])
+    return items
 
-    # 获取所有可能的筛选选项
+
+def _shop_context(params, page, facet_table, popular_searches=()):
+    search_query, major_filter, category_filter = params['search'], params['major'], params['category']
+
+    # 获取所有可能的筛选选项, 附带商品数量
     majors = Goods.MAJOR_CHOICES
     categories = Goods.CATEGORY_CHOICES
+    major_counts, category_counts = facets.facet_counts(facet_table, major=major_filter, category=category_filter)
 
     # 获取选中筛选的显示名称
     selected_title = "All"
@@ -52,26 +104,116 @@ def shop(request):
     elif search_query:
         selected_title = f'Search: "{search_query}"'
 
-    context = {
-        'items': items,
+    return {
+        'items': page.items,
+        'page': page,
         'search_query': search_query,
         'major_filter': major_filter,
         'category_filter': category_filter,
-        'majors': majors,
-        'categories': categories,
+        'sort': params['sort'],
+        'majors': [(value, label, major_counts.get(value, 0)) for value, label in majors],
+        'categories': [(value, label, category_counts.get(value, 0)) for value, label in categories],
+        'major_total': sum(major_counts.values()),
+        'category_total': sum(category_counts.values()),
         'selected_title': selected_title,  # 新增
+        'popular_searches': popular_searches,
     }
-    return render(request, 'marketplace/shop.html', context)
 
 
+def _icontains(search_query):
+    return (
+        models.Q(name__icontains=search_query) |
+        models.Q(description__icontains=search_query) |
+        models.Q(professor__icontains=search_query) |
+        models.Q(course_code__icontains=search_query)
+    )
+
+
+def _facet_table(search_query):
+    """分面计数表: 没有搜索词时用缓存的全目录计数, 否则对搜索结果做一次分组查询"""
+    if not search_query:
+        return facets.catalogue_counts()
+    if search.is_available():
+        return facets.grouped_counts(search.filter_matching(Goods.objects.all(), search_query))
+    return facets.grouped_counts(Goods.objects.filter(_icontains(search_query)))
+
+
+def search_suggestions(request):
+    """搜索框输入提示 (JSON): ?q=前缀, 匹配商品名、课程代码和教授名"""
+    query = request.GET.get('q', '')
+    try:
+        limit = min(max(int(request.GET.get('limit', SUGGEST_LIMIT)), 1), SUGGEST_MAX_LIMIT)
+    except ValueError:
+        limit = SUGGEST_LIMIT
+    response = JsonResponse({
+        'query': query,
+        'suggestions': [
+            {'text': text, 'kind': kind, 'count': count} for text, kind, count in suggest.lookup(query, limit)
+        ],
+    })
+    # 同一个前缀短时间内重复输入 (删了又打) 时浏览器直接用缓存
+    patch_cache_control(response, public=True, max_age=60)
+    return response
+
+
+def _search_page(search_query, major_filter, category_filter, after, before):
+    """全文搜索结果分页, 游标是 (bm25 分数, id)"""
+    cursor, backwards = None, False
+    try:
+        if after or before:
+            score, goods_id = decode_cursor(after or before)
+            cursor, backwards = (float(score), int(goods_id)), not after
+    except (TypeError, ValueError):
+        cursor, backwards = None, False
+
+    rows = search.ranked_ids(
+        search_query, major=major_filter, category=category_filter,
+        after=cursor, backwards=backwards, limit=SHOP_PAGE_SIZE + 1,
+    )
+    page = page_from_rows(rows, lambda row: (row[1], row[0]), SHOP_PAGE_SIZE,
+                          backwards=backwards, has_cursor=cursor is not None)
+    goods = Goods.objects.prefetch_related('images').in_bulk([goods_id for goods_id, _ in page.items])
+    page.items = [goods[goods_id] for goods_id, _ in page.items if goods_id in goods]
+    return page
+
+
+def _item_validators(request, item_id):
+    """详情页的 (ETag, Last-Modified), 结果缓存在 request 上
+
+    一条查询取出修改时间和收藏状态, 一条取出相关商品的修改时间 (页面上有它们的卡片)。
+    """
+    if not hasattr(request, '_item_validators'):
+        request._item_validators = (None, None)
+        # 有待显示的提示消息时页面内容会不同, 不走 304
+        if not len(messages.get_messages(request)):
+            user = request.user
+            favorited = Exists(Favorite.objects.filter(user=user, item=OuterRef('pk'))) \
+                if user.is_authenticated else Value(False)
+            row = Goods.objects.filter(id=item_id).values_list('updated_at', 'category', 'major', favorited).first()
+            if row is not None:
+                updated_at, category, major, is_favorited = row
+                related = similarity.related_stamps(item_id, category, major)
+                key = f'{item_id}:{updated_at.isoformat()}:{user.pk or 0}:{int(is_favorited)}:' + \
+                    ','.join(f'{goods_id}@{stamp.isoformat()}' for goods_id, stamp in related)
+                # 登录用户的页面还取决于收藏状态, 只给匿名访问加 Last-Modified
+                request._item_validators = (
+                    f'"{hashlib.md5(key.encode()).hexdigest()}"',
+                    None if user.is_authenticated else max([updated_at, *(stamp for _, stamp in related)]),
+                )
+    return request._item_validators
+
+
+@replica_reads
+@caching.anonymous_page('item_detail')
+@condition(etag_func=lambda request, item_id: _item_validators(request, item_id)[0],
+           last_modified_func=lambda request, item_id: _item_validators(request, item_id)[1])
 def item_detail(request, item_id):
     """商品详情页"""
-    item = get_object_or_404(Goods, id=item_id)
+    item = get_object_or_404(Goods.objects.prefetch_related('images', 'outcomes'), id=item_id)
 
-    # 获取相关商品 (同一category或major)
-    related_items = Goods.objects.filter(
-        models.Q(category=item.category) | models.Q(major=item.major)
-    ).exclude(id=item.id)[:4]
+    # 相关商品 (预先计算的内容相似度, 见 goods/similarity.py)
+    related_items = similarity.related(item, limit=4)
+    caching.depends_on(request, caching.item(item.id), *(caching.item(related.id) for related in related_items))
 
     # 检查当前用户是否收藏
     is_favorited = False
@@ -127,7 +269,7 @@ def user_logout(request):
 @login_required
 def my_account(request):
     """我的账户"""
-    my_items = Goods.objects.filter(seller=request.user) if hasattr(Goods, 'seller') else []
+    my_items = Goods.objects.filter(seller=request.user).prefetch_related('images') if hasattr(Goods, 'seller') else []
     context = {'my_items': my_items}
     return render(request, 'marketplace/my_account.html', context)
 
@@ -143,21 +285,9 @@ def post_item(request):
         outcome_images = request.FILES.getlist('outcome_images')
 
         if form.is_valid():
-            item = form.save(commit=False)
-            # 如果Goods模型有seller字段,关联当前用户
-            if hasattr(item, 'seller'):
-                item.seller = request.user
-            item.save()
-
-            # 保存商品图片
-            for i, img in enumerate(images[:3]):  # 最多3张
-                GoodsImage.objects.create(goods=item, image=img, order=i)
-
-            # 保存Outcome图片
-            for i, img in enumerate(outcome_images[:5]):  # 最多5张
-                OutcomeImage.objects.create(goods=item, image=img, order=i)
-
+            item = _save_item(form, request.user, images, outcome_images)
             messages.success(request, 'Item posted successfully!')
+            _warn_duplicate_photos(request, item)
             return redirect('marketplace:my_account')
     else:
         form = GoodsForm()
@@ -165,6 +295,38 @@ def post_item(request):
     return render(request, 'marketplace/post_item.html', {'form': form})
 
 
+@retry_on_locked
+def _save_item(form, seller, images, outcome_images):
+    """商品、图片和缩略图任务在同一个事务里提交, 缩略图由后台 worker 生成"""
+    # 感知哈希在写事务之前算好, 解码图片时不占着数据库的写锁
+    hashes = [imagehash.hash_file(img) for img in images[:3]]
+    with transaction.atomic():
+        item = form.save(commit=False)
+        # 如果Goods模型有seller字段,关联当前用户
+        if hasattr(item, 'seller'):
+            item.seller = seller
+        item.save()
+
+        # 保存商品图片
+        for i, (img, value) in enumerate(zip(images[:3], hashes)):  # 最多3张
+            GoodsImage.objects.create(goods=item, image=img, order=i, **imagehash.hash_fields(value))
+
+        # 保存Outcome图片
+        for i, img in enumerate(outcome_images[:5]):  # 最多5张
+            OutcomeImage.objects.create(goods=item, image=img, order=i)
+    return item
+
+
+def _warn_duplicate_photos(request, item, limit=3):
+    """新商品的照片和已有商品几乎一样时提醒卖家 (重复发布)"""
+    goods_ids = imagehash.duplicate_goods(item)[:limit]
+    if goods_ids:
+        names = Goods.objects.in_bulk(goods_ids)
+        listed = ', '.join(f'"{names[goods_id].name}"' for goods_id in goods_ids if goods_id in names)
+        messages.warning(request, f'Some photos look the same as ones already listed in: {listed}. '
+                                  'Please remove duplicate listings.')
+
+
 @login_required
 def edit_item(request, item_id):
     """编辑商品"""
@@ -208,40 +370,102 @@ def delete_item(request, item_id):
 
 @login_required
 def message_seller(request, item_id):
-    """给卖家留言"""
+    """给卖家留言 (买家和卖家关于这个商品的对话)"""
     item = get_object_or_404(Goods, id=item_id)
+    if item.seller_id == request.user.id:
+        # 卖家在收件箱里分别回复每个买家
+        return redirect('marketplace:inbox')
 
+    conversation = Conversation.objects.filter(item=item, buyer=request.user).first()
     if request.method == 'POST':
         content = request.POST.get('content')
         if content:
-            Message.objects.create(
-                item=item,
-                sender=request.user,
-                content=content
-            )
+            conversations.send(conversation or conversations.start(item, request.user), request.user, content)
             messages.success(request, 'Message sent!')
             return redirect('marketplace:message_seller', item_id=item.id)
 
-    # 获取该商品的所有留言
-    item_messages = Message.objects.filter(item=item).select_related('sender')
+    return _render_thread(request, item, conversation)
+
+
+@login_required
+def conversation_detail(request, conversation_id):
+    """收件箱里的一个对话, 只有买家和卖家能看"""
+    conversation = get_object_or_404(
+        conversations.for_user(request.user).select_related('item', 'buyer', 'seller'), id=conversation_id,
+    )
+    if request.method == 'POST':
+        content = request.POST.get('content')
+        if content:
+            conversations.send(conversation, request.user, content)
+            messages.success(request, 'Message sent!')
+            return redirect('marketplace:conversation', conversation_id=conversation.id)
+
+    return _render_thread(request, conversation.item, conversation)
+
+
+def _render_thread(request, item, conversation):
+    """对话页: 最新的 THREAD_PAGE_SIZE 条消息, 可以往前翻; 打开时把对方的消息标记为已读"""
+    page = None
+    if conversation is not None:
+        paginator = KeysetPaginator(('-created_at', '-id'), per_page=THREAD_PAGE_SIZE)
+        page = paginator.paginate(conversations.thread(conversation),
+                                  after=request.GET.get('after'), before=request.GET.get('before'))
+        # 页内按时间正序显示
+        page.items.reverse()
+        conversations.mark_read(conversation, request.user)
 
     context = {
         'item': item,
-        'item_messages': item_messages
+        'conversation': conversation,
+        'page': page,
+        'item_messages': page.items if page else [],
+        # 实时推送从这条之后开始 (见 marketplace/realtime.py)
+        'last_message_id': page.items[-1].id if page and page.items else 0,
     }
     return render(request, 'marketplace/message_seller.html', context)
 
 
+@login_required
+def inbox(request):
+    """收件箱: 卖出/买入两个列表, 显示最后一条消息和未读数"""
+    box = request.GET.get('box', 'selling')
+    if box not in conversations.BOXES:
+        box = 'selling'
+    paginator = KeysetPaginator(('-last_message_at', '-id'), per_page=INBOX_PAGE_SIZE)
+    page = paginator.paginate(conversations.inbox(request.user, box),
+                              after=request.GET.get('after'), before=request.GET.get('before'))
+    unread_field = f'{conversations.BOXES[box]}_unread'
+    for conversation in page.items:
+        conversation.unread = getattr(conversation, unread_field)
+        conversation.other = conversation.other_party(request.user)
+
+    context = {
+        'box': box,
+        'page': page,
+        'conversations': page.items,
+        'unread_counts': conversations.unread_counts(request.user),
+    }
+    return render(request, 'marketplace/inbox.html', context)
+
+
+@login_required
+def inbox_mark_read(request):
+    """把收件箱里的对话全部标记为已读"""
+    box = request.POST.get('box', 'selling')
+    if request.method == 'POST' and box in conversations.BOXES:
+        count = conversations.mark_all_read(request.user, box)
+        messages.success(request, f'{count} conversation{"s" if count != 1 else ""} marked as read')
+    return redirect(f"{reverse('marketplace:inbox')}?box={box}")
+
+
 @login_required
 def toggle_favorite(request, item_id):
     """收藏/取消收藏"""
     item = get_object_or_404(Goods, id=item_id)
-
-    favorite, created = Favorite.objects.get_or_create(user=request.user, item=item)
+    created = _toggle_favorite(request.user, item)
 
     if not created:
         # 已存在,则删除(取消收藏)
-        favorite.delete()
         messages.success(request, 'Removed from favorites')
     else:
         # 新创建(添加收藏)
@@ -250,10 +474,26 @@ def toggle_favorite(request, item_id):
     return redirect('marketplace:item_detail', item_id=item.id)
 
 
+@retry_on_locked
+def _toggle_favorite(user, item):
+    """收藏或取消收藏, 返回是否是新收藏
+
+    收藏行和 favorite_count 在同一个事务里修改; 计数只在真的插入/删除了一行时加减,
+    重复提交或并发点击不会让计数漂移
+    """
+    with transaction.atomic():
+        favorite, created = Favorite.objects.get_or_create(user=user, item=item)
+        if created:
+            Goods.touch(item.id, favorite_count=F('favorite_count') + 1)
+        elif Favorite.objects.filter(pk=favorite.pk).delete()[0]:
+            Goods.touch(item.id, favorite_count=F('favorite_count') - 1)
+    return created
+
+
 @login_required
 def favorites_list(request):
     """我的收藏列表"""
-    favorites = Favorite.objects.filter(user=request.user).select_related('item')
+    favorites = Favorite.objects.filter(user=request.user).select_related('item').prefetch_related('item__images')
 
     context = {'favorites': favorites}
     return render(request, 'marketplace/favorites.html', context)
@@ -0,0 +1,11 @@
+from django.apps import AppConfig
+
+
+class MonitoringConfig(AppConfig):
+    default_auto_field = 'django.db.models.BigAutoField'
+    name = 'monitoring'
+
+    def ready(self):
+        # 给每个数据库连接装上 SQL 计时 (见 monitoring/middleware.py)
+        from monitoring import middleware
+        middleware.install()
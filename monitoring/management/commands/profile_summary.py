@@ -0,0 +1,97 @@
+# monitoring/management/commands/profile_summary.py
+"""汇总 PROFILING_DIR 里保存的剖析结果, 列出最耗时的函数
+
+    python manage.py profile_summary
+    python manage.py profile_summary --match marketplace_shop --sort cumulative --limit 40
+
+.prof (cProfile) 合并后按函数自身时间 (tottime) 或累计时间 (cumulative) 排序;
+.stacks (慢请求的调用栈采样) 按采样次数统计: self 是函数在栈顶的次数,
+total 是函数出现在栈里的次数 (递归只算一次)。
+"""
+import os
+import pstats
+import site
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from monitoring import profiling
+
+
+def _prefixes():
+    paths = [str(settings.BASE_DIR), *site.getsitepackages(), os.path.dirname(os.__file__)]
+    # 长的在前, 先匹配更具体的目录
+    return sorted({os.path.join(path, '') for path in paths}, key=len, reverse=True)
+
+
+def short_name(name, prefixes):
+    for prefix in prefixes:
+        if name.startswith(prefix):
+            return name[len(prefix):]
+    return name
+
+
+class Command(BaseCommand):
+    help = 'Summarize the hottest functions across captured request profiles'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dir', help='Profile directory (default: settings.PROFILING_DIR)')
+        parser.add_argument('--match', help='Only files whose name contains this text (e.g. a view name)')
+        parser.add_argument('--sort', choices=['tottime', 'cumulative'], default='tottime',
+                            help='Ordering for cProfile results')
+        parser.add_argument('--limit', type=int, default=25)
+
+    def handle(self, *args, **options):
+        directory = options['dir'] or settings.PROFILING_DIR
+        if not os.path.isdir(directory):
+            raise CommandError(f'No profile directory at {directory}')
+        names = sorted(
+            name for name in os.listdir(directory)
+            if not options['match'] or options['match'] in name
+        )
+        profiles = [os.path.join(directory, name) for name in names if name.endswith(profiling.PROFILE_SUFFIX)]
+        stacks = [os.path.join(directory, name) for name in names if name.endswith(profiling.STACKS_SUFFIX)]
+        if not profiles and not stacks:
+            raise CommandError('No captured profiles found.')
+
+        prefixes = _prefixes()
+        if profiles:
+            self._profiles(profiles, options, prefixes)
+        if stacks:
+            self._stacks(stacks, options['limit'], prefixes)
+
+    def _profiles(self, paths, options, prefixes):
+        stats = pstats.Stats(*paths)
+        key = 3 if options['sort'] == 'cumulative' else 2
+        rows = sorted(stats.stats.items(), key=lambda item: item[1][key], reverse=True)[:options['limit']]
+        self.stdout.write(f'{len(paths)} cProfile dump(s), {stats.total_tt:.3f}s profiled, '
+                          f"sorted by {options['sort']}")
+        self.stdout.write(f'{"calls":>10}{"tottime":>10}{"cumtime":>10}  function')
+        for (filename, line, function), (_, calls, tottime, cumtime, _) in rows:
+            location = f'{short_name(filename, prefixes)}:{line}({function})' if line else function
+            self.stdout.write(f'{calls:>10}{tottime:>10.3f}{cumtime:>10.3f}  {location}')
+        self.stdout.write('')
+
+    def _stacks(self, paths, limit, prefixes):
+        own, total, samples = Counter(), Counter(), 0
+        for path in paths:
+            with open(path) as fh:
+                for line in fh:
+                    if line.startswith('#') or not line.strip():
+                        continue
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    count = int(count)
+                    frames = stack.split(';')
+                    samples += count
+                    own[frames[-1]] += count
+                    for frame in set(frames):
+                        total[frame] += count
+
+        self.stdout.write(f'{len(paths)} slow request(s), {samples} stack samples')
+        self.stdout.write(f'{"self":>8}{"self %":>8}{"total %":>9}  function')
+        for frame, count in own.most_common(limit):
+            self.stdout.write(
+                f'{count:>8}{count / samples:>8.1%}{total[frame] / samples:>9.1%}  {short_name(frame, prefixes)}'
+            )
+        self.stdout.write('')
@@ -0,0 +1,18 @@
+# monitoring/management/commands/profile_token.py
+"""生成剖析请求用的签名令牌 (见 monitoring/profiling.py)
+
+    curl -H "X-Profile-Token: $(python manage.py profile_token)" https://.../shop/
+"""
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from monitoring import profiling
+
+
+class Command(BaseCommand):
+    help = f'Print a signed {profiling.HEADER} header value that makes one request be profiled'
+
+    def handle(self, *args, **options):
+        if not settings.PROFILING_ENABLED:
+            self.stderr.write('PROFILING_ENABLED is False; the token will be ignored until it is turned on.')
+        self.stdout.write(profiling.make_token())
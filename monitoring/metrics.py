@@ -0,0 +1,143 @@
+# monitoring/metrics.py
+"""进程内的计数器和直方图, 输出 Prometheus 文本格式 (/metrics)
+
+不依赖 prometheus_client: 每个指标是 {标签值元组: 数值} 的字典, 记录一个请求的所有数据
+只拿一次锁。直方图按固定的桶计数, 导出时再累加成 Prometheus 要求的 le 累计值。
+数据保存在当前进程里, 多进程部署时每个进程各自提供 /metrics, 由 Prometheus 分别抓取。
+"""
+import math
+import threading
+from bisect import bisect_left
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if value == math.inf:
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _sample(name, labels, value):
+    if labels:
+        rendered = ','.join(f'{label}="{_escape(v)}"' for label, v in labels)
+        return f'{name}{{{rendered}}} {_number(value)}'
+    return f'{name} {_number(value)}'
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name, documentation, labelnames):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+
+    def clear(self):
+        self._values.clear()
+
+    def expose(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        for values, state in sorted(self._values.items()):
+            lines.extend(self._samples(tuple(zip(self.labelnames, values)), state))
+        return lines
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, labels, amount=1):
+        """调用方要持有 registry.lock"""
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels):
+        return self._values.get(labels, 0)
+
+    def _samples(self, labels, value):
+        yield _sample(self.name, labels, value)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames, buckets):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, labels, value):
+        """调用方要持有 registry.lock"""
+        state = self._values.get(labels)
+        if state is None:
+            state = self._values[labels] = [[0] * (len(self.buckets) + 1), 0]
+        # 落在第一个 >= value 的桶里 (Prometheus 的 le 是小于等于)
+        state[0][bisect_left(self.buckets, value)] += 1
+        state[1] += value
+
+    def count(self, *labels):
+        state = self._values.get(labels)
+        return sum(state[0]) if state else 0
+
+    def _samples(self, labels, state):
+        counts, total = state
+        cumulative = 0
+        for bound, n in zip((*self.buckets, math.inf), counts):
+            cumulative += n
+            yield _sample(f'{self.name}_bucket', (*labels, ('le', _number(bound))), cumulative)
+        yield _sample(f'{self.name}_sum', labels, total)
+        yield _sample(f'{self.name}_count', labels, cumulative)
+
+
+class Registry:
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._add(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=()):
+        return self._add(Histogram(name, documentation, labelnames, buckets))
+
+    def _add(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def expose(self):
+        with self.lock:
+            lines = [line for metric in self._metrics for line in metric.expose()]
+        return '\n'.join(lines) + '\n'
+
+    def clear(self):
+        with self.lock:
+            for metric in self._metrics:
+                metric.clear()
+
+
+registry = Registry()
+
+SECONDS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERIES = (0, 1, 2, 5, 10, 20, 50, 100, 200)
+BYTES = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+REQUESTS = registry.counter(
+    'patch_http_requests_total', 'Requests by view, method and status.', ('view', 'method', 'status'))
+REQUEST_SECONDS = registry.histogram(
+    'patch_http_request_duration_seconds', 'Time spent in Django per request.', ('view',), SECONDS)
+RESPONSE_BYTES = registry.histogram(
+    'patch_http_response_size_bytes', 'Response body size (streaming responses are not counted).',
+    ('view',), BYTES)
+DB_QUERIES = registry.histogram(
+    'patch_db_queries_per_request', 'SQL statements per request.', ('view',), QUERIES)
+DB_SECONDS = registry.histogram(
+    'patch_db_duration_seconds', 'Total SQL execution time per request.', ('view',), SECONDS)
+DB_DUPLICATES = registry.counter(
+    'patch_db_duplicate_queries_total', 'Statements repeated with the same parameters in one request.', ('view',))
+DB_SIMILAR = registry.counter(
+    'patch_db_similar_queries_total',
+    'Statements repeated with different parameters in one request (N+1 candidates).', ('view',))
+TEMPLATE_SECONDS = registry.histogram(
+    'patch_template_render_duration_seconds', 'Template rendering time per request.', ('view',), SECONDS)
@@ -0,0 +1,171 @@
+# monitoring/middleware.py
+"""每个请求的耗时统计: 总时间、SQL 条数和时间、重复查询、模板渲染时间、响应大小
+
+按视图名 (URL 的 name, 没有时是视图函数路径) 汇总到 monitoring/metrics.py 的直方图里,
+同时在响应里加 Server-Timing 头, 浏览器开发者工具的 Network 面板可以直接看到。
+
+SQL 计时用 execute_wrapper, 在连接创建时装到每个数据库连接上; 当前请求的统计放在
+contextvar 里, 所以异步视图在线程池里执行的查询 (sync_to_async 会复制 context) 也记在
+这个请求上, 请求之外的查询 (后台任务、管理命令) 只多一次 contextvar 读取。
+SQL 时间是 execute 的时间, 不含之后读取结果行; 模板里惰性执行的查询同时计入模板时间。
+
+同一条 SQL 在一个请求里重复执行: 参数也相同的算 duplicate, 参数不同的算 similar
+(典型的 N+1); 次数达到 METRICS_N_PLUS_ONE_THRESHOLD 时记一条警告日志。
+"""
+import logging
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+from monitoring import metrics
+
+logger = logging.getLogger(__name__)
+
+_current = ContextVar('monitoring_request_stats', default=None)
+
+
+class RequestStats:
+    """一个请求的统计; 异步视图的查询可能来自多个线程, 所以加锁"""
+
+    __slots__ = ('started', 'queries', 'db_time', 'template_time', 'rendering', 'statements', 'executions',
+                 'duplicates', '_lock')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.template_time = 0.0
+        self.rendering = False
+        self.statements = {}      # sql -> 执行次数
+        self.executions = set()   # (sql, 参数)
+        self.duplicates = 0
+        self._lock = threading.Lock()
+
+    def add_query(self, sql, params, elapsed):
+        try:
+            execution = (sql, tuple(params) if params is not None else None)
+            hash(execution)
+        except TypeError:
+            execution = (sql, repr(params))
+        with self._lock:
+            self.queries += 1
+            self.db_time += elapsed
+            self.statements[sql] = self.statements.get(sql, 0) + 1
+            if execution in self.executions:
+                self.duplicates += 1
+            else:
+                self.executions.add(execution)
+
+    @property
+    def similar(self):
+        return self.queries - len(self.statements) - self.duplicates
+
+
+def current():
+    """当前请求的统计, 请求之外是 None"""
+    return _current.get()
+
+
+def record_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.add_query(sql, params, time.perf_counter() - started)
+
+
+def _install_on(connection, **kwargs):
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def install():
+    """给之后创建的和已经打开的连接装上 SQL 计时"""
+    connection_created.connect(_install_on, dispatch_uid='monitoring.record_query')
+    for connection in connections.all(initialized_only=True):
+        _install_on(connection)
+
+
+def view_name(request):
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match is not None else '<unresolved>'
+
+
+def _server_timing(total, stats):
+    return (
+        f'app;dur={total * 1000:.1f}, '
+        f'db;dur={stats.db_time * 1000:.1f};desc="{stats.queries} queries", '
+        f'tpl;dur={stats.template_time * 1000:.1f}'
+    )
+
+
+def finish(request, response, stats):
+    """请求结束: 汇总到直方图, 加 Server-Timing 头"""
+    total = time.perf_counter() - stats.started
+    view = view_name(request)
+    labels = (view,)
+    with metrics.registry.lock:
+        metrics.REQUESTS.inc((view, request.method, str(response.status_code)))
+        metrics.REQUEST_SECONDS.observe(labels, total)
+        if not response.streaming:
+            metrics.RESPONSE_BYTES.observe(labels, len(response.content))
+        metrics.DB_QUERIES.observe(labels, stats.queries)
+        metrics.DB_SECONDS.observe(labels, stats.db_time)
+        metrics.TEMPLATE_SECONDS.observe(labels, stats.template_time)
+        if stats.duplicates:
+            metrics.DB_DUPLICATES.inc(labels, stats.duplicates)
+        if stats.similar:
+            metrics.DB_SIMILAR.inc(labels, stats.similar)
+
+    if stats.statements:
+        sql, repeats = max(stats.statements.items(), key=lambda pair: pair[1])
+        if repeats >= settings.METRICS_N_PLUS_ONE_THRESHOLD:
+            logger.warning('%s ran the same query %d times (possible N+1): %s', view, repeats, sql[:300])
+
+    if settings.METRICS_SERVER_TIMING:
+        timing = _server_timing(total, stats)
+        existing = response.get('Server-Timing')
+        response['Server-Timing'] = f'{existing}, {timing}' if existing else timing
+
+
+class MetricsMiddleware:
+    """放在 MIDDLEWARE 的第一个, 统计包括其它中间件在内的时间; 同步和异步请求都支持"""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = self.get_response(request)
+        finally:
+            _current.reset(token)
+        finish(request, response, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+        finish(request, response, stats)
+        return response
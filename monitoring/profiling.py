@@ -0,0 +1,203 @@
+# monitoring/profiling.py
+"""按需剖析单个请求 (默认关闭, settings.PROFILING_ENABLED)
+
+三种触发方式:
+
+- 请求头 X-Profile-Token 带上签名令牌 (manage.py profile_token 生成, 有效期
+  PROFILING_TOKEN_MAX_AGE): 用 cProfile 剖析这个请求, 响应头 X-Profile 给出文件名;
+- PROFILING_SAMPLE_EVERY = N: 平均每 N 个请求随机剖析一个 (cProfile);
+- PROFILING_SLOW_MS: 后台线程每 PROFILING_STACK_INTERVAL_MS 毫秒对进行中的请求采一次调用栈,
+  请求结束时超过阈值才保存, 否则丢弃。比这个间隔还快的请求一次都不会被采样, 开销很小。
+
+cProfile 的结果存成 .prof (pstats 格式), 调用栈采样存成 .stacks (折叠栈格式, 每行
+"帧;帧;帧 次数", 可以直接交给 flamegraph 工具)。文件写在 PROFILING_DIR, 最多保留
+PROFILING_MAX_FILES 个, 超出时删除最旧的。manage.py profile_summary 汇总最耗时的函数。
+
+cProfile 和调用栈都是按线程的, 所以这个中间件只支持同步执行: ASGI 下启用后, 它后面的
+中间件和视图都在请求线程里同步运行 (异步视图失去并发), 只建议临时打开。
+"""
+import cProfile
+import os
+import random
+import re
+import sys
+import threading
+import time
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.core.exceptions import MiddlewareNotUsed
+
+from monitoring.middleware import view_name
+
+HEADER = 'X-Profile-Token'
+SALT = 'monitoring.profiling'
+PROFILE_SUFFIX = '.prof'
+STACKS_SUFFIX = '.stacks'
+
+
+def make_token():
+    return signing.TimestampSigner(salt=SALT).sign('profile')
+
+
+def valid_token(token):
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(token, max_age=settings.PROFILING_TOKEN_MAX_AGE)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def frame_name(code):
+    """和 pstats 一样的函数名: 文件:行号(函数)"""
+    return f'{code.co_filename}:{code.co_firstlineno}({code.co_name})'
+
+
+def _stack(frame):
+    names = []
+    while frame is not None:
+        names.append(frame_name(frame.f_code))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class Capture:
+    """一个请求的调用栈采样"""
+
+    __slots__ = ('thread_id', 'started', 'stacks')
+
+    def __init__(self):
+        self.thread_id = threading.get_ident()
+        self.started = time.perf_counter()
+        self.stacks = {}
+
+    def add(self, stack):
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
+
+
+class StackSampler:
+    """后台线程, 定时给登记了的请求所在线程采一次调用栈"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._captures = {}
+        self._lock = threading.Lock()
+        self._thread = None
+
+    def track(self):
+        capture = Capture()
+        with self._lock:
+            self._captures[capture.thread_id] = capture
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='request-stack-sampler', daemon=True)
+                self._thread.start()
+        return capture
+
+    def untrack(self, capture):
+        with self._lock:
+            self._captures.pop(capture.thread_id, None)
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                captures = list(self._captures.values())
+            if not captures:
+                continue
+            frames = sys._current_frames()
+            for capture in captures:
+                frame = frames.get(capture.thread_id)
+                if frame is not None:
+                    capture.add(_stack(frame))
+
+
+def _filename(request, elapsed, suffix):
+    label = re.sub(r'[^\w.-]+', '_', view_name(request)).strip('_')
+    stamp = datetime.now().strftime('%Y%m%dT%H%M%S-%f')
+    return f'{stamp}-{label}-{elapsed * 1000:.0f}ms{suffix}'
+
+
+def _rotate(directory, limit):
+    """只保留最新的 limit 个文件"""
+    entries = [entry for entry in os.scandir(directory)
+               if entry.is_file() and entry.name.endswith((PROFILE_SUFFIX, STACKS_SUFFIX))]
+    if len(entries) <= limit:
+        return
+    entries.sort(key=lambda entry: (entry.stat().st_mtime, entry.name))
+    for entry in entries[:len(entries) - limit]:
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            # 另一个进程已经删掉了
+            pass
+
+
+def _write(request, elapsed, suffix, write):
+    directory = settings.PROFILING_DIR
+    os.makedirs(directory, exist_ok=True)
+    name = _filename(request, elapsed, suffix)
+    write(os.path.join(directory, name))
+    _rotate(directory, settings.PROFILING_MAX_FILES)
+    return name
+
+
+def save_profile(request, profiler, elapsed):
+    return _write(request, elapsed, PROFILE_SUFFIX, profiler.dump_stats)
+
+
+def save_stacks(request, capture, elapsed):
+    def write(path):
+        with open(path, 'w') as fh:
+            fh.write(f'# {request.method} {request.get_full_path()} {elapsed * 1000:.0f}ms\n')
+            for stack, count in sorted(capture.stacks.items(), key=lambda pair: -pair[1]):
+                fh.write(f'{stack} {count}\n')
+    return _write(request, elapsed, STACKS_SUFFIX, write)
+
+
+class ProfilingMiddleware:
+    """放在 MetricsMiddleware 后面; PROFILING_ENABLED = False 时不加载"""
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.slow = settings.PROFILING_SLOW_MS / 1000
+        self.sampler = StackSampler(settings.PROFILING_STACK_INTERVAL_MS / 1000) if self.slow else None
+
+    def _wants_profile(self, request):
+        token = request.headers.get(HEADER)
+        if token:
+            return valid_token(token)
+        every = settings.PROFILING_SAMPLE_EVERY
+        return bool(every) and random.random() * every < 1
+
+    def __call__(self, request):
+        if self._wants_profile(request):
+            return self._profile(request)
+        if self.sampler is None:
+            return self.get_response(request)
+
+        capture = self.sampler.track()
+        try:
+            response = self.get_response(request)
+        finally:
+            self.sampler.untrack(capture)
+        elapsed = time.perf_counter() - capture.started
+        if elapsed >= self.slow and capture.stacks:
+            save_stacks(request, capture, elapsed)
+        return response
+
+    def _profile(self, request):
+        profiler = cProfile.Profile()
+        started = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        finally:
+            profiler.disable()
+        name = save_profile(request, profiler, time.perf_counter() - started)
+        if HEADER in request.headers:
+            response['X-Profile'] = name
+        return response
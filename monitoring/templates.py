@@ -0,0 +1,37 @@
+# monitoring/templates.py
+"""记录模板渲染时间的 Django 模板后端 (settings.TEMPLATES 的 BACKEND)
+
+和内置的 DjangoTemplates 一样, 只是返回的模板对象在渲染时把耗时加到当前请求的统计上
+(monitoring/middleware.py)。只计最外层的渲染: 模板里 include 的子模板不经过后端,
+视图里嵌套调用 render_to_string 也不会重复计时。
+"""
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from monitoring.middleware import current
+
+
+class TimedTemplate(Template):
+
+    def render(self, context=None, request=None):
+        stats = current()
+        if stats is None or stats.rendering:
+            return super().render(context, request)
+        stats.rendering = True
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+            stats.rendering = False
+
+
+class TimedDjangoTemplates(DjangoTemplates):
+
+    def from_string(self, template_code):
+        return TimedTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return TimedTemplate(template.template, self)
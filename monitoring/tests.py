@@ -0,0 +1,135 @@
+import os
+import tempfile
+import time
+from io import StringIO
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from goods.models import Goods
+from monitoring import metrics, profiling
+from monitoring.middleware import MetricsMiddleware
+
+
+class HistogramTests(SimpleTestCase):
+
+    def test_exposition_is_cumulative(self):
+        registry = metrics.Registry()
+        histogram = registry.histogram('t_seconds', 'Test.', ('view',), (0.1, 1))
+        with registry.lock:
+            for value in (0.05, 0.1, 0.5, 3):
+                histogram.observe(('shop',), value)
+        lines = registry.expose().splitlines()
+        self.assertEqual(lines[:2], ['# HELP t_seconds Test.', '# TYPE t_seconds histogram'])
+        self.assertEqual(lines[2:], [
+            't_seconds_bucket{view="shop",le="0.1"} 2',
+            't_seconds_bucket{view="shop",le="1"} 3',
+            't_seconds_bucket{view="shop",le="+Inf"} 4',
+            't_seconds_sum{view="shop"} 3.65',
+            't_seconds_count{view="shop"} 4',
+        ])
+
+    def test_label_values_are_escaped(self):
+        registry = metrics.Registry()
+        counter = registry.counter('t_total', 'Test.', ('view',))
+        with registry.lock:
+            counter.inc(('a"b\\c',))
+        self.assertIn('t_total{view="a\\"b\\\\c"} 1', registry.expose())
+
+
+class MiddlewareTests(TestCase):
+
+    def setUp(self):
+        metrics.registry.clear()
+
+    def test_records_view_metrics_and_server_timing(self):
+        Goods.objects.create(name='Gouache', price=8)
+        response = self.client.get(reverse('marketplace:shop'))
+        timing = response['Server-Timing']
+        self.assertRegex(timing, r'^app;dur=[\d.]+, db;dur=[\d.]+;desc="\d+ queries", tpl;dur=[\d.]+$')
+        self.assertEqual(metrics.REQUESTS.value('marketplace:shop', 'GET', '200'), 1)
+        self.assertEqual(metrics.TEMPLATE_SECONDS.count('marketplace:shop'), 1)
+        self.assertEqual(metrics.RESPONSE_BYTES.count('marketplace:shop'), 1)
+
+        exposed = self.client.get(reverse('metrics'))
+        self.assertEqual(exposed['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        self.assertContains(exposed, 'patch_http_requests_total{view="marketplace:shop",method="GET",status="200"} 1')
+        self.assertContains(exposed, 'patch_db_queries_per_request_count{view="marketplace:shop"} 1')
+
+    def test_repeated_queries(self):
+        first = Goods.objects.create(name='Gouache', price=8)
+        second = Goods.objects.create(name='Palette', price=3)
+
+        def view(request):
+            for goods_id in (first.id, second.id, first.id):
+                Goods.objects.filter(id=goods_id).exists()
+            return HttpResponse('ok')
+
+        request = RequestFactory().get('/')
+        with self.settings(METRICS_N_PLUS_ONE_THRESHOLD=3), self.assertLogs('monitoring', 'WARNING') as logs:
+            MetricsMiddleware(view)(request)
+        self.assertEqual(metrics.DB_DUPLICATES.value('<unresolved>'), 1)
+        self.assertEqual(metrics.DB_SIMILAR.value('<unresolved>'), 1)
+        self.assertIn('ran the same query 3 times', logs.output[0])
+
+    @override_settings(METRICS_ALLOWED_IPS=['10.0.0.1'])
+    def test_metrics_endpoint_is_restricted(self):
+        self.assertEqual(self.client.get(reverse('metrics')).status_code, 403)
+
+
+def slow_view(request):
+    time.sleep(0.08)
+    return HttpResponse('ok')
+
+
+class ProfilingTests(SimpleTestCase):
+
+    def setUp(self):
+        tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(tmp.cleanup)
+        self.dir = tmp.name
+        self.enterContext(override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.dir,
+                                            PROFILING_SAMPLE_EVERY=0, PROFILING_SLOW_MS=0))
+
+    def files(self):
+        return sorted(os.listdir(self.dir))
+
+    def test_signed_header_profiles_request(self):
+        middleware = profiling.ProfilingMiddleware(slow_view)
+        response = middleware(RequestFactory().get('/', headers={profiling.HEADER: 'forged'}))
+        self.assertEqual(self.files(), [])
+        self.assertFalse(response.has_header('X-Profile'))
+
+        response = middleware(RequestFactory().get('/', headers={profiling.HEADER: profiling.make_token()}))
+        self.assertEqual(self.files(), [response['X-Profile']])
+        out = StringIO()
+        call_command('profile_summary', dir=self.dir, stdout=out)
+        self.assertIn('1 cProfile dump(s)', out.getvalue())
+        self.assertIn('(slow_view)', out.getvalue())
+
+    def test_sampling_and_rotation(self):
+        with self.settings(PROFILING_SAMPLE_EVERY=1, PROFILING_MAX_FILES=2):
+            middleware = profiling.ProfilingMiddleware(lambda request: HttpResponse('ok'))
+            for _ in range(3):
+                middleware(RequestFactory().get('/'))
+        self.assertEqual(len(self.files()), 2)
+
+    def test_slow_requests_keep_stack_samples(self):
+        with self.settings(PROFILING_SLOW_MS=50, PROFILING_STACK_INTERVAL_MS=5):
+            middleware = profiling.ProfilingMiddleware(slow_view)
+            middleware(RequestFactory().get('/'))
+            fast = profiling.ProfilingMiddleware(lambda request: HttpResponse('ok'))
+            fast(RequestFactory().get('/'))
+        [name] = self.files()
+        self.assertTrue(name.endswith(profiling.STACKS_SUFFIX))
+        out = StringIO()
+        call_command('profile_summary', dir=self.dir, stdout=out)
+        self.assertIn('1 slow request(s)', out.getvalue())
+        self.assertIn('(slow_view)', out.getvalue())
+
+    def test_disabled_by_default(self):
+        with self.settings(PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(slow_view)
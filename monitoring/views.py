@@ -0,0 +1,13 @@
+# monitoring/views.py
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
+
+from monitoring.metrics import registry
+
+
+def metrics(request):
+    """Prometheus 抓取的指标 (文本格式), 只允许 METRICS_ALLOWED_IPS 里的地址访问"""
+    allowed = settings.METRICS_ALLOWED_IPS
+    if allowed is not None and request.META.get('REMOTE_ADDR') not in allowed:
+        return HttpResponseForbidden()
+    return HttpResponse(registry.expose(), content_type='text/plain; version=0.0.4; charset=utf-8')